@@ -3,11 +3,12 @@ import os
 import streamlit as st
 from dotenv import load_dotenv
 from datetime import datetime
-from utils.document_manager import DocumentManager
 
-# Cargar variables de entorno
+# Cargar variables de entorno (antes de importar utils, que leen su configuración al importarse)
 load_dotenv()
 
+from utils.document_manager import get_document_manager
+
 # Configuración de la página
 st.set_page_config(
     page_title="Yachani - Biblioteca Educativa",
@@ -16,7 +17,7 @@ st.set_page_config(
 )
 
 # Inicializar el gestor de documentos
-doc_manager = DocumentManager()
+doc_manager = get_document_manager()
 
 st.title("📚 Yachani")
 st.markdown("""
@@ -0,0 +1,81 @@
+# benchmarks/chunking_benchmark.py
+"""Compara el chunker por tokens con RecursiveCharacterTextSplitter.
+
+Uso:
+    python -m benchmarks.chunking_benchmark [directorio] --repeat 3
+
+Carga todos los PDF de `data/processed_docs` (o del directorio indicado) y
+mide, para cada divisor, fragmentos por segundo y la distribución del
+tamaño de los fragmentos en tokens. La lectura de los PDF no se cronometra.
+"""
+import os
+import time
+import argparse
+import statistics
+from typing import Dict, List
+from langchain_community.document_loaders import PyPDFLoader
+from utils.chunking import TokenChunker, recursive_splitter, get_profile, CHUNKING_PROFILES
+
+
+def load_pages(directory: str) -> List:
+    pages = []
+    for root, _, files in os.walk(directory):
+        for name in sorted(files):
+            if name.lower().endswith(".pdf"):
+                pages.extend(PyPDFLoader(os.path.join(root, name)).load())
+    return pages
+
+
+def measure(name: str, splitter, pages: List, repeat: int, encoding) -> Dict:
+    best = float("inf")
+    chunks = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        chunks = splitter.split_documents(pages)
+        best = min(best, time.perf_counter() - started)
+
+    sizes = [len(tokens) for tokens in encoding.encode_ordinary_batch([c.page_content for c in chunks])]
+    mean = statistics.mean(sizes) if sizes else 0.0
+    stdev = statistics.pstdev(sizes) if sizes else 0.0
+    return {
+        "name": name,
+        "chunks": len(chunks),
+        "seconds": best,
+        "chunks_per_second": len(chunks) / best if best > 0 else 0.0,
+        "mean_tokens": mean,
+        "stdev_tokens": stdev,
+        "cv": stdev / mean if mean else 0.0,
+        "min_tokens": min(sizes, default=0),
+        "max_tokens": max(sizes, default=0)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de divisores de texto")
+    parser.add_argument("directory", nargs="?", default=os.path.join("data", "processed_docs"))
+    parser.add_argument("--repeat", type=int, default=3, help="Repeticiones (se toma la mejor)")
+    parser.add_argument("--type", dest="doc_type", default=None,
+                        help=f"Perfil de tipo de documento ({', '.join(CHUNKING_PROFILES)})")
+    args = parser.parse_args()
+
+    pages = load_pages(args.directory)
+    characters = sum(len(page.page_content) for page in pages)
+    print(f"📚 {len(pages)} páginas, {characters / 1e6:.2f} M caracteres")
+
+    token_chunker = TokenChunker(**get_profile(args.doc_type))
+    results = [
+        measure("RecursiveCharacterTextSplitter (1000 car.)", recursive_splitter(), pages,
+                args.repeat, token_chunker.encoding),
+        measure(f"TokenChunker ({token_chunker.chunk_tokens} tokens)", token_chunker, pages,
+                args.repeat, token_chunker.encoding)
+    ]
+
+    print(f"\n{'Divisor':<45}{'chunks':>8}{'chunks/s':>12}{'media':>8}{'desv.':>8}{'CV':>7}{'mín':>6}{'máx':>6}")
+    for r in results:
+        print(f"{r['name']:<45}{r['chunks']:>8}{r['chunks_per_second']:>12.0f}"
+              f"{r['mean_tokens']:>8.1f}{r['stdev_tokens']:>8.1f}{r['cv']:>7.2f}"
+              f"{r['min_tokens']:>6}{r['max_tokens']:>6}")
+
+
+if __name__ == "__main__":
+    main()
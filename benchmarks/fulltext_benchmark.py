@@ -0,0 +1,83 @@
+# benchmarks/fulltext_benchmark.py
+"""Latencia del índice de texto completo con muchos chunks.
+
+Uso:
+    python -m benchmarks.fulltext_benchmark --chunks 1000000 --db /tmp/fulltext.sqlite3
+
+Si la base indicada no existe se llena con chunks sintéticos (vocabulario
+con distribución de Zipf, como el texto real, y palabras vacías); luego se
+miden consultas con términos raros, intermedios, frecuentes y restringidas
+a algunos documentos, con la búsqueda del catálogo.
+"""
+import time
+import random
+import itertools
+import argparse
+import statistics
+from langchain_core.documents import Document
+from utils.fulltext import FullTextIndex
+
+VOCABULARY_SIZE = 50000
+CHUNK_WORDS = 180
+CHUNKS_PER_DOCUMENT = 500
+FILLER = ["de", "la", "que", "el", "en", "y", "los", "del", "las", "por"]
+
+
+def build(index: FullTextIndex, total: int) -> None:
+    random.seed(0)
+    vocabulary = [f"t{rank}" for rank in range(VOCABULARY_SIZE)]
+    cumulative = list(itertools.accumulate(1 / (rank + 1) for rank in range(VOCABULARY_SIZE)))
+    started = time.perf_counter()
+    for document in range(total // CHUNKS_PER_DOCUMENT):
+        chunks = []
+        for position in range(CHUNKS_PER_DOCUMENT):
+            words = random.choices(vocabulary, cum_weights=cumulative, k=CHUNK_WORDS) + random.choices(FILLER, k=40)
+            random.shuffle(words)
+            chunks.append(Document(page_content=" ".join(words), metadata={"page": position // 5}))
+        index.add_chunks(f"doc{document:06d}", [f"c{i}" for i in range(CHUNKS_PER_DOCUMENT)], chunks)
+        if document % 100 == 0:
+            print(f"  {(document + 1) * CHUNKS_PER_DOCUMENT} chunks · {time.perf_counter() - started:.0f}s")
+
+
+def measure(function, repeat: int = 7):
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        times.append((time.perf_counter() - started) * 1000)
+    return statistics.median(times), max(times), len(result)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del índice de texto completo")
+    parser.add_argument("--chunks", type=int, default=1000000)
+    parser.add_argument("--db", default="/tmp/fulltext_benchmark.sqlite3")
+    args = parser.parse_args()
+
+    index = FullTextIndex(args.db)
+    if index.count() == 0:
+        print(f"Generando {args.chunks} chunks en {args.db}...")
+        build(index, args.chunks)
+    total = index.count()
+    documents = [f"doc{i:06d}" for i in range(0, total // CHUNKS_PER_DOCUMENT, 7)][:10]
+
+    queries = {
+        "raro": "t30000",
+        "dos intermedios": "t1000 t1500",
+        "intermedio": "t2000",
+        "frecuente + raro": "t5 t20000",
+        "frecuente": "t1",
+        "palabras vacías": "de la que",
+        "frase mixta": "la t800 de t3000",
+    }
+    print(f"\n{total} chunks · mediana / máximo en ms\n")
+    print(f"{'consulta':<22}{'documentos':>12}{'chunks (10 docs)':>22}")
+    for name, query in queries.items():
+        catalog = measure(lambda: index.search_documents(query))
+        scoped = measure(lambda: index.search(query, limit=8, doc_hashes=documents))
+        print(f"{name:<22}{catalog[0]:>7.1f} / {catalog[1]:<6.1f}{scoped[0]:>12.1f} / {scoped[1]:<6.1f}"
+              f"  ({catalog[2]} docs, {scoped[2]} chunks)")
+
+
+if __name__ == "__main__":
+    main()
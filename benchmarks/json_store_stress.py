@@ -0,0 +1,82 @@
+# benchmarks/json_store_stress.py
+"""Prueba de estrés de escrituras concurrentes sobre los archivos JSON.
+
+Uso:
+    python -m benchmarks.json_store_stress --processes 8 --writes 50
+
+Lanza varios procesos que registran documentos a la vez con
+DocumentManager (metadata.json, stats.json) y agregan claves a un
+JSONStore, en un directorio temporal. Al final comprueba que no se perdió
+ninguna actualización y que los archivos siguen siendo JSON válido.
+"""
+import os
+import time
+import argparse
+import tempfile
+from multiprocessing import get_context
+
+
+def writer(worker: int, writes: int, workdir: str) -> None:
+    os.chdir(workdir)
+    from utils.document_manager import DocumentManager
+    from utils.json_store import JSONStore
+
+    doc_manager = DocumentManager()
+    store = JSONStore(os.path.join("data", "counters.json"))
+    for index in range(writes):
+        doc_manager.add_document(
+            {"title": f"Documento {worker}-{index}", "author": f"Autor {worker}",
+             "year": 2024, "category": f"Categoría {index % 3}", "pages": 1},
+            "vectorstore", "original"
+        )
+        store.update(lambda data: data.update({f"{worker}-{index}": index}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Estrés de escrituras JSON concurrentes")
+    parser.add_argument("--processes", type=int, default=8)
+    parser.add_argument("--writes", type=int, default=50, help="Escrituras por proceso")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.makedirs(os.path.join(workdir, "data"))
+        context = get_context("spawn")
+        started = time.perf_counter()
+        processes = [
+            context.Process(target=writer, args=(worker, args.writes, workdir))
+            for worker in range(args.processes)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        elapsed = time.perf_counter() - started
+
+        original_cwd = os.getcwd()
+        os.chdir(workdir)
+        from utils.document_manager import DocumentManager
+        from utils.json_store import JSONStore
+
+        expected = args.processes * args.writes
+        doc_manager = DocumentManager()
+        counters = JSONStore(os.path.join("data", "counters.json")).load()
+        stats = doc_manager.stats
+        checks = {
+            "documentos en metadata.json": len(doc_manager.metadata),
+            "total en stats.json": stats["total_documents"],
+            "páginas en stats.json": stats["total_pages"],
+            "suma por categoría": sum(stats["by_category"].values()),
+            "claves en counters.json": len(counters)
+        }
+        os.chdir(original_cwd)
+
+    print(f"⏱️ {expected} escrituras por archivo desde {args.processes} procesos en {elapsed:.1f} s")
+    failed = [name for name, value in checks.items() if value != expected]
+    for name, value in checks.items():
+        print(f"{'✅' if value == expected else '❌'} {name}: {value} / {expected}")
+    if failed or any(process.exitcode != 0 for process in processes):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
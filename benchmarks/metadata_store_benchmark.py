@@ -0,0 +1,102 @@
+# benchmarks/metadata_store_benchmark.py
+"""Compara metadata.json con el backend SQLite a gran escala.
+
+Uso:
+    python -m benchmarks.metadata_store_benchmark --documents 100000
+
+Genera un catálogo sintético en un directorio temporal y mide, para cada
+backend, el costo de agregar un documento a un catálogo lleno y de una
+consulta filtrada como las del catálogo.
+"""
+import os
+import json
+import time
+import random
+import argparse
+import tempfile
+from utils.metadata_store import SQLiteMetadataStore
+
+CATEGORIES = ["Matemáticas", "Ciencias", "Programación", "Idiomas", "Historia", "Literatura"]
+TYPES = ["Libro de Texto", "Guía de Estudio", "Manual Técnico", "Paper Académico", "Apuntes"]
+LEVELS = ["Principiante", "Intermedio", "Avanzado", "Experto"]
+LANGUAGES = ["Español", "Inglés", "Quechua"]
+
+FILTERS = {"category": "Ciencias", "level": "Avanzado", "year_range": (2015, 2020)}
+
+
+def make_document(index: int) -> dict:
+    return {
+        "title": f"Documento {index}",
+        "author": f"Autor {index % 997}",
+        "year": random.randint(1990, 2024),
+        "category": random.choice(CATEGORIES),
+        "type": random.choice(TYPES),
+        "level": random.choice(LEVELS),
+        "language": random.choice(LANGUAGES),
+        "tags": ["tema", f"t{index % 50}"],
+        "description": "Descripción de prueba " * 5,
+        "hash": f"{index:064x}",
+        "processed_date": f"2024-{index % 12 + 1:02d}-{index % 28 + 1:02d}T10:00:00"
+    }
+
+
+def json_filter(metadata: dict, filters: dict) -> list:
+    """Mismo filtrado lineal que DocumentManager con metadata.json."""
+    results = metadata.values()
+    for key, value in filters.items():
+        if key == "year_range":
+            results = [doc for doc in results if value[0] <= int(doc.get("year", 0)) <= value[1]]
+        else:
+            results = [doc for doc in results if doc.get(key) == value]
+    return list(results)
+
+
+def timed(function, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de backends de metadata")
+    parser.add_argument("--documents", type=int, default=100000)
+    args = parser.parse_args()
+
+    random.seed(0)
+    documents = {doc["hash"]: doc for doc in map(make_document, range(args.documents))}
+    extra = make_document(args.documents)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = os.path.join(tmp, "metadata.json")
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(documents, f, ensure_ascii=False, indent=2)
+
+        def json_add():
+            # add_document con JSON: cargar, agregar y reescribir el archivo completo
+            documents[extra["hash"]] = extra
+            with open(json_path, "w", encoding="utf-8") as f:
+                json.dump(documents, f, ensure_ascii=False, indent=2)
+
+        started = time.perf_counter()
+        store = SQLiteMetadataStore(os.path.join(tmp, "metadata.sqlite3"))
+        store.import_json(json_path)
+        import_seconds = time.perf_counter() - started
+
+        results = {
+            "JSON": (timed(json_add), timed(lambda: json_filter(documents, FILTERS))),
+            "SQLite": (timed(lambda: store.put(extra["hash"], extra)), timed(lambda: store.filter(FILTERS)))
+        }
+        matches = len(store.filter(FILTERS))
+
+    print(f"📚 {args.documents} documentos · importación a SQLite: {import_seconds:.1f} s")
+    print(f"🔍 Filtro {FILTERS}: {matches} resultados\n")
+    print(f"{'Backend':<10}{'agregar (ms)':>15}{'filtrar (ms)':>15}")
+    for name, (add_ms, filter_ms) in results.items():
+        print(f"{name:<10}{add_ms:>15.1f}{filter_ms:>15.1f}")
+
+
+if __name__ == "__main__":
+    main()
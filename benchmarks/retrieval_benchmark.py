@@ -0,0 +1,123 @@
+# benchmarks/retrieval_benchmark.py
+"""Compara la recuperación semántica con la híbrida (vectores + BM25).
+
+Uso:
+    python -m benchmarks.retrieval_benchmark <agent_id> --queries 50 --k 1 3 5 10
+    python -m benchmarks.retrieval_benchmark <agent_id> --queries-file consultas.jsonl
+
+Sin archivo de consultas se generan consultas de "elemento conocido": se
+toma un fragmento al azar de los documentos del agente y, como consulta,
+una ventana de palabras alrededor de su término más largo (suele ser un
+nombre propio o de función). La consulta acierta si ese fragmento aparece
+entre los k primeros resultados. El archivo JSONL admite una consulta por
+línea con `query` y `expected` (texto que debe contener algún resultado).
+
+La caché de embeddings de consultas se vacía antes de cada modo, así que
+la primera pasada por cada consulta incluye la llamada a la API de OpenAI,
+igual que una pregunta nueva en el chat. Se informa también la tasa de
+aciertos de esa caché.
+"""
+import os
+import re
+import json
+import time
+import random
+import argparse
+import statistics
+from typing import Dict, List
+from dotenv import load_dotenv
+from utils.document_manager import get_document_manager
+from utils.json_store import JSONStore
+from utils.query_embeddings import get_query_embeddings
+from utils.retrieval import open_agent_vectorstores, retrieve, RETRIEVAL_MODES
+from utils.vector_library import doc_filter
+
+_WORD = re.compile(r"\S+")
+
+
+def agent_chunks(config: Dict) -> List[str]:
+    """Texto de todos los chunks de los documentos del agente."""
+    texts = []
+    for vs in config['vectorstores']:
+        if vs.get('retriever') is not None:
+            texts.extend(vs['vectorstore']._collection.get(include=["documents"])["documents"])
+    library = config.get('library')
+    if library:
+        where = doc_filter(list(library['titles']))
+        texts.extend(library['vectorstore']._collection.get(where=where, include=["documents"])["documents"])
+    return [text.strip() for text in texts if text and text.strip()]
+
+
+def known_item_queries(chunks: List[str], count: int, words: int) -> List[Dict]:
+    """Consultas sacadas de fragmentos al azar; `expected` es el fragmento completo."""
+    random.seed(0)
+    candidates = [chunk for chunk in chunks if len(_WORD.findall(chunk)) >= words * 2]
+    queries = []
+    for chunk in random.sample(candidates, min(count, len(candidates))):
+        tokens = _WORD.findall(chunk)
+        longest = max(range(len(tokens)), key=lambda i: len(tokens[i]))
+        start = max(0, min(longest - words // 2, len(tokens) - words))
+        queries.append({"query": " ".join(tokens[start:start + words]), "expected": chunk})
+    return queries
+
+
+def evaluate(config: Dict, queries: List[Dict], ks: List[int]) -> Dict:
+    hits = {k: 0 for k in ks}
+    times = []
+    for item in queries:
+        started = time.perf_counter()
+        results = retrieve(config, item["query"])
+        times.append((time.perf_counter() - started) * 1000)
+        contents = [content for _, content in results]
+        for k in ks:
+            if any(item["expected"] in content or content in item["expected"] for content in contents[:k]):
+                hits[k] += 1
+    return {
+        "recall": {k: hits[k] / len(queries) for k in ks},
+        "median_ms": statistics.median(times),
+        "p95_ms": sorted(times)[int(0.95 * (len(times) - 1))]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de recuperación semántica e híbrida")
+    parser.add_argument("agent_id", help="ID del agente en data/saved_agents.json")
+    parser.add_argument("--queries", type=int, default=50, help="Consultas generadas")
+    parser.add_argument("--query-words", type=int, default=6)
+    parser.add_argument("--queries-file", default=None, help="JSONL con query y expected")
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 3, 5, 10])
+    args = parser.parse_args()
+
+    agent = JSONStore(os.path.join("data", "saved_agents.json")).load().get(args.agent_id)
+    if not agent:
+        raise SystemExit(f"No existe el agente {args.agent_id}")
+    doc_manager = get_document_manager()
+    docs = [doc_manager.get_document(info['hash']) for info in agent['docs']]
+    # Los retrievers devuelven tantos fragmentos como el mayor k evaluado
+    depth = max(args.k)
+    vectorstores, library = open_agent_vectorstores([doc for doc in docs if doc], depth)
+    config = {**agent, 'context_window': depth, 'vectorstores': vectorstores, 'library': library}
+
+    if args.queries_file:
+        with open(args.queries_file, encoding="utf-8") as f:
+            queries = [json.loads(line) for line in f if line.strip()]
+    else:
+        queries = known_item_queries(agent_chunks(config), args.queries, args.query_words)
+    if not queries:
+        raise SystemExit("No hay consultas para evaluar")
+
+    print(f"{agent['name']}: {len(vectorstores)} documentos · {len(queries)} consultas\n")
+    header = "".join(f"{f'recall@{k}':>11}" for k in args.k)
+    print(f"{'modo':<28}{header}{'mediana ms':>13}{'p95 ms':>10}{'caché':>8}")
+    embeddings = get_query_embeddings()
+    for mode, label in RETRIEVAL_MODES.items():
+        embeddings.clear()
+        result = evaluate({**config, 'retrieval_mode': mode}, queries, args.k)
+        recalls = "".join(f"{result['recall'][k]:>11.2f}" for k in args.k)
+        hit_rate = embeddings.stats()['hit_rate']
+        print(f"{label:<28}{recalls}{result['median_ms']:>13.1f}{result['p95_ms']:>10.1f}{hit_rate:>8.0%}")
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    main()
@@ -1,7 +1,10 @@
 # pages/1_📚_catalog.py
 import streamlit as st
-from utils.document_manager import DocumentManager
+from utils.document_manager import get_document_manager
+from utils.thumbnails import get_thumbnail_service
+from utils.downloads import render_download_button
 import os
+import math
 from datetime import datetime
 import base64
 
@@ -11,6 +14,9 @@ st.set_page_config(
         layout="wide"
 )
 
+# Documentos por página en la biblioteca (múltiplos de 3 para la vista en grid)
+CATALOG_PAGE_SIZES = [12, 24, 48]
+
 def format_date(date_str):
     """Formatea la fecha ISO a un formato más legible."""
     try:
@@ -31,18 +37,6 @@ def format_file_size(size_in_bytes):
         size_in_bytes /= 1024
     return f"{size_in_bytes:.1f} GB"
 
-def create_download_link(file_path: str, link_text: str):
-    """Crea un link de descarga para un archivo."""
-    try:
-        with open(file_path, "rb") as f:
-            bytes_data = f.read()
-        b64 = base64.b64encode(bytes_data).decode()
-        filename = os.path.basename(file_path)
-        mime_type = "application/octet-stream"
-        return f'<a href="data:{mime_type};base64,{b64}" download="{filename}" class="download-link">{link_text}</a>'
-    except Exception:
-        return None
-
 def show_document_details(doc, is_full_view=True):
     """Muestra los detalles del documento con manejo seguro de campos."""
     base_info = f"""
@@ -76,11 +70,37 @@ def show_document_details(doc, is_full_view=True):
         return base_info + full_info
     return base_info
 
+def show_content_matches(match):
+    """Muestra los fragmentos del documento que coinciden con la búsqueda."""
+    st.markdown(f"**📖 Coincidencias en el contenido ({match['matches']})**")
+    for snippet in match['snippets']:
+        page = snippet['page']
+        location = f"p. {page + 1}" if isinstance(page, int) else "—"
+        st.markdown(f"> *{location}* · {' '.join(snippet['text'].split())}")
+
+def show_pagination(page: int, total_pages: int, total: int):
+    """Controles para moverse entre páginas del catálogo."""
+    col_prev, col_info, col_next = st.columns([1, 2, 1])
+    with col_prev:
+        if st.button("⬅️ Anterior", disabled=page == 0, use_container_width=True):
+            st.session_state.catalog_page = page - 1
+            st.rerun()
+    with col_info:
+        st.markdown(
+            f"<p style='text-align: center'>Página {page + 1} de {total_pages} · {total} documentos</p>",
+            unsafe_allow_html=True
+        )
+    with col_next:
+        if st.button("Siguiente ➡️", disabled=page >= total_pages - 1, use_container_width=True):
+            st.session_state.catalog_page = page + 1
+            st.rerun()
+
 def main():
 
     st.title("📚 Catálogo de Documentos")
 
-    doc_manager = DocumentManager()
+    doc_manager = get_document_manager()
+    thumbnails = get_thumbnail_service()
 
     # Layout de dos columnas principales
     col_catalog, col_search = st.columns([2, 1])
@@ -91,8 +111,8 @@ def main():
         # Búsqueda por texto
         search_query = st.text_input(
             "Buscar",
-            placeholder="Título, descripción, etiquetas...",
-            help="Busca en todos los campos del documento"
+            placeholder="Título, descripción, etiquetas, contenido...",
+            help="Busca en los campos del documento y en su texto"
         )
         
         st.markdown("### 📋 Filtros")
@@ -169,20 +189,33 @@ def main():
         tab_all, tab_search = st.tabs(["📚 Biblioteca", "🔍 Resultados"])
         
         with tab_all:
-            all_documents = list(doc_manager.metadata.values())
-            if all_documents:
-                # Ordenar por fecha
-                all_documents.sort(
-                    key=lambda x: get_safe_value(x, 'processed_date', ''),
-                    reverse=True
-                )
-                
+            if doc_manager.get_total_documents():
                 # Opciones de visualización
-                view_option = st.radio(
-                    "Vista:",
-                    ["Lista", "Grid"],
-                    horizontal=True
+                col_view, col_size = st.columns([3, 1])
+                with col_view:
+                    view_option = st.radio(
+                        "Vista:",
+                        ["Lista", "Grid"],
+                        horizontal=True
+                    )
+                with col_size:
+                    page_size = st.selectbox("Por página", CATALOG_PAGE_SIZES)
+                
+                # Solo se consulta y renderiza la página actual, ordenada por fecha
+                page = st.session_state.get('catalog_page', 0)
+                all_documents, total = doc_manager.query(
+                    sort="-processed_date",
+                    offset=page * page_size,
+                    limit=page_size
                 )
+                total_pages = max(1, math.ceil(total / page_size))
+                if page >= total_pages:
+                    page = st.session_state.catalog_page = total_pages - 1
+                    all_documents, total = doc_manager.query(
+                        sort="-processed_date",
+                        offset=page * page_size,
+                        limit=page_size
+                    )
                 
                 if view_option == "Grid":
                     # Vista en grid
@@ -191,9 +224,9 @@ def main():
                         with cols[idx % 3]:
                             with st.container():
                                 # Mostrar preview si existe
-                                preview_path = get_safe_value(doc, 'preview_path')
-                                if preview_path and os.path.exists(preview_path):
-                                    st.image(preview_path, use_column_width=True)
+                                thumbnail = thumbnails.get(get_safe_value(doc, 'original_path', None), "small")
+                                if thumbnail:
+                                    st.image(thumbnail, use_column_width=True)
                                 
                                 st.markdown(f"""
                                 #### 📄 {get_safe_value(doc, 'title')}
@@ -230,19 +263,18 @@ def main():
                             with col1:
                                 st.markdown(show_document_details(doc))
                                 
-                                # Agregar link de descarga si existe el archivo
-                                original_path = get_safe_value(doc, 'original_path')
-                                if original_path and os.path.exists(original_path):
-                                    st.markdown(
-                                        create_download_link(original_path, "📥 Descargar documento"),
-                                        unsafe_allow_html=True
-                                    )
+                                # Descarga diferida: el archivo se lee solo al pedirlo
+                                render_download_button(
+                                    get_safe_value(doc, 'original_path', None),
+                                    "📥 Descargar documento",
+                                    key=f"list_{doc['hash']}"
+                                )
                             
                             with col2:
                                 # Preview
-                                preview_path = get_safe_value(doc, 'preview_path')
-                                if preview_path and os.path.exists(preview_path):
-                                    st.image(preview_path, use_column_width=True)
+                                thumbnail = thumbnails.get(get_safe_value(doc, 'original_path', None), "small")
+                                if thumbnail:
+                                    st.image(thumbnail, use_column_width=True)
                                 
                                 # Selección
                                 is_selected = st.checkbox(
@@ -266,6 +298,8 @@ def main():
                                 - 📄 {get_safe_value(doc, 'pages', '0')} páginas
                                 - 📦 {get_safe_value(doc, 'chunks', '0')} fragmentos
                                 """)
+                
+                show_pagination(page, total_pages, total)
             else:
                 st.info("No hay documentos en el catálogo. Ve a la sección de carga para agregar documentos.")
 
@@ -282,6 +316,15 @@ def main():
                 
                 search_results = doc_manager.search_documents(search_query, filters)
                 
+                # Coincidencias en el texto: después de las de metadatos, por BM25
+                content_matches = {}
+                if search_query:
+                    found = {doc['hash'] for doc in search_results}
+                    for doc, match in doc_manager.search_content(search_query, filters):
+                        content_matches[doc['hash']] = match
+                        if doc['hash'] not in found:
+                            search_results.append(doc)
+                
                 if search_results:
                     st.markdown(f"### 🔍 Resultados ({len(search_results)})")
                     
@@ -292,19 +335,21 @@ def main():
                             with col1:
                                 st.markdown(show_document_details(doc, False))
                                 
-                                # Link de descarga
-                                original_path = get_safe_value(doc, 'original_path')
-                                if original_path and os.path.exists(original_path):
-                                    st.markdown(
-                                        create_download_link(original_path, "📥 Descargar"),
-                                        unsafe_allow_html=True
-                                    )
+                                if doc['hash'] in content_matches:
+                                    show_content_matches(content_matches[doc['hash']])
+                                
+                                # Descarga diferida
+                                render_download_button(
+                                    get_safe_value(doc, 'original_path', None),
+                                    "📥 Descargar",
+                                    key=f"search_{doc['hash']}"
+                                )
                             
                             with col2:
                                 # Preview
-                                preview_path = get_safe_value(doc, 'preview_path')
-                                if preview_path and os.path.exists(preview_path):
-                                    st.image(preview_path, use_column_width=True)
+                                thumbnail = thumbnails.get(get_safe_value(doc, 'original_path', None), "small")
+                                if thumbnail:
+                                    st.image(thumbnail, use_column_width=True)
                                 
                                 # Selección
                                 is_selected = st.checkbox(
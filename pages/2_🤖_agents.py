@@ -1,10 +1,9 @@
 # pages/2_🤖_agents.py
 import os
 import streamlit as st
-from utils.document_manager import DocumentManager
-from langchain_chroma import Chroma
-from langchain_openai.embeddings import OpenAIEmbeddings
-import json
+from utils.document_manager import get_document_manager
+from utils.retrieval import open_agent_vectorstores, RETRIEVAL_MODES, RETRIEVAL_DENSE
+from utils.json_store import JSONStore
 from datetime import datetime
 
 st.set_page_config(
@@ -13,12 +12,12 @@ st.set_page_config(
     layout="wide"
 )
 
+agents_store = JSONStore(os.path.join("data", "saved_agents.json"))
+
 def load_saved_agents():
     """Cargar agentes guardados del archivo JSON."""
     try:
-        if os.path.exists("data/saved_agents.json"):
-            with open("data/saved_agents.json", "r") as f:
-                return json.load(f)
+        return agents_store.load()
     except Exception as e:
         st.error(f"Error al cargar agentes guardados: {str(e)}")
     return {}
@@ -26,13 +25,11 @@ def load_saved_agents():
 def save_agent(agent_config):
     """Guardar configuración del agente."""
     try:
-        agents = load_saved_agents()
-        
         # Crear ID único para el agente
         agent_id = f"agent_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
         
         # Guardar información esencial
-        agents[agent_id] = {
+        agent = {
             'name': agent_config['name'],
             'role': agent_config['role'],
             'style': agent_config['style'],
@@ -40,13 +37,15 @@ def save_agent(agent_config):
             'temperature': agent_config['temperature'],
             'max_tokens': agent_config['max_tokens'],
             'context_window': agent_config['context_window'],
+            'retrieval_mode': agent_config.get('retrieval_mode', RETRIEVAL_DENSE),
+            'mmr': agent_config.get('mmr', False),
+            'answer_cache': agent_config.get('answer_cache', False),
             'docs': [{'title': vs['title'], 'hash': vs['hash']} for vs in agent_config['vectorstores']],
             'created_at': datetime.now().isoformat()
         }
         
-        os.makedirs("data", exist_ok=True)
-        with open("data/saved_agents.json", "w") as f:
-            json.dump(agents, f, indent=2)
+        # Leer-modificar-escribir bajo bloqueo para no perder agentes de otras sesiones
+        agents_store.update(lambda agents: agents.update({agent_id: agent}))
         
         return agent_id
     except Exception as e:
@@ -56,12 +55,8 @@ def save_agent(agent_config):
 def delete_agent(agent_id):
     """Eliminar un agente guardado."""
     try:
-        agents = load_saved_agents()
-        if agent_id in agents:
-            del agents[agent_id]
-            with open("data/saved_agents.json", "w") as f:
-                json.dump(agents, f, indent=2)
-            return True
+        _, deleted, _ = agents_store.update(lambda agents: agents.pop(agent_id, None) is not None)
+        return deleted
     except Exception as e:
         st.error(f"Error al eliminar el agente: {str(e)}")
     return False
@@ -76,28 +71,18 @@ def load_agent_config(agent_id, doc_manager):
         saved_agent = agents[agent_id]
         
         # Inicializar vectorstores
-        vectorstores = []
-        for doc_info in saved_agent['docs']:
-            doc = doc_manager.get_document(doc_info['hash'])
-            if doc and os.path.exists(doc.get('vectorstore_path', '')):
-                vectorstore = Chroma(
-                    persist_directory=doc['vectorstore_path'],
-                    embedding_function=OpenAIEmbeddings()
-                )
-                
-                vectorstores.append({
-                    'hash': doc['hash'],
-                    'title': doc['title'],
-                    'vectorstore': vectorstore,
-                    'retriever': vectorstore.as_retriever(
-                        search_kwargs={"k": saved_agent['context_window']}
-                    )
-                })
+        docs = [doc_manager.get_document(doc_info['hash']) for doc_info in saved_agent['docs']]
+        vectorstores, library = open_agent_vectorstores(
+            [doc for doc in docs if doc],
+            saved_agent['context_window']
+        )
         
         # Reconstruir configuración completa
         return {
             **saved_agent,
-            'vectorstores': vectorstores
+            'id': agent_id,
+            'vectorstores': vectorstores,
+            'library': library
         }
     except Exception as e:
         st.error(f"Error al cargar la configuración del agente: {str(e)}")
@@ -108,7 +93,7 @@ def main():
     st.title("🤖 Gestión de Asistentes")
     
     # Inicializar doc_manager
-    doc_manager = DocumentManager()
+    doc_manager = get_document_manager()
 
     # Tabs principales
     tab_saved, tab_create = st.tabs(["📚 Asistentes Guardados", "✨ Crear Nuevo Asistente"])
@@ -129,6 +114,8 @@ def main():
                     - 🎭 **Rol:** {agent['role']}
                     - 💬 **Estilo:** {agent['style']}
                     - 📚 **Documentos:** {len(agent['docs'])}
+                    - 🔎 **Búsqueda:** {RETRIEVAL_MODES[agent.get('retrieval_mode', RETRIEVAL_DENSE)]}
+                    - ⚡ **Caché de respuestas:** {'Sí' if agent.get('answer_cache') else 'No'}
                     - 📅 **Creado:** {datetime.fromisoformat(agent['created_at']).strftime('%d/%m/%Y %H:%M')}
                     """)
                     
@@ -261,6 +248,27 @@ def main():
                         value=2048,
                         help="Longitud máxima de las respuestas"
                     )
+                    
+                    retrieval_mode = st.selectbox(
+                        "Búsqueda en documentos",
+                        options=list(RETRIEVAL_MODES),
+                        format_func=RETRIEVAL_MODES.get,
+                        help="La híbrida combina la similitud semántica con coincidencias "
+                             "exactas de términos (nombres de funciones, nombres propios)"
+                    )
+                    
+                    mmr = st.checkbox(
+                        "Diversificar fragmentos (MMR)",
+                        value=False,
+                        help="Evita enviar al asistente fragmentos casi iguales de distintos documentos"
+                    )
+                    
+                    answer_cache = st.checkbox(
+                        "Reutilizar respuestas a preguntas similares",
+                        value=False,
+                        help="Responde al instante con la respuesta ya dada a una pregunta casi igual; "
+                             "se descarta si se vuelve a ingerir alguno de los documentos"
+                    )
             
             submitted = st.form_submit_button("🚀 Crear Asistente", use_container_width=True)
 
@@ -276,24 +284,10 @@ def main():
             with st.spinner("⚙️ Configurando tu asistente..."):
                 try:
                     # Inicializar vectorstores
-                    vectorstores = []
+                    vectorstores, library = open_agent_vectorstores(selected_docs_info, context_window)
+                    loaded = {vs['hash'] for vs in vectorstores}
                     for doc in selected_docs_info:
-                        vectorstore_path = doc.get('vectorstore_path')
-                        if vectorstore_path and os.path.exists(vectorstore_path):
-                            vectorstore = Chroma(
-                                persist_directory=vectorstore_path,
-                                embedding_function=OpenAIEmbeddings()
-                            )
-                            
-                            vectorstores.append({
-                                'hash': doc['hash'],
-                                'title': doc['title'],
-                                'vectorstore': vectorstore,
-                                'retriever': vectorstore.as_retriever(
-                                    search_kwargs={"k": context_window}
-                                )
-                            })
-                        else:
+                        if doc['hash'] not in loaded:
                             st.warning(f"⚠️ No se encontró el vectorstore para {doc['title']}")
 
                     if vectorstores:
@@ -306,7 +300,11 @@ def main():
                             'temperature': temperature,
                             'max_tokens': max_tokens,
                             'context_window': context_window,
-                            'vectorstores': vectorstores
+                            'retrieval_mode': retrieval_mode,
+                            'mmr': mmr,
+                            'answer_cache': answer_cache,
+                            'vectorstores': vectorstores,
+                            'library': library
                         }
                         
                         # Guardar agente
@@ -314,7 +312,7 @@ def main():
                         
                         if agent_id:
                             # Guardar en session state
-                            st.session_state['current_agent_config'] = agent_config
+                            st.session_state['current_agent_config'] = {**agent_config, 'id': agent_id}
                             
                             st.success(f"""
                             ✅ Asistente "{agent_name}" creado y guardado exitosamente:
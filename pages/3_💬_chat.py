@@ -5,9 +5,16 @@ from langchain.agents.types import AgentType
 from langchain.memory import ConversationBufferMemory
 from langchain.tools import Tool
 from typing import List, Dict
+from utils.retrieval import search_vectorstores, dropped_searches, agent_search_names
+from utils.query_embeddings import get_query_embeddings
+from utils.answer_cache import cached_answer, remember_answer, get_answer_cache
+from utils.agent_streaming import AgentStream
+from utils.chat_history import (
+    track_history_version, load_agent_history, append_agent_history, save_agent_history
+)
 import re
-import json
 import os
+import time
 from datetime import datetime
 
 # Configuración de la página
@@ -17,20 +24,7 @@ st.set_page_config(
     layout="wide"
 )
 
-def load_agent_history(agent_id: str) -> List[Dict]:
-    """Carga el historial de conversaciones de un agente específico."""
-    history_path = os.path.join("data", "chat_history", f"{agent_id}.json")
-    if os.path.exists(history_path):
-        with open(history_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return []
-
-def save_agent_history(agent_id: str, messages: List[Dict]):
-    """Guarda el historial de conversaciones de un agente."""
-    os.makedirs(os.path.join("data", "chat_history"), exist_ok=True)
-    history_path = os.path.join("data", "chat_history", f"{agent_id}.json")
-    with open(history_path, 'w', encoding='utf-8') as f:
-        json.dump(messages, f, ensure_ascii=False, indent=2)
+CACHED_ANSWER_CAPTION = "⚡ Respuesta reutilizada de una pregunta similar"
 
 def format_timestamp(timestamp: str) -> str:
     """Formatea un timestamp para mostrar."""
@@ -42,6 +36,8 @@ def show_chat_message(message: Dict, show_timestamp: bool = True):
     with st.chat_message(message["role"]):
         if show_timestamp and "timestamp" in message:
             st.caption(format_timestamp(message["timestamp"]))
+        if message.get("cached"):
+            st.caption(CACHED_ANSWER_CAPTION)
         st.markdown(message["content"])
 
 def get_agent_id(config: Dict) -> str:
@@ -78,6 +74,7 @@ def main():
 
     config = st.session_state.current_agent_config
     agent_id = get_agent_id(config)
+    track_history_version(agent_id, st.session_state.setdefault("history_versions", {}))
 
     # Layout principal
     chat_col, info_col = st.columns([3, 1])
@@ -103,11 +100,26 @@ def main():
             
             # Configuración avanzada
             with st.expander("⚙️ Configuración Avanzada"):
+                cache = get_query_embeddings().stats()
                 st.markdown(f"""
                 - Temperature: {config['temperature']}
                 - Max Tokens: {config['max_tokens']}
                 - Context Window: {config['context_window']}
+                - Caché de consultas: {cache['hit_rate']:.0%} de aciertos ({cache['hits']}/{cache['hits'] + cache['misses']})
                 """)
+                if config.get('answer_cache') and config.get('id'):
+                    answers = get_answer_cache().stats(config['id'])
+                    st.markdown(f"""
+                    - Caché de respuestas: {answers['hit_rate']:.0%} de aciertos ({answers['hits']}/{answers['hits'] + answers['misses']})
+                    - Tiempo ahorrado: {answers['saved_seconds']:.0f} s
+                    """)
+                # Almacenes que no respondieron a tiempo (sus resultados se omitieron)
+                for name, dropped in dropped_searches(agent_search_names(config)).items():
+                    st.caption(
+                        f"⚠️ {name}: {dropped['timeouts']} sin respuesta, {dropped['errors']} errores, "
+                        f"{dropped['hung']} omitidas por seguir colgado "
+                        f"(última: {format_timestamp(dropped['last'])})"
+                    )
             
             # Gestión de historiales
             st.markdown("### 💾 Gestión de Historial")
@@ -142,8 +154,11 @@ def main():
             
             if st.button("💾 Guardar Historial"):
                 if st.session_state.messages:
-                    save_agent_history(agent_id, st.session_state.messages)
-                    st.success("✅ Historial guardado correctamente")
+                    if save_agent_history(agent_id, st.session_state.messages, st.session_state.history_versions):
+                        st.success("✅ Historial guardado correctamente")
+                    else:
+                        st.warning("⚠️ Otra sesión guardó este historial mientras tanto. "
+                                   "Vuelve a pulsar Guardar para reemplazarlo con esta conversación.")
 
     with chat_col:
         # Inicializar chat
@@ -173,36 +188,23 @@ def main():
             show_chat_message(user_message)
 
             with st.chat_message("assistant"):
-                with st.spinner(f"💭 {config['name']} está pensando..."):
-                    try:
+                try:
+                    with st.spinner(f"💭 {config['name']} está pensando..."):
+                        # Reutilizar la respuesta a una primera pregunta casi igual (si el agente lo permite)
+                        cached = cached_answer(config, prompt, st.session_state.messages)
+
                         # Inicializar agente si no existe
-                        if "agent" not in st.session_state:
+                        if not cached and "agent" not in st.session_state:
                             llm = ChatOpenAI(
                                 temperature=config['temperature'],
                                 model="gpt-4-0125-preview",
-                                max_tokens=config['max_tokens']
+                                max_tokens=config['max_tokens'],
+                                streaming=True
                             )
 
                             def search_documents(query: str) -> str:
                                 """Buscar información en los documentos base."""
-                                try:
-                                    results = []
-                                    
-                                    for vs in config['vectorstores']:
-                                        docs = vs['retriever'].get_relevant_documents(query)
-                                        for doc in docs:
-                                            content = doc.page_content.strip()
-                                            source = vs['title']
-                                            
-                                            if content not in [r.split(']:')[1].strip() for r in results]:
-                                                results.append(f"[{source}]: {content}")
-                                    
-                                    if results:
-                                        return "\n\n".join(results[:config['context_window']])
-                                    return "No encontré información específica. ¿Podrías reformular la pregunta?"
-                                
-                                except Exception as e:
-                                    return f"Error al buscar: {str(e)}"
+                                return search_vectorstores(config, query)
 
                             tools = [
                                 Tool(
@@ -248,28 +250,44 @@ def main():
                         7. Mantén la coherencia con las respuestas anteriores
                         """
                         
-                        response = st.session_state.agent.run(prompt_text)
-                        
-                        assistant_message = {
-                            "role": "assistant",
-                            "content": response,
-                            "timestamp": datetime.now().isoformat()
-                        }
-                        
+                        if cached:
+                            response = cached['answer']
+                        else:
+                            # La espera visible termina con el primer token de la respuesta
+                            started = time.perf_counter()
+                            stream = AgentStream(st.session_state.agent, prompt_text)
+                            stream.wait_first_token()
+
+                    if cached:
+                        st.caption(CACHED_ANSWER_CAPTION)
                         st.markdown(response)
-                        st.session_state.messages.append(assistant_message)
-                        
-                        # Guardar historial automáticamente
-                        save_agent_history(agent_id, st.session_state.messages)
+                    else:
+                        st.write_stream(stream)
+                        response = stream.result
+                        remember_answer(config, prompt, st.session_state.messages, response,
+                                        time.perf_counter() - started)
+                    
+                    assistant_message = {
+                        "role": "assistant",
+                        "content": response,
+                        "timestamp": datetime.now().isoformat(),
+                        "cached": bool(cached)
+                    }
+                    
+                    st.session_state.messages.append(assistant_message)
+                    
+                    # Guardar el turno automáticamente
+                    append_agent_history(agent_id, [user_message, assistant_message],
+                                         st.session_state.history_versions)
 
-                    except Exception as e:
-                        error_msg = f"❌ Error: {str(e)}"
-                        st.error(error_msg)
-                        st.session_state.messages.append({
-                            "role": "assistant",
-                            "content": error_msg,
-                            "timestamp": datetime.now().isoformat()
-                        })
+                except Exception as e:
+                    error_msg = f"❌ Error: {str(e)}"
+                    st.error(error_msg)
+                    st.session_state.messages.append({
+                        "role": "assistant",
+                        "content": error_msg,
+                        "timestamp": datetime.now().isoformat()
+                    })
 
 # Estilos CSS
 st.markdown("""
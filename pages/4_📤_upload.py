@@ -1,26 +1,14 @@
 # pages/4_📤_upload.py
 import streamlit as st
 import os
-import tempfile
-from utils.document_manager import DocumentManager
-from langchain_community.document_loaders import (
-    PyPDFLoader, 
-    UnstructuredWordDocumentLoader,
-    UnstructuredEPubLoader,
-    UnstructuredHTMLLoader,
-    UnstructuredPowerPointLoader
-)
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_chroma import Chroma
-from langchain_openai.embeddings import OpenAIEmbeddings
-from langchain_openai import ChatOpenAI
-import fitz  # PyMuPDF
-from docx import Document
-from pptx import Presentation
-import base64
+import time
+from utils.document_manager import DocumentManager, get_document_manager
+from utils.ingestion import SUPPORTED_FORMATS, INGEST_WINDOW_PAGES, find_duplicate
+from utils.ingestion_queue import IngestionQueue, get_worker_pool, format_job_stages
+from utils.embedding_pipeline import EMBEDDING_BATCH_SIZE, EMBEDDING_MAX_WORKERS
+from utils.thumbnails import get_thumbnail_service, stream_sha256
+from utils.downloads import render_download_button
 from pathlib import Path
-import re
-import shutil
 
 st.set_page_config(
     page_title="Subir Documento",
@@ -28,179 +16,52 @@ st.set_page_config(
     layout="wide"
 )
 
-# Configuración de formatos soportados
-SUPPORTED_FORMATS = {
-    "pdf": ("PDF", ".pdf"),
-    "docx": ("Word", ".docx"),
-    "doc": ("Word", ".doc"),
-    "epub": ("EPub", ".epub"),
-    "txt": ("Text", ".txt"),
-    "html": ("HTML", ".html"),
-    "pptx": ("PowerPoint", ".pptx"),
-    "ppt": ("PowerPoint", ".ppt")
-}
-
-def ensure_dir(path):
-    """Asegura que un directorio exista."""
-    os.makedirs(path, exist_ok=True)
-    return path
-
-def clean_filename(filename):
-    """Limpia el nombre del archivo para que sea seguro."""
-    return "".join(c if c.isalnum() or c in "._- " else "_" for c in filename)
-
-def clean_text_with_ai(text: str, llm) -> str:
-    """Usa IA para limpiar y estructurar mejor el texto."""
-    try:
-        prompt = f"""Por favor, limpia y estructura el siguiente texto manteniendo toda la información importante:
-        1. Elimina caracteres extraños y formato innecesario
-        2. Corrige errores obvios de formato
-        3. Mantén la estructura de párrafos y secciones
-        4. No agregues ni modifiques el contenido
-        5. Asegura que el texto sea coherente y legible
-        
-        Texto: {text[:1500]}  # Limitamos para no usar muchos tokens
-        """
-        
-        response = llm.invoke(prompt)
-        return response.content
-    except Exception as e:
-        st.warning(f"No se pudo aplicar limpieza IA: {str(e)}")
-        return text
+def show_job_stages(job):
+    """Muestra el estado y la duración de cada etapa de un trabajo."""
+    st.markdown(format_job_stages(job))
 
-def create_preview_image(file_path: str, output_path: str, file_type: str):
-    """Crea una imagen de vista previa del documento."""
-    try:
-        if file_type == "pdf":
-            doc = fitz.open(file_path)
-            page = doc[0]
-            pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))
-            pix.save(output_path)
-            doc.close()
-        elif file_type in ["ppt", "pptx"]:
-            prs = Presentation(file_path)
-            if len(prs.slides) > 0:
-                slide = prs.slides[0]
-                # Guardar la primera diapositiva como imagen
-                # Nota: Esto requeriría una implementación adicional
-                return False
-        return True
-    except Exception as e:
-        st.warning(f"No se pudo crear vista previa: {str(e)}")
-        return False
+def format_reingest_stats(stats):
+    """Resumen en markdown de una re-ingesta incremental."""
+    if not stats:
+        return ""
+    return f"""**Re-ingesta incremental:**
+                    - Páginas sin cambios: {stats['pages_kept']}
+                    - Páginas nuevas o modificadas: {stats['pages_added']}
+                    - Páginas eliminadas: {stats['pages_removed']}
+                    - Fragmentos agregados: {stats['chunks_added']}
+                    - Fragmentos eliminados: {stats['chunks_deleted']}
+                    """
 
-def get_document_loader(file_path: str, file_type: str):
-    """Retorna el loader apropiado según el tipo de archivo."""
-    loaders = {
-        "pdf": PyPDFLoader,
-        "docx": UnstructuredWordDocumentLoader,
-        "doc": UnstructuredWordDocumentLoader,
-        "epub": UnstructuredEPubLoader,
-        "html": UnstructuredHTMLLoader,
-        "txt": UnstructuredHTMLLoader,
-        "pptx": UnstructuredPowerPointLoader,
-        "ppt": UnstructuredPowerPointLoader
-    }
+def show_next_steps(doc_hash):
+    """Opciones tras procesar (o reutilizar) un documento."""
+    st.markdown("### 🔄 Opciones")
+    col3, col4, col5 = st.columns(3)
     
-    loader_class = loaders.get(file_type)
-    if not loader_class:
-        raise ValueError(f"Formato no soportado: {file_type}")
+    with col3:
+        if st.button("📤 Subir otro documento", use_container_width=True):
+            # Limpiar session state
+            for key in ['doc_metadata', 'uploaded_file', 'processing_options', 'ingestion_job_id', 'duplicate_doc']:
+                if key in st.session_state:
+                    del st.session_state[key]
+            st.session_state.upload_step = 1
+            st.rerun()
     
-    return loader_class(file_path)
-
-def create_download_link(file_path: str, link_text: str):
-    """Crea un link de descarga para un archivo."""
-    try:
-        with open(file_path, "rb") as f:
-            bytes_data = f.read()
-        b64 = base64.b64encode(bytes_data).decode()
-        filename = os.path.basename(file_path)
-        mime_type = "application/octet-stream"
-        href = f'<a href="data:{mime_type};base64,{b64}" download="{filename}" class="download-link">{link_text}</a>'
-        return href
-    except Exception as e:
-        st.error(f"Error al crear link de descarga: {str(e)}")
-        return None
-
-def process_document(file, metadata, temp_dir):
-    """Procesa el documento y crea el vectorstore."""
-    try:
-        # Determinar tipo de archivo
-        file_extension = Path(file.name).suffix.lower()[1:]
-        if file_extension not in SUPPORTED_FORMATS:
-            return {"success": False, "error": "Formato de archivo no soportado"}
+    with col4:
+        if st.button("📚 Ir al Catálogo", use_container_width=True):
+            st.switch_page("pages/1_📚_catalog.py")
+    
+    with col5:
+        if st.button("🤖 Crear Asistente", use_container_width=True):
+            st.session_state.selected_docs = [doc_hash]
+            st.switch_page("pages/2_🤖_agents.py")
 
-        # Preparar directorios
-        safe_title = clean_filename(metadata["title"])
-        doc_dir = ensure_dir(os.path.join("data", "processed_docs", safe_title))
-        
-        # Guardar archivo temporal
-        temp_path = os.path.join(temp_dir, clean_filename(file.name))
-        with open(temp_path, "wb") as f:
-            f.write(file.getvalue())
-        
-        # Guardar copia del original
-        original_path = os.path.join(doc_dir, f"original_{safe_title}{Path(file.name).suffix}")
-        shutil.copy2(temp_path, original_path)
-        
-        # Crear vista previa
-        preview_path = os.path.join(doc_dir, f"{safe_title}_preview.png")
-        preview_created = create_preview_image(temp_path, preview_path, file_extension)
-        
-        # Procesar documento
-        loader = get_document_loader(temp_path, file_extension)
-        documents = loader.load()
-        
-        # Limpiar texto con IA (muestra)
-        llm = ChatOpenAI(temperature=0, max_tokens=500)
-        if documents:
-            st.write("🔍 Analizando y limpiando el texto...")
-            progress_bar = st.progress(0)
-            
-            # Procesar solo una muestra del texto
-            sample_text = documents[0].page_content[:1500]
-            cleaned_text = clean_text_with_ai(sample_text, llm)
-            
-            progress_bar.progress(50)
-            st.info("✨ Muestra de texto limpiado (primer fragmento):")
-            with st.expander("Ver muestra"):
-                st.write(cleaned_text)
-            
-            progress_bar.progress(100)
-        
-        # Dividir en chunks
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=150,
-            separators=["\n\n", "\n", ".", "!", "?", ",", " ", ""],
-            length_function=len
-        )
-        chunks = text_splitter.split_documents(documents)
-        
-        # Crear vectorstore
-        embeddings = OpenAIEmbeddings()
-        vectorstore = Chroma.from_documents(
-            documents=chunks,
-            embedding=embeddings,
-            persist_directory=doc_dir
-        )
-        
-        return {
-            "success": True,
-            "num_pages": len(documents),
-            "num_chunks": len(chunks),
-            "vectorstore_path": doc_dir,
-            "original_path": original_path,
-            "preview_path": preview_path if preview_created else None,
-            "file_type": file_extension,
-            "file_size": os.path.getsize(original_path)
-        }
-        
-    except Exception as e:
-        return {
-            "success": False,
-            "error": str(e)
-        }
+def show_duplicate(title, doc_hash):
+    """Aviso de que el archivo ya estaba en la biblioteca."""
+    st.info(f"""
+    ♻️ Este archivo ya está en la biblioteca como **{title}**.
+    Se reutiliza su vectorstore: no se volvió a procesar ni a embeber.
+    """)
+    show_next_steps(doc_hash)
 
 def main():
     
@@ -213,7 +74,7 @@ def main():
         with col:
             st.markdown(f"**{format_info[0]}** ({format_info[1]})")
     
-    doc_manager = DocumentManager()
+    doc_manager = get_document_manager()
     
     # Progress tracking
     if 'upload_step' not in st.session_state:
@@ -330,6 +191,48 @@ def main():
             - Tamaño: {uploaded_file.size / 1024:.1f} KB
             """)
         
+        # Si el documento ya existe, ofrecer re-ingesta incremental
+        existing_doc = doc_manager.get_document(
+            doc_manager.compute_hash(st.session_state.doc_metadata)
+        )
+        mode = "full"
+        if existing_doc:
+            st.warning("⚠️ Ya existe un documento procesado con este título.")
+            incremental = st.checkbox(
+                "Actualizar solo las páginas modificadas",
+                value=True,
+                help="Compara el nuevo archivo con el vectorstore existente y solo vuelve a embeber las páginas que cambiaron"
+            )
+            mode = "incremental" if incremental else "full"
+        
+        with st.expander("🔧 Opciones de Procesamiento"):
+            batch_size = st.number_input(
+                "Fragmentos por lote",
+                min_value=1,
+                max_value=2048,
+                value=EMBEDDING_BATCH_SIZE,
+                help="Cantidad de fragmentos enviados en cada petición de embeddings"
+            )
+            max_workers = st.slider(
+                "Peticiones concurrentes",
+                min_value=1,
+                max_value=16,
+                value=min(max(EMBEDDING_MAX_WORKERS, 1), 16),
+                help="Se reduce automáticamente si el proveedor limita las peticiones"
+            )
+            streaming = st.checkbox(
+                "Ingesta por ventanas (streaming)",
+                value=True,
+                help="Procesa el documento por bloques de páginas; los primeros fragmentos quedan disponibles antes de terminar"
+            )
+            window_pages = st.number_input(
+                "Páginas por ventana",
+                min_value=1,
+                max_value=500,
+                value=INGEST_WINDOW_PAGES,
+                disabled=not streaming
+            )
+        
         col1, col2 = st.columns(2)
         with col1:
             if st.button("← Volver", use_container_width=True):
@@ -339,110 +242,160 @@ def main():
         with col2:
             if uploaded_file and st.button("Procesar →", use_container_width=True):
                 st.session_state.uploaded_file = uploaded_file
+                st.session_state.pop('ingestion_job_id', None)
+                st.session_state.pop('duplicate_doc', None)
+                st.session_state.processing_options = {
+                    "batch_size": batch_size,
+                    "max_workers": max_workers,
+                    "mode": mode,
+                    "streaming": streaming,
+                    "window_pages": window_pages
+                }
                 st.session_state.upload_step = 3
                 st.rerun()
     
     # Paso 3: Procesamiento
     elif st.session_state.upload_step == 3:
         if hasattr(st.session_state, 'uploaded_file'):
-            with st.spinner("⚙️ Procesando documento..."):
-                with tempfile.TemporaryDirectory() as temp_dir:
-                    result = process_document(
-                        st.session_state.uploaded_file,
-                        st.session_state.doc_metadata,
-                        temp_dir
-                    )
-                    
-                    if result["success"]:
-                        try:
-                            doc_hash = doc_manager.add_document(
-                                st.session_state.doc_metadata,
-                                result["vectorstore_path"],
-                                result["original_path"]
-                            )
-                            
-                            st.success(f"""
-                            ✅ Documento procesado exitosamente:
-                            - 📄 {result["num_pages"]} páginas procesadas
-                            - 📚 {result["num_chunks"]} fragmentos generados
-                            - 💾 {result["file_size"] / 1024:.1f} KB guardados
-                            """)
-                            
-                            # Mostrar información y descargas
-                            st.markdown("### 📑 Archivos Generados")
-                            col1, col2 = st.columns(2)
-                            
-                            with col1:
-                                st.markdown("**📁 Ubicación de archivos:**")
-                                st.code(f"""
+            queue = IngestionQueue()
+            get_worker_pool()
+            
+            # Archivo idéntico a uno ya procesado: reutilizarlo sin encolar
+            if 'ingestion_job_id' not in st.session_state and 'duplicate_doc' not in st.session_state:
+                uploaded_file = st.session_state.uploaded_file
+                uploaded_file.seek(0)
+                file_hash = stream_sha256(uploaded_file)
+                uploaded_file.seek(0)
+                st.session_state.duplicate_doc = find_duplicate(
+                    file_hash,
+                    DocumentManager.compute_hash(st.session_state.doc_metadata),
+                    st.session_state.get('processing_options', {}).get('mode', 'full')
+                )
+            if st.session_state.get('duplicate_doc'):
+                duplicate = st.session_state.duplicate_doc
+                show_duplicate(duplicate['title'], duplicate['hash'])
+                st.stop()
+            
+            # Encolar una sola vez; los reruns solo consultan el estado
+            if 'ingestion_job_id' not in st.session_state:
+                st.session_state.ingestion_job_id = queue.enqueue(
+                    st.session_state.uploaded_file.getvalue(),
+                    st.session_state.uploaded_file.name,
+                    st.session_state.doc_metadata,
+                    st.session_state.get('processing_options', {})
+                )
+            job = queue.get_job(st.session_state.ingestion_job_id)
+            
+            if job['status'] in ('queued', 'running'):
+                if job['status'] == 'queued':
+                    st.info("⏳ Documento en cola, esperando un worker disponible...")
+                else:
+                    st.info("⚙️ Procesando documento en segundo plano...")
+                st.progress(job['progress'], text=job.get('progress_text') or "")
+                show_job_stages(job)
+                st.caption(
+                    "Puedes salir de esta página: el procesamiento continúa en el servidor. "
+                    "Consulta su estado en la página de Procesamiento."
+                )
+                time.sleep(2)
+                st.rerun()
+            
+            elif job['status'] == 'done' and job['result'].get('duplicate_of'):
+                # Otro proceso registró el mismo archivo mientras esperaba en la cola
+                show_duplicate(job['result']['title'], job['result']['duplicate_of'])
+            
+            elif job['status'] == 'done':
+                result = job['result']
+                doc_hash = result['doc_hash']
+                
+                st.success(f"""
+                ✅ Documento procesado exitosamente:
+                - 📄 {result["num_pages"]} páginas procesadas
+                - 📚 {result["num_chunks"]} fragmentos generados
+                - 💾 {result["file_size"] / 1024:.1f} KB guardados
+                """)
+                
+                if result.get('cleaned_sample'):
+                    st.info("✨ Muestra de texto limpiado (primer fragmento):")
+                    with st.expander("Ver muestra"):
+                        st.write(result['cleaned_sample'])
+                
+                # Mostrar información y descargas
+                st.markdown("### 📑 Archivos Generados")
+                col1, col2 = st.columns(2)
+                
+                with col1:
+                    st.markdown("**📁 Ubicación de archivos:**")
+                    st.code(f"""
 Documento original: {result['original_path']}
 Vectorstore: {result['vectorstore_path']}
-                                """)
-                                
-                                st.markdown("**💾 Descargas disponibles:**")
-                                st.markdown(create_download_link(
-                                    result['original_path'],
-                                    "📥 Descargar documento original"
-                                ), unsafe_allow_html=True)
-                            with col2:
-                                if result.get('preview_path'):
-                                    st.image(
-                                        result['preview_path'],
-                                        caption="Vista previa del documento",
-                                        use_column_width=True
-                                    )
-                                else:
-                                    st.info("Vista previa no disponible para este formato")
-                            
-                            # Información del procesamiento
-                            with st.expander("📊 Detalles del Procesamiento"):
-                                st.markdown(f"""
-                                **Información del documento:**
-                                - Formato: {SUPPORTED_FORMATS[result['file_type']][0]}
-                                - Páginas: {result['num_pages']}
-                                - Fragmentos generados: {result['num_chunks']}
-                                - Tamaño: {result['file_size'] / 1024:.1f} KB
-                                
-                                **Rutas del sistema:**
-                                ```
-                                {result['vectorstore_path']}
-                                ```
-                                
-                                **Estado del procesamiento:**
-                                - ✅ Documento original guardado
-                                - ✅ Vectorstore generado
-                                - {'✅' if result.get('preview_path') else '❌'} Vista previa generada
-                                """)
-                            
-                            # Opciones post-procesamiento
-                            st.markdown("### 🔄 Opciones")
-                            col3, col4, col5 = st.columns(3)
-                            
-                            with col3:
-                                if st.button("📤 Subir otro documento", use_container_width=True):
-                                    # Limpiar session state
-                                    for key in ['doc_metadata', 'uploaded_file']:
-                                        if key in st.session_state:
-                                            del st.session_state[key]
-                                    st.session_state.upload_step = 1
-                                    st.rerun()
-                            
-                            with col4:
-                                if st.button("📚 Ir al Catálogo", use_container_width=True):
-                                    st.switch_page("pages/1_📚_catalog.py")
-                            
-                            with col5:
-                                if st.button("🤖 Crear Asistente", use_container_width=True):
-                                    st.session_state.selected_docs = [doc_hash]
-                                    st.switch_page("pages/2_🤖_agents.py")
-                        
-                        except Exception as e:
-                            st.error(f"❌ Error al guardar el documento: {str(e)}")
+                    """)
+                    
+                    st.markdown("**💾 Descargas disponibles:**")
+                    render_download_button(
+                        result['original_path'],
+                        "📥 Descargar documento original",
+                        key="upload_original"
+                    )
+                with col2:
+                    preview = (
+                        get_thumbnail_service().get(result['original_path'], "medium")
+                        or result.get('preview_path')
+                    )
+                    if preview:
+                        st.image(
+                            preview,
+                            caption="Vista previa del documento",
+                            use_column_width=True
+                        )
                     else:
-                        st.error(f"❌ Error al procesar el documento: {result['error']}")
-                        if st.button("← Volver"):
-                            st.session_state.upload_step = 2
-                            st.rerun()
+                        st.info("Vista previa no disponible para este formato")
+                
+                # Información del procesamiento
+                embedding_stats = result['embedding_stats']
+                with st.expander("📊 Detalles del Procesamiento"):
+                    st.markdown(f"""
+                    **Información del documento:**
+                    - Formato: {SUPPORTED_FORMATS[result['file_type']][0]}
+                    - Páginas: {result['num_pages']}
+                    - Fragmentos generados: {result['num_chunks']}
+                    - Tamaño: {result['file_size'] / 1024:.1f} KB
+                    
+                    **Embeddings:**
+                    - Tiempo: {embedding_stats['seconds']:.1f} s
+                    - Rendimiento: {embedding_stats['chunks_per_second']:.1f} fragmentos/s
+                    - Concurrencia final: {embedding_stats['concurrency']}
+                    - Reintentos: {embedding_stats['retries']} ({embedding_stats['rate_limited']} por límite de peticiones)
+                    
+                    **Caché de embeddings:**
+                    - Aciertos: {embedding_stats['cache_hits']}
+                    - Fallos: {embedding_stats['cache_misses']}
+                    - Tokens ahorrados (aprox.): {embedding_stats['tokens_saved']:,}
+                    - Tiempo ahorrado (aprox.): {embedding_stats['seconds_saved']:.1f} s
+                    
+                    {format_reingest_stats(result.get('reingest_stats'))}
+                    **Rutas del sistema:**
+                    ```
+                    {result['vectorstore_path']}
+                    ```
+                    
+                    **Estado del procesamiento:**
+                    - ✅ Documento original guardado
+                    - ✅ Vectorstore generado
+                    - {'✅' if result.get('preview_path') else '❌'} Vista previa generada
+                    """)
+                    show_job_stages(job)
+                
+                # Opciones post-procesamiento
+                show_next_steps(doc_hash)
+            
+            else:
+                st.error(f"❌ Error al procesar el documento: {job.get('error')}")
+                show_job_stages(job)
+                if st.button("← Volver"):
+                    del st.session_state['ingestion_job_id']
+                    st.session_state.upload_step = 2
+                    st.rerun()
 
 # Agregar estilos CSS personalizados
 st.markdown("""
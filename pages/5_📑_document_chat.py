@@ -5,9 +5,14 @@ from langchain.agents.types import AgentType
 from langchain.memory import ConversationBufferMemory
 from langchain.tools import Tool
 from typing import List, Dict
+from utils.retrieval import search_vectorstores
+from utils.document_manager import get_document_manager
+from utils.answer_cache import cached_answer, remember_answer, get_answer_cache
+from utils.agent_streaming import AgentStream
+from utils.chat_history import track_history_version, append_agent_history
 import re
-import json
 import os
+import time
 from datetime import datetime
 import base64
 
@@ -18,22 +23,9 @@ st.set_page_config(
     layout="wide"
 )
 
-# Funciones auxiliares del chat (reutilizadas del chat.py)
-def load_agent_history(agent_id: str) -> List[Dict]:
-    """Carga el historial de conversaciones de un agente específico."""
-    history_path = os.path.join("data", "chat_history", f"{agent_id}.json")
-    if os.path.exists(history_path):
-        with open(history_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return []
-
-def save_agent_history(agent_id: str, messages: List[Dict]):
-    """Guarda el historial de conversaciones de un agente."""
-    os.makedirs(os.path.join("data", "chat_history"), exist_ok=True)
-    history_path = os.path.join("data", "chat_history", f"{agent_id}.json")
-    with open(history_path, 'w', encoding='utf-8') as f:
-        json.dump(messages, f, ensure_ascii=False, indent=2)
+CACHED_ANSWER_CAPTION = "⚡ Respuesta reutilizada de una pregunta similar"
 
+# Funciones auxiliares del chat (reutilizadas del chat.py)
 def format_timestamp(timestamp: str) -> str:
     """Formatea un timestamp para mostrar."""
     dt = datetime.fromisoformat(timestamp)
@@ -44,6 +36,8 @@ def show_chat_message(message: Dict, show_timestamp: bool = True):
     with st.chat_message(message["role"]):
         if show_timestamp and "timestamp" in message:
             st.caption(format_timestamp(message["timestamp"]))
+        if message.get("cached"):
+            st.caption(CACHED_ANSWER_CAPTION)
         st.markdown(message["content"])
 
 def get_agent_id(config: Dict) -> str:
@@ -194,32 +188,41 @@ def display_content_viewer(pdf_path: str):
                 </div>
             </div>
             """, unsafe_allow_html=True)
-def get_document_info(vectorstores: List[Dict]) -> List[Dict]:
+def get_document_info(config: Dict) -> List[Dict]:
     """
-    Extrae información de los vectorstores para el selector.
-    La estructura es:
-    processed_docs/[NOMBRE_AGENTE]/[ARCHIVO].pdf
+    Extrae información de los documentos del agente para el selector.
+    Cada documento se busca por su hash en el registro: el PDF es su
+    `original_path` o, si no está, los PDF de su carpeta (`vectorstore_path`).
     """
-    # Obtener el nombre del agente de la configuración
-    agent_name = vectorstores[0]['title']  # Usamos el título como nombre del agente
+    doc_manager = get_document_manager()
     docs_info = []
-    
-    # Directorio base donde están los PDFs del agente
-    agent_dir = os.path.join('data/processed_docs', agent_name)
-    
-    # Si el directorio existe, buscar los PDFs
-    if os.path.exists(agent_dir):
-        # Listar todos los PDFs en el directorio del agente
-        pdf_files = [f for f in os.listdir(agent_dir) if f.endswith('.pdf')]
-        
-        for pdf_file in pdf_files:
-            pdf_path = os.path.join(agent_dir, pdf_file)
+    seen_hashes = set()
+
+    for vs in config['vectorstores']:
+        if vs['hash'] in seen_hashes:
+            continue
+        seen_hashes.add(vs['hash'])
+        doc = doc_manager.get_document(vs['hash'])
+        if not doc:
+            continue
+        doc_dir = doc.get('vectorstore_path', '')
+        original_path = doc.get('original_path', '')
+
+        if original_path.endswith('.pdf') and os.path.exists(original_path):
+            pdf_paths = [original_path]
+        elif doc_dir and os.path.isdir(doc_dir):
+            pdf_paths = [os.path.join(doc_dir, f) for f in sorted(os.listdir(doc_dir)) if f.endswith('.pdf')]
+        else:
+            pdf_paths = []
+
+        for pdf_path in pdf_paths:
             docs_info.append({
-                'title': os.path.splitext(pdf_file)[0],  # Nombre del PDF sin extensión
+                'title': doc.get('title', vs['title']),
                 'path': pdf_path,
-                'agent_name': agent_name
+                'doc_dir': doc_dir,
+                'agent_name': config['name']
             })
-    
+
     return docs_info
 
 
@@ -240,6 +243,7 @@ def main():
 
     config = st.session_state.current_agent_config
     agent_id = get_agent_id(config)
+    track_history_version(agent_id, st.session_state.setdefault("history_versions", {}))
 
     # Layout principal con dos columnas
     doc_col, chat_col = st.columns([1.2, 0.8])
@@ -250,7 +254,7 @@ def main():
         
         try:
             # Obtener información de documentos
-            docs_info = get_document_info(config['vectorstores'])
+            docs_info = get_document_info(config)
             
             if docs_info:
                 # Mostrar el nombre del agente
@@ -272,16 +276,16 @@ def main():
                         No se encontró el archivo PDF.
                         Buscando en: {selected_doc['path']}
                         
-                        Estructura esperada:
-                        processed_docs/
-                        └── {selected_doc['agent_name']}/
-                            └── [archivos PDF]
+                        Carpeta registrada del documento:
+                        {selected_doc['doc_dir']}
                         """)
             else:
+                doc_dirs = [doc.get('vectorstore_path', '') for doc in
+                            (get_document_manager().get_document(vs['hash']) for vs in config['vectorstores']) if doc]
                 st.warning(f"""
                 No se encontraron documentos PDF.
-                Verifica que existan archivos PDF en la carpeta:
-                processed_docs/{config['vectorstores'][0]['title']}/
+                Verifica que existan archivos PDF en las carpetas registradas:
+                {', '.join(doc_dirs) or 'ninguna'}
                 """)
                 
         except Exception as e:
@@ -300,6 +304,12 @@ def main():
             - 💬 Estilo: {config['style']}
             - 📝 Nivel: {config['detail_level']}
             """)
+            if config.get('answer_cache') and config.get('id'):
+                answers = get_answer_cache().stats(config['id'])
+                st.markdown(f"""
+                - ⚡ Caché de respuestas: {answers['hit_rate']:.0%} de aciertos ({answers['hits']}/{answers['hits'] + answers['misses']})
+                - ⏱️ Tiempo ahorrado: {answers['saved_seconds']:.0f} s
+                """)
 
         # Chat container con scroll
         chat_container = st.container()
@@ -331,32 +341,23 @@ def main():
             show_chat_message(user_message)
 
             with st.chat_message("assistant"):
-                with st.spinner(f"💭 {config['name']} está pensando..."):
-                    try:
+                try:
+                    with st.spinner(f"💭 {config['name']} está pensando..."):
+                        # Reutilizar la respuesta a una primera pregunta casi igual (si el agente lo permite)
+                        cached = cached_answer(config, prompt, st.session_state.messages)
+
                         # Inicializar agente si no existe
-                        if "agent" not in st.session_state:
+                        if not cached and "agent" not in st.session_state:
                             llm = ChatOpenAI(
                                 temperature=config['temperature'],
                                 model="gpt-4-0125-preview",
-                                max_tokens=config['max_tokens']
+                                max_tokens=config['max_tokens'],
+                                streaming=True
                             )
 
                             def search_documents(query: str) -> str:
                                 """Buscar información en los documentos base."""
-                                try:
-                                    results = []
-                                    for vs in config['vectorstores']:
-                                        docs = vs['retriever'].get_relevant_documents(query)
-                                        for doc in docs:
-                                            content = doc.page_content.strip()
-                                            source = vs['title']
-                                            if content not in [r.split(']:')[1].strip() for r in results]:
-                                                results.append(f"[{source}]: {content}")
-                                    if results:
-                                        return "\n\n".join(results[:config['context_window']])
-                                    return "No encontré información específica. ¿Podrías reformular la pregunta?"
-                                except Exception as e:
-                                    return f"Error al buscar: {str(e)}"
+                                return search_vectorstores(config, query)
 
                             tools = [
                                 Tool(
@@ -398,26 +399,42 @@ def main():
                         5. Si no encuentras información, sugiere cómo reformular la pregunta
                         """
                         
-                        response = st.session_state.agent.run(prompt_text)
-                        
-                        assistant_message = {
-                            "role": "assistant",
-                            "content": response,
-                            "timestamp": datetime.now().isoformat()
-                        }
-                        
+                        if cached:
+                            response = cached['answer']
+                        else:
+                            # La espera visible termina con el primer token de la respuesta
+                            started = time.perf_counter()
+                            stream = AgentStream(st.session_state.agent, prompt_text)
+                            stream.wait_first_token()
+
+                    if cached:
+                        st.caption(CACHED_ANSWER_CAPTION)
                         st.markdown(response)
-                        st.session_state.messages.append(assistant_message)
-                        save_agent_history(agent_id, st.session_state.messages)
-
-                    except Exception as e:
-                        error_msg = f"❌ Error: {str(e)}"
-                        st.error(error_msg)
-                        st.session_state.messages.append({
-                            "role": "assistant",
-                            "content": error_msg,
-                            "timestamp": datetime.now().isoformat()
-                        })
+                    else:
+                        st.write_stream(stream)
+                        response = stream.result
+                        remember_answer(config, prompt, st.session_state.messages, response,
+                                        time.perf_counter() - started)
+                    
+                    assistant_message = {
+                        "role": "assistant",
+                        "content": response,
+                        "timestamp": datetime.now().isoformat(),
+                        "cached": bool(cached)
+                    }
+                    
+                    st.session_state.messages.append(assistant_message)
+                    append_agent_history(agent_id, [user_message, assistant_message],
+                                         st.session_state.history_versions)
+
+                except Exception as e:
+                    error_msg = f"❌ Error: {str(e)}"
+                    st.error(error_msg)
+                    st.session_state.messages.append({
+                        "role": "assistant",
+                        "content": error_msg,
+                        "timestamp": datetime.now().isoformat()
+                    })
 
 # Agregar estilos CSS adicionales
 st.markdown("""
@@ -0,0 +1,79 @@
+# pages/6_⏳_jobs.py
+import streamlit as st
+import time
+from datetime import datetime
+from utils.ingestion_queue import IngestionQueue, get_worker_pool, format_job_stages
+
+st.set_page_config(
+    page_title="Procesamiento de Documentos",
+    page_icon="⏳",
+    layout="wide"
+)
+
+STATUS_LABELS = {
+    "queued": "⏳ En cola",
+    "running": "⚙️ Procesando",
+    "done": "✅ Completado",
+    "failed": "❌ Error"
+}
+
+def format_date(date_str):
+    """Formatea la fecha ISO a un formato más legible."""
+    try:
+        return datetime.fromisoformat(date_str).strftime("%d/%m/%Y %H:%M:%S")
+    except (TypeError, ValueError):
+        return "-"
+
+def main():
+    st.title("⏳ Procesamiento de Documentos")
+    
+    queue = IngestionQueue()
+    pool = get_worker_pool()
+    jobs = queue.list_jobs(limit=100)
+    
+    # Resumen de la cola
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("En cola", sum(1 for job in jobs if job['status'] == 'queued'))
+    with col2:
+        st.metric("Procesando", sum(1 for job in jobs if job['status'] == 'running'))
+    with col3:
+        st.metric("Completados", sum(1 for job in jobs if job['status'] == 'done'))
+    with col4:
+        st.metric("Workers", pool.max_workers)
+    
+    auto_refresh = st.toggle("Actualizar automáticamente", value=True)
+    
+    if not jobs:
+        st.info("No hay trabajos de procesamiento registrados.")
+    
+    for job in jobs:
+        title = job['metadata'].get('title', job['file_name'])
+        with st.expander(f"{STATUS_LABELS.get(job['status'], job['status'])} · {title}",
+                         expanded=job['status'] == 'running'):
+            col1, col2 = st.columns([2, 1])
+            with col1:
+                if job['status'] in ('queued', 'running'):
+                    st.progress(job['progress'], text=job.get('progress_text') or "")
+                
+                # Estado y duración de cada etapa
+                st.markdown(format_job_stages(job))
+                
+                if job.get('error'):
+                    st.error(job['error'])
+            
+            with col2:
+                st.markdown(f"""
+                - **Archivo:** {job['file_name']}
+                - **Encolado:** {format_date(job['created_at'])}
+                - **Inicio:** {format_date(job.get('started_at'))}
+                - **Fin:** {format_date(job.get('finished_at'))}
+                """)
+    
+    # Sondear mientras haya trabajos pendientes
+    if auto_refresh and any(job['status'] in ('queued', 'running') for job in jobs):
+        time.sleep(3)
+        st.rerun()
+
+if __name__ == "__main__":
+    main()
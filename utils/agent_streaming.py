@@ -0,0 +1,93 @@
+# utils/agent_streaming.py
+"""Respuesta del agente ReAct token a token para `st.write_stream`.
+
+El agente corre en un hilo aparte con un callback que recibe los tokens del
+LLM. Los pasos intermedios (Thought / Action / Observation) no se
+muestran: solo se entrega lo que el modelo escribe después de
+FINAL_ANSWER_PREFIX, de modo que el estudiante ve la respuesta en cuanto el
+agente empieza a redactarla.
+"""
+import queue
+import threading
+from typing import Any, Iterator, Optional
+from langchain_core.callbacks import BaseCallbackHandler
+
+# Marca con la que el agente ZERO_SHOT_REACT_DESCRIPTION empieza la respuesta
+FINAL_ANSWER_PREFIX = "Final Answer:"
+
+_DONE = object()
+
+
+class FinalAnswerStreamHandler(BaseCallbackHandler):
+    """Pasa a una cola los tokens posteriores a FINAL_ANSWER_PREFIX."""
+
+    def __init__(self, tokens: "queue.Queue"):
+        self.tokens = tokens
+        self._buffer = ""
+        self._answering = False
+
+    def on_llm_start(self, *args: Any, **kwargs: Any) -> None:
+        # Cada paso del agente es una llamada nueva al LLM
+        self._buffer = ""
+        self._answering = False
+
+    def on_chat_model_start(self, *args: Any, **kwargs: Any) -> None:
+        self.on_llm_start()
+
+    def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
+        if self._answering:
+            self.tokens.put(token)
+            return
+        self._buffer += token
+        position = self._buffer.find(FINAL_ANSWER_PREFIX)
+        if position >= 0:
+            self._answering = True
+            rest = self._buffer[position + len(FINAL_ANSWER_PREFIX):].lstrip()
+            if rest:
+                self.tokens.put(rest)
+
+
+class AgentStream:
+    """Ejecuta `agent.run(prompt)` en un hilo e itera los tokens de la respuesta final.
+
+    Al terminar la iteración, `result` tiene la respuesta que retornó el
+    agente (la que debe guardarse en el historial). Si el agente termina sin
+    haber emitido tokens (p. ej. por el límite de iteraciones), se entrega
+    esa respuesta completa; si falla, el error se relanza al iterar.
+    """
+
+    def __init__(self, agent, prompt: str):
+        self.result: Optional[str] = None
+        self.error: Optional[BaseException] = None
+        self._tokens: "queue.Queue" = queue.Queue()
+        self._first: Optional[Any] = None
+        self._thread = threading.Thread(target=self._run, args=(agent, prompt),
+                                        name="agent-stream", daemon=True)
+        self._thread.start()
+
+    def _run(self, agent, prompt: str) -> None:
+        try:
+            self.result = agent.run(prompt, callbacks=[FinalAnswerStreamHandler(self._tokens)])
+        except BaseException as e:
+            self.error = e
+        finally:
+            self._tokens.put(_DONE)
+
+    def wait_first_token(self) -> None:
+        """Bloquear hasta el primer token de la respuesta o hasta que el agente termine."""
+        if self._first is None:
+            self._first = self._tokens.get()
+
+    def __iter__(self) -> Iterator[str]:
+        self.wait_first_token()
+        item, self._first = self._first, _DONE
+        streamed = False
+        while item is not _DONE:
+            streamed = True
+            yield item
+            item = self._tokens.get()
+        self._thread.join()
+        if self.error is not None:
+            raise self.error
+        if not streamed and self.result:
+            yield self.result
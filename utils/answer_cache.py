@@ -0,0 +1,177 @@
+# utils/answer_cache.py
+"""Caché semántica de respuestas por agente (opcional, clave `answer_cache`).
+
+Cuando muchos estudiantes hacen la misma pregunta al mismo agente, la
+respuesta de la primera ejecución del ReAct se reutiliza para las
+siguientes cuyo embedding tenga similitud coseno de al menos
+ANSWER_CACHE_THRESHOLD con la pregunta guardada. Las entradas vencen tras
+ANSWER_CACHE_TTL_SECONDS y, al superar ANSWER_CACHE_MAX_ENTRIES en todo el
+proceso, se descartan las usadas hace más tiempo.
+
+Cada entrada recuerda la huella del conjunto de documentos del agente
+(hash y fecha de procesamiento de cada uno): si alguno se vuelve a ingerir
+la huella cambia y las respuestas anteriores del agente se descartan.
+
+Solo se guardan y reutilizan respuestas a la primera pregunta de una
+conversación: la respuesta a un seguimiento ("dame un ejemplo") depende del
+historial, que no forma parte de la clave.
+"""
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from utils.document_manager import get_document_manager
+from utils.query_embeddings import get_query_embeddings
+
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", str(24 * 3600)))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "2000"))
+
+
+def docs_fingerprint(config: Dict) -> str:
+    """Huella de los documentos del agente; cambia si alguno se re-ingiere."""
+    doc_manager = get_document_manager()
+    parts = []
+    for doc_hash in sorted({vs['hash'] for vs in config['vectorstores']}):
+        doc = doc_manager.get_document(doc_hash) or {}
+        parts.append(f"{doc_hash}:{doc.get('processed_date', '')}")
+    return hashlib.sha256("|".join(parts).encode()).hexdigest()
+
+
+def _normalize(vector: List[float]) -> np.ndarray:
+    array = np.asarray(vector, dtype=np.float32)
+    return array / max(float(np.linalg.norm(array)), 1e-12)
+
+
+class AnswerCache:
+    """Respuestas guardadas por (agente, pregunta), con LRU global y vencimiento."""
+
+    def __init__(self, threshold: float = ANSWER_CACHE_THRESHOLD,
+                 ttl_seconds: float = ANSWER_CACHE_TTL_SECONDS,
+                 max_entries: int = ANSWER_CACHE_MAX_ENTRIES):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        # Orden de uso de todas las entradas: (agente, número de entrada)
+        self._entries: "OrderedDict[Tuple[str, int], Dict]" = OrderedDict()
+        self._by_agent: Dict[str, Dict[int, Dict]] = {}
+        self._next_id = 0
+        self._stats: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def _agent_stats(self, agent_id: str) -> Dict:
+        return self._stats.setdefault(agent_id, {"hits": 0, "misses": 0, "saved_seconds": 0.0})
+
+    def _remove(self, key: Tuple[str, int]) -> None:
+        self._entries.pop(key, None)
+        agent_entries = self._by_agent.get(key[0])
+        if agent_entries is not None:
+            agent_entries.pop(key[1], None)
+            if not agent_entries:
+                del self._by_agent[key[0]]
+
+    def lookup(self, agent_id: str, embedding: List[float], fingerprint: str) -> Optional[Dict]:
+        """La entrada más parecida por encima del umbral, o None.
+
+        Las entradas son {question, answer, embedding, fingerprint, created,
+        seconds}, donde `seconds` es lo que tardó la ejecución original.
+        """
+        started = time.perf_counter()
+        query = _normalize(embedding)
+        now = time.time()
+        with self._lock:
+            stats = self._agent_stats(agent_id)
+            best_key, best_score = None, self.threshold
+            for entry_id, entry in list(self._by_agent.get(agent_id, {}).items()):
+                if entry["fingerprint"] != fingerprint or now - entry["created"] > self.ttl_seconds:
+                    self._remove((agent_id, entry_id))
+                    continue
+                score = float(entry["embedding"] @ query)
+                if score >= best_score:
+                    best_key, best_score = (agent_id, entry_id), score
+            if best_key is None:
+                stats["misses"] += 1
+                return None
+            self._entries.move_to_end(best_key)
+            entry = self._entries[best_key]
+            stats["hits"] += 1
+            stats["saved_seconds"] += max(entry["seconds"] - (time.perf_counter() - started), 0.0)
+            return entry
+
+    def store(self, agent_id: str, question: str, embedding: List[float], answer: str,
+              fingerprint: str, seconds: float) -> None:
+        """Guardar la respuesta de una ejecución completa del agente."""
+        entry = {
+            "question": question,
+            "answer": answer,
+            "embedding": _normalize(embedding),
+            "fingerprint": fingerprint,
+            "created": time.time(),
+            "seconds": seconds
+        }
+        with self._lock:
+            key = (agent_id, self._next_id)
+            self._next_id += 1
+            self._entries[key] = entry
+            self._by_agent.setdefault(agent_id, {})[key[1]] = entry
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def stats(self, agent_id: Optional[str] = None) -> Dict:
+        """Aciertos, fallos, tasa de aciertos y segundos ahorrados (de un agente o de todos)."""
+        with self._lock:
+            if agent_id is not None:
+                selected = [self._stats.get(agent_id, {"hits": 0, "misses": 0, "saved_seconds": 0.0})]
+                entries = len(self._by_agent.get(agent_id, {}))
+            else:
+                selected = list(self._stats.values())
+                entries = len(self._entries)
+            hits = sum(s["hits"] for s in selected)
+            misses = sum(s["misses"] for s in selected)
+            return {
+                "hits": hits,
+                "misses": misses,
+                "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+                "saved_seconds": sum(s["saved_seconds"] for s in selected),
+                "entries": entries
+            }
+
+
+_instance: Optional[AnswerCache] = None
+_instance_lock = threading.Lock()
+
+
+def get_answer_cache() -> AnswerCache:
+    """Instancia compartida por todas las sesiones del proceso."""
+    global _instance
+    with _instance_lock:
+        if _instance is None:
+            _instance = AnswerCache()
+        return _instance
+
+
+def cacheable(config: Dict, messages: List[Dict]) -> bool:
+    """Si el agente usa la caché y la pregunta actual (último mensaje) abre la conversación."""
+    if not config.get('answer_cache') or not config.get('id') or not config['vectorstores']:
+        return False
+    return not any(message["role"] == "user" for message in messages[:-1])
+
+
+def cached_answer(config: Dict, question: str, messages: List[Dict]) -> Optional[Dict]:
+    """Respuesta reutilizable para `question`, si el agente tiene la caché activada."""
+    if not cacheable(config, messages):
+        return None
+    embedding = get_query_embeddings().embed_query(question)
+    return get_answer_cache().lookup(config['id'], embedding, docs_fingerprint(config))
+
+
+def remember_answer(config: Dict, question: str, messages: List[Dict], answer: str, seconds: float) -> None:
+    """Guardar la respuesta de una ejecución completa del agente."""
+    if not cacheable(config, messages):
+        return
+    # La consulta ya está en la caché de embeddings desde `cached_answer`
+    embedding = get_query_embeddings().embed_query(question)
+    get_answer_cache().store(config['id'], question, embedding, answer, docs_fingerprint(config), seconds)
@@ -0,0 +1,266 @@
+# utils/bulk_ingest.py
+"""Ingesta masiva de documentos desde la línea de comandos.
+
+Uso:
+    python -m utils.bulk_ingest <directorio> --manifest manifest.csv --workers 4
+
+El manifiesto (CSV o JSON) asocia cada archivo, por ruta relativa al
+directorio o por nombre, con su metadata: title, category, type, level,
+language, author, year, tags y description. Los documentos ya registrados
+en metadata.json se omiten, por lo que el comando puede reanudarse; con
+--reingest se actualizan de forma incremental.
+
+Sin manifiesto el título es el nombre del archivo: dos archivos con el
+mismo nombre en distintas carpetas serían el mismo documento, así que solo
+se procesa el primero y se avisa del choque. Las categorías que aún no
+existen se agregan a data/categories.json para poder filtrarlas en el
+catálogo y al crear agentes.
+"""
+import os
+import csv
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+
+DEFAULT_EXTENSIONS = ["pdf", "docx", "pptx"]
+DEFAULT_METADATA = {
+    "category": "Sin categoría",
+    "type": "Material de Curso",
+    "level": "Intermedio",
+    "language": "Español",
+    "author": "",
+    "year": datetime.now().year,
+    "tags": [],
+    "description": ""
+}
+
+
+def load_manifest(manifest_path: Optional[str]) -> Dict[str, Dict]:
+    """Cargar el manifiesto CSV/JSON indexado por la columna `file`."""
+    if not manifest_path:
+        return {}
+
+    if manifest_path.lower().endswith(".json"):
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        # Se acepta una lista de entradas o un dict {archivo: metadata}
+        if isinstance(data, dict):
+            entries = [{"file": key, **value} for key, value in data.items()]
+        else:
+            entries = data
+    else:
+        with open(manifest_path, "r", encoding="utf-8-sig", newline="") as f:
+            entries = list(csv.DictReader(f))
+
+    manifest = {}
+    for entry in entries:
+        file_key = (entry.pop("file", "") or "").strip()
+        if not file_key:
+            continue
+        tags = entry.get("tags", [])
+        if isinstance(tags, str):
+            entry["tags"] = [tag.strip() for tag in tags.split(",") if tag.strip()]
+        if entry.get("year"):
+            entry["year"] = int(entry["year"])
+        manifest[Path(file_key).as_posix()] = {k: v for k, v in entry.items() if v not in (None, "")}
+    return manifest
+
+
+def find_documents(directory: str, extensions: List[str]) -> List[str]:
+    """Buscar recursivamente los documentos soportados."""
+    found = []
+    for root, _, files in os.walk(directory):
+        for name in sorted(files):
+            if Path(name).suffix.lower()[1:] in extensions:
+                found.append(os.path.join(root, name))
+    return sorted(found)
+
+
+def build_metadata(file_path: str, directory: str, manifest: Dict[str, Dict]) -> Dict:
+    """Combinar los valores por defecto con la entrada del manifiesto."""
+    relative = Path(os.path.relpath(file_path, directory)).as_posix()
+    entry = manifest.get(relative) or manifest.get(Path(file_path).name) or {}
+    return {
+        **DEFAULT_METADATA,
+        "title": Path(file_path).stem,
+        **entry
+    }
+
+
+def ingest_file(file_path: str, metadata: Dict, options: Dict) -> Dict:
+    """Procesar un archivo (se ejecuta en un proceso del pool)."""
+    from utils.ingestion import process_document
+
+    started = time.perf_counter()
+    result = process_document(file_path, os.path.basename(file_path), metadata, **options)
+    result["seconds"] = time.perf_counter() - started
+    return result
+
+
+def run(directory: str, manifest_path: Optional[str], workers: int,
+        extensions: List[str], options: Dict, reingest: bool = False) -> Dict:
+    """Ingerir un árbol de directorios e imprimir un resumen de rendimiento."""
+    from utils.document_manager import DocumentManager
+    from utils.ingestion import discard_partial_document
+    from utils.thumbnails import file_sha256
+
+    doc_manager = DocumentManager()
+    manifest = load_manifest(manifest_path)
+
+    # Reanudar: omitir documentos ya registrados y completos
+    pending: List[Tuple[str, Dict, str]] = []
+    skipped = 0
+    duplicates = 0
+    collisions = 0
+    seen_files: Dict[str, str] = {}
+    seen_docs: Dict[str, str] = {}
+    # Documentos sin registro previo: si fallan, no debe quedar nada de ellos
+    new_docs = set()
+    for file_path in find_documents(directory, extensions):
+        metadata = build_metadata(file_path, directory, manifest)
+        doc_hash = doc_manager.compute_hash(metadata)
+        # Mismo título, autor y año que otro archivo del lote: procesarlos a la
+        # vez reconstruiría la misma carpeta y colección en paralelo
+        if doc_hash in seen_docs:
+            collisions += 1
+            print(f"⚠️ {file_path}: mismo título, autor y año que {seen_docs[doc_hash]}; se omite "
+                  f"(asígnale otro título en el manifiesto)")
+            continue
+        seen_docs[doc_hash] = file_path
+        existing = doc_manager.get_document(doc_hash)
+        if existing and existing.get("status", "ready") == "ready" and not reingest:
+            skipped += 1
+            continue
+        # Copias del mismo archivo dentro del lote: solo se procesa la primera
+        file_hash = file_sha256(file_path)
+        if file_hash in seen_files:
+            duplicates += 1
+            print(f"♻️ {file_path}: mismo archivo que {seen_files[file_hash]}")
+            continue
+        seen_files[file_hash] = file_path
+        # Los documentos ya existentes se actualizan solo en las páginas modificadas
+        mode = "incremental" if existing and reingest else "full"
+        pending.append((file_path, metadata, mode))
+        if existing is None:
+            new_docs.add(doc_hash)
+
+    added = doc_manager.add_categories([metadata["category"] for _, metadata, _ in pending])
+    if added:
+        print(f"🏷️ Categorías nuevas: {', '.join(added)}")
+
+    print(f"📚 {len(pending)} documentos por procesar, {skipped} ya registrados, {workers} workers")
+
+    summary = {"processed": 0, "failed": 0, "skipped": skipped, "duplicates": duplicates,
+               "collisions": collisions,
+               "pages": 0, "chunks": 0, "cache_hits": 0, "cache_misses": 0}
+    started = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(ingest_file, file_path, metadata, {**options, "mode": mode}): (file_path, metadata)
+            for file_path, metadata, mode in pending
+        }
+        for future in as_completed(futures):
+            file_path, metadata = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {"success": False, "error": str(e)}
+
+            if not result["success"]:
+                summary["failed"] += 1
+                print(f"❌ {file_path}: {result['error']}")
+                # Sin esto, al reanudar la carpeta parcial obligaría a usar <título>_<hash>
+                doc_hash = doc_manager.compute_hash(metadata)
+                if doc_hash in new_docs:
+                    try:
+                        discard_partial_document(doc_hash, result.get("vectorstore_path"))
+                    except Exception as e:
+                        print(f"   No se pudo limpiar el intento fallido: {str(e)}")
+                continue
+
+            if result.get("duplicate_of"):
+                summary["duplicates"] += 1
+                print(f"♻️ {file_path}: ya está en la biblioteca como «{result['title']}»")
+                continue
+
+            # El registro se hace en este proceso para no competir por metadata.json
+            doc_manager.add_document(
+                {**metadata, "status": "ready",
+                 "pages": result["num_pages"], "chunks": result["num_chunks"],
+                 "vector_storage": result["vector_storage"], "file_hash": result["file_hash"]},
+                result["vectorstore_path"],
+                result["original_path"]
+            )
+            stats = result["embedding_stats"]
+            summary["processed"] += 1
+            summary["pages"] += result["num_pages"]
+            summary["chunks"] += result["num_chunks"]
+            summary["cache_hits"] += stats["cache_hits"]
+            summary["cache_misses"] += stats["cache_misses"]
+            print(f"✅ {file_path}: {result['num_pages']} páginas, "
+                  f"{result['num_chunks']} fragmentos en {result['seconds']:.1f} s")
+            if result.get("reingest_stats"):
+                changes = result["reingest_stats"]
+                print(f"   ↻ {changes['pages_added']} páginas re-embebidas, "
+                      f"{changes['pages_kept']} sin cambios, {changes['pages_removed']} eliminadas")
+
+    elapsed = time.perf_counter() - started
+    summary["seconds"] = elapsed
+
+    print("\n📊 Resumen")
+    print(f"- Procesados: {summary['processed']} · Omitidos: {summary['skipped']} · "
+          f"Duplicados: {summary['duplicates']} · Títulos repetidos: {summary['collisions']} · "
+          f"Errores: {summary['failed']}")
+    print(f"- Páginas: {summary['pages']} · Fragmentos: {summary['chunks']}")
+    print(f"- Caché de embeddings: {summary['cache_hits']} aciertos, {summary['cache_misses']} fallos")
+    print(f"- Tiempo total: {elapsed:.1f} s")
+    if elapsed > 0:
+        print(f"- Rendimiento: {summary['processed'] / elapsed * 60:.1f} documentos/min, "
+              f"{summary['pages'] / elapsed:.1f} páginas/s, {summary['chunks'] / elapsed:.1f} fragmentos/s")
+    return summary
+
+
+def main():
+    from utils.embedding_pipeline import EMBEDDING_BATCH_SIZE, EMBEDDING_MAX_WORKERS
+    from utils.ingestion import INGEST_WINDOW_PAGES
+
+    parser = argparse.ArgumentParser(description="Ingesta masiva de documentos para Yachani")
+    parser.add_argument("directory", help="Directorio con los documentos a procesar")
+    parser.add_argument("--manifest", help="Manifiesto CSV o JSON con la metadata de cada archivo")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help="Procesos de ingesta en paralelo")
+    parser.add_argument("--extensions", default=",".join(DEFAULT_EXTENSIONS),
+                        help="Extensiones a incluir, separadas por comas")
+    parser.add_argument("--batch-size", type=int, default=EMBEDDING_BATCH_SIZE,
+                        help="Fragmentos por petición de embeddings")
+    parser.add_argument("--embedding-workers", type=int, default=EMBEDDING_MAX_WORKERS,
+                        help="Peticiones de embeddings concurrentes por documento")
+    parser.add_argument("--window-pages", type=int, default=INGEST_WINDOW_PAGES,
+                        help="Páginas por ventana en la ingesta streaming")
+    parser.add_argument("--reingest", action="store_true",
+                        help="Re-ingerir documentos ya registrados, embebiendo solo las páginas modificadas")
+    args = parser.parse_args()
+
+    run(
+        args.directory,
+        args.manifest,
+        args.workers,
+        [ext.strip().lower().lstrip(".") for ext in args.extensions.split(",") if ext.strip()],
+        {
+            "batch_size": args.batch_size,
+            "max_workers": args.embedding_workers,
+            "window_pages": args.window_pages
+        },
+        reingest=args.reingest
+    )
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    main()
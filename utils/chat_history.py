@@ -0,0 +1,69 @@
+# utils/chat_history.py
+"""Historial de conversaciones por agente (data/chat_history/<agente>.json).
+
+Lo comparten las páginas de chat. Cada turno se agrega con
+`append_agent_history`, que combina bajo el bloqueo del archivo los mensajes
+que otras sesiones hayan guardado entretanto; `save_agent_history` reemplaza
+el historial completo por la conversación de una sesión, solo si nadie lo
+cambió desde la última versión que esa sesión vio.
+
+`versions` es el diccionario {agente: versión vista} de cada sesión (en las
+páginas, `st.session_state["history_versions"]`).
+"""
+import os
+from typing import Dict, List
+from utils.json_store import JSONStore, VersionConflict
+
+CHAT_HISTORY_DIR = os.path.join("data", "chat_history")
+
+
+def history_store(agent_id: str) -> JSONStore:
+    """Archivo del historial de conversaciones de un agente."""
+    return JSONStore(os.path.join(CHAT_HISTORY_DIR, f"{agent_id}.json"), default=list)
+
+
+def track_history_version(agent_id: str, versions: Dict) -> None:
+    """Recordar la versión del historial que vio la sesión al empezar."""
+    versions.setdefault(agent_id, history_store(agent_id).version())
+
+
+def load_agent_history(agent_id: str) -> List[Dict]:
+    """Carga el historial de conversaciones de un agente específico."""
+    return history_store(agent_id).load()
+
+
+def append_agent_history(agent_id: str, messages: List[Dict], versions: Dict) -> None:
+    """Agrega al historial los mensajes de un turno (guardado automático)."""
+    store = history_store(agent_id)
+    # Si otra sesión escribió entretanto, esta sesión sigue sin haber visto su versión
+    seen = store.version() == versions.get(agent_id)
+
+    def merge(history):
+        # Conservar los mensajes que otras sesiones hayan guardado entretanto
+        saved = {(m.get("timestamp"), m["role"], m["content"]) for m in history}
+        history.extend(
+            m for m in messages
+            if (m.get("timestamp"), m["role"], m["content"]) not in saved
+        )
+
+    _, _, version = store.update(merge)
+    if seen:
+        versions[agent_id] = version
+
+
+def save_agent_history(agent_id: str, messages: List[Dict], versions: Dict) -> bool:
+    """Reemplaza el historial guardado por la conversación de esta sesión.
+
+    Retorna False sin escribir si otra sesión guardó el historial desde la
+    última vez que esta lo vio; un segundo intento ya lo reemplaza.
+    """
+    store = history_store(agent_id)
+    expected = versions.get(agent_id)
+    try:
+        if expected is None and store.version() is not None:
+            raise VersionConflict(store.path)
+        versions[agent_id] = store.write(messages, expected_version=expected)
+        return True
+    except VersionConflict:
+        versions[agent_id] = store.version()
+        return False
@@ -0,0 +1,170 @@
+# utils/chunking.py
+"""División de documentos en chunks medidos en tokens.
+
+`TokenChunker` recorre el texto una sola vez con un patrón precompilado que
+lo corta en segmentos (párrafos, líneas y oraciones), cuenta los tokens de
+todos los segmentos en lote con tiktoken y los agrupa hasta el tamaño
+objetivo, prefiriendo cortar en los límites más fuertes. El tamaño de chunk
+depende del tipo de documento (ver CHUNKING_PROFILES).
+"""
+import os
+import re
+from typing import Dict, Iterable, List, Tuple
+import tiktoken
+from langchain_core.documents import Document
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+# "token" (por defecto) o "recursive" para volver al divisor por caracteres
+CHUNKING_ENGINE = os.getenv("CHUNKING_ENGINE", "token")
+CHUNKING_ENCODING = os.getenv("CHUNKING_ENCODING", "cl100k_base")
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", "256"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "40"))
+
+# Tamaños por tipo de documento (ver DocumentManager.get_document_types)
+CHUNKING_PROFILES = {
+    "Libro de Texto": {"chunk_tokens": 384, "overlap_tokens": 56},
+    "Paper Académico": {"chunk_tokens": 384, "overlap_tokens": 56},
+    "Documento de Investigación": {"chunk_tokens": 384, "overlap_tokens": 56},
+    "Manual Técnico": {"chunk_tokens": 256, "overlap_tokens": 32},
+    "Tutorial": {"chunk_tokens": 256, "overlap_tokens": 32},
+    "Apuntes": {"chunk_tokens": 192, "overlap_tokens": 24},
+    "Presentación": {"chunk_tokens": 128, "overlap_tokens": 16}
+}
+
+# Fuerza de cada límite: se prefiere cortar en párrafos, luego líneas, luego oraciones
+PARAGRAPH, LINE, SENTENCE = 3, 2, 1
+
+_SEGMENT_PATTERN = re.compile(
+    r".+?(?:(?P<paragraph>\n[ \t]*\n\s*)|(?P<line>\n)|(?P<sentence>(?<=[.!?;:])[ \t]+)|\Z)",
+    re.S
+)
+
+# Fracción mínima del chunk a partir de la cual se busca un límite más fuerte
+_MIN_FILL = 0.5
+
+Segment = Tuple[str, int, int]  # (texto, tokens, fuerza del límite final)
+
+
+class TokenChunker:
+    """Divisor de texto por tokens con cortes en límites estructurales."""
+
+    def __init__(self, chunk_tokens: int = CHUNK_TOKENS, overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+                 encoding_name: str = CHUNKING_ENCODING):
+        if overlap_tokens >= chunk_tokens:
+            raise ValueError("overlap_tokens debe ser menor que chunk_tokens")
+        self.chunk_tokens = chunk_tokens
+        self.overlap_tokens = overlap_tokens
+        self.encoding = tiktoken.get_encoding(encoding_name)
+
+    def _segments(self, text: str) -> List[Segment]:
+        matches = [m for m in _SEGMENT_PATTERN.finditer(text) if m.group(0).strip()]
+        texts = [m.group(0) for m in matches]
+        counts = [len(tokens) for tokens in self.encoding.encode_ordinary_batch(texts)]
+        segments = []
+        for match, segment_text, tokens in zip(matches, texts, counts):
+            if match.group("sentence"):
+                strength = SENTENCE
+            elif match.group("line"):
+                strength = LINE
+            else:
+                strength = PARAGRAPH
+            segments.append((segment_text, tokens, strength))
+        return segments
+
+    def _split_oversized(self, text: str) -> List[str]:
+        """Corta por ventanas de tokens un segmento más largo que un chunk."""
+        tokens = self.encoding.encode_ordinary(text)
+        step = self.chunk_tokens - self.overlap_tokens
+        return [
+            self.encoding.decode(tokens[start:start + self.chunk_tokens])
+            for start in range(0, max(len(tokens) - self.overlap_tokens, 1), step)
+        ]
+
+    def _cut_index(self, buffer: List[Segment]) -> int:
+        """Índice tras el cual cortar: el límite más fuerte una vez lleno el mínimo."""
+        best_index, best_strength = len(buffer) - 1, -1
+        filled = 0
+        for index, (_, tokens, strength) in enumerate(buffer):
+            filled += tokens
+            if filled >= self.chunk_tokens * _MIN_FILL and strength >= best_strength:
+                best_index, best_strength = index, strength
+        return best_index
+
+    def _overlap(self, emitted: List[Segment]) -> List[Segment]:
+        carried, total = [], 0
+        for segment in reversed(emitted):
+            if total + segment[1] > self.overlap_tokens:
+                break
+            carried.insert(0, segment)
+            total += segment[1]
+        return carried
+
+    def split_text(self, text: str) -> List[str]:
+        chunks = []
+        buffer: List[Segment] = []
+        buffer_tokens = 0
+        carried = 0  # segmentos al inicio del buffer que vienen del solapamiento
+
+        def emit(segments: Iterable[Segment]):
+            chunk = "".join(segment[0] for segment in segments).strip()
+            if chunk:
+                chunks.append(chunk)
+
+        for segment in self._segments(text):
+            if segment[1] > self.chunk_tokens:
+                if len(buffer) > carried:
+                    emit(buffer)
+                buffer, buffer_tokens, carried = [], 0, 0
+                chunks.extend(part.strip() for part in self._split_oversized(segment[0]) if part.strip())
+                continue
+
+            while buffer_tokens + segment[1] > self.chunk_tokens and len(buffer) > carried:
+                cut = max(self._cut_index(buffer), carried)
+                emitted, rest = buffer[:cut + 1], buffer[cut + 1:]
+                emit(emitted)
+                overlap = self._overlap(emitted)
+                buffer, carried = overlap + rest, len(overlap)
+                buffer_tokens = sum(tokens for _, tokens, _ in buffer)
+            if buffer_tokens + segment[1] > self.chunk_tokens:
+                # Solo queda solapamiento y no cabe junto al segmento
+                buffer, buffer_tokens, carried = [], 0, 0
+
+            buffer.append(segment)
+            buffer_tokens += segment[1]
+
+        if len(buffer) > carried:
+            emit(buffer)
+        return chunks
+
+    def split_documents(self, documents: Iterable[Document]) -> List[Document]:
+        """Misma interfaz que los text splitters de LangChain."""
+        return [
+            Document(page_content=chunk, metadata=dict(document.metadata))
+            for document in documents
+            for chunk in self.split_text(document.page_content)
+        ]
+
+
+def recursive_splitter() -> RecursiveCharacterTextSplitter:
+    """Divisor por caracteres usado antes del chunker por tokens."""
+    return RecursiveCharacterTextSplitter(
+        chunk_size=1000,
+        chunk_overlap=150,
+        separators=["\n\n", "\n", ".", "!", "?", ",", " ", ""],
+        length_function=len
+    )
+
+
+def get_profile(doc_type: str = None) -> Dict:
+    """Tamaños de chunk para un tipo de documento."""
+    return CHUNKING_PROFILES.get(doc_type, {
+        "chunk_tokens": CHUNK_TOKENS,
+        "overlap_tokens": CHUNK_OVERLAP_TOKENS
+    })
+
+
+def get_text_splitter(doc_type: str = None):
+    """Divisor configurado para un tipo de documento."""
+    if CHUNKING_ENGINE == "recursive":
+        return recursive_splitter()
+    return TokenChunker(**get_profile(doc_type))
@@ -2,10 +2,18 @@
 import os
 import json
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 import hashlib
+import bisect
+import threading
 from pathlib import Path
 import shutil
+from utils.metadata_store import SQLiteMetadataStore, METADATA_BACKEND, SORT_FIELDS, sort_value
+from utils.search_index import SearchIndex
+from utils.fulltext import get_fulltext_index
+from utils.library_stats import apply_document, compute_stats, empty_stats
+from utils.json_store import JSONStore, file_version
+from utils.metadata_journal import MetadataJournal
 
 class DocumentManager:
     def __init__(self):
@@ -14,13 +22,75 @@ class DocumentManager:
         self.PROCESSED_DIR = os.path.join(self.BASE_DIR, "processed_docs")
         self.METADATA_FILE = os.path.join(self.BASE_DIR, "metadata.json")
         self.CATEGORIES_FILE = os.path.join(self.BASE_DIR, "categories.json")
+        self.STATS_FILE = os.path.join(self.BASE_DIR, "stats.json")
+        
+        # Escrituras atómicas y con bloqueo entre procesos; la metadata se
+        # guarda como instantánea más un journal de eventos
+        self._journal = MetadataJournal(self.METADATA_FILE)
+        self._categories_json = JSONStore(self.CATEGORIES_FILE)
+        self._stats_json = JSONStore(self.STATS_FILE, default=empty_stats)
         
         # Crear estructura de directorios
         self._ensure_directory_structure()
         
+        # Backend de metadata: metadata.json (por defecto) o SQLite
+        self.store = None
+        if METADATA_BACKEND == "sqlite":
+            self.store = SQLiteMetadataStore()
+            if len(self.store) == 0 and os.path.exists(self.METADATA_FILE):
+                count = self.store.import_json(self.METADATA_FILE)
+                print(f"Importados {count} documentos de {self.METADATA_FILE} a SQLite")
+        
         # Inicializar o cargar datos
-        self.metadata = self._load_metadata()
-        self.categories = self._load_categories()
+        self._lock = threading.RLock()
+        self._signatures = {}
+        self.metadata = {}
+        self.categories = {}
+        self.stats = {}
+        self._search_index = None
+        self._sort_indexes = {}
+        self._file_hashes = None
+        self.refresh()
+
+    def _file_signature(self, path: str) -> Optional[tuple]:
+        """Firma de un archivo en disco para detectar cambios."""
+        return file_version(path)
+
+    def _signature_changed(self, path: str) -> bool:
+        signature = self._file_signature(path)
+        return signature is None or signature != self._signatures.get(path)
+
+    def refresh(self) -> bool:
+        """Recargar los archivos que cambiaron en disco desde la última lectura.
+
+        Retorna True si se recargó algo. Sin cambios no se parsea ningún JSON.
+        """
+        with self._lock:
+            changed = False
+            if self.store is not None:
+                # Las consultas van directo a SQLite; solo se registra la versión
+                version = self.store.version()
+                if version != self._signatures.get("store"):
+                    self.metadata = self.store
+                    self._signatures["store"] = version
+                    self._invalidate_indexes()
+                    changed = True
+            elif self._journal.changed():
+                # Solo se leen los eventos nuevos, salvo que se haya compactado
+                changes = self._journal.sync(self.metadata) if self.metadata else None
+                self._apply_changes(changes)
+                changed = True
+            if self._signature_changed(self.CATEGORIES_FILE):
+                signature = self._file_signature(self.CATEGORIES_FILE)
+                self.categories = self._load_categories()
+                self._signatures[self.CATEGORIES_FILE] = signature or self._file_signature(self.CATEGORIES_FILE)
+                changed = True
+            if self._signature_changed(self.STATS_FILE):
+                signature = self._file_signature(self.STATS_FILE)
+                self.stats = self._load_stats()
+                self._signatures[self.STATS_FILE] = signature or self._file_signature(self.STATS_FILE)
+                changed = True
+            return changed
 
     def _ensure_directory_structure(self):
         """Crear estructura de directorios necesaria."""
@@ -28,19 +98,18 @@ class DocumentManager:
         os.makedirs(self.PROCESSED_DIR, exist_ok=True)
 
     def _load_metadata(self) -> Dict:
-        """Cargar o crear archivo de metadatos."""
+        """Cargar la instantánea de metadatos y aplicar su journal."""
         try:
-            if os.path.exists(self.METADATA_FILE):
-                with open(self.METADATA_FILE, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+            return self._journal.load()
         except json.JSONDecodeError:
-            print(f"Error decoding {self.METADATA_FILE}, creating new file")
+            # Nunca sobrescribir un archivo dañado: se aparta para poder recuperarlo
+            print(f"Error decoding {self.METADATA_FILE}, moved to {self._journal.snapshot.quarantine()}")
         except Exception as e:
             print(f"Error loading metadata: {str(e)}")
+            return {}
         
-        # Si hay error o no existe, crear nuevo
-        self._save_metadata({})
-        return {}
+        # Sin la instantánea dañada quedan los eventos del journal
+        return self._journal.load()
 
     def _load_categories(self) -> Dict:
         """Cargar o crear estructura de categorías."""
@@ -52,39 +121,128 @@ class DocumentManager:
                 "Idiomas": ["Inglés", "Español", "Francés", "Alemán"],
                 "Historia": ["Historia Mundial", "Historia del Arte", "Arqueología"],
                 "Literatura": ["Narrativa", "Poesía", "Teatro", "Ensayo"]
-            },
-            "category_counts": {}
+            }
         }
         
         try:
             if os.path.exists(self.CATEGORIES_FILE):
-                with open(self.CATEGORIES_FILE, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+                return self._categories_json.load()
         except json.JSONDecodeError:
-            print(f"Error decoding {self.CATEGORIES_FILE}, creating new file")
+            print(f"Error decoding {self.CATEGORIES_FILE}, moved to {self._categories_json.quarantine()}")
         except Exception as e:
             print(f"Error loading categories: {str(e)}")
+            return default_categories
         
-        # Si hay error o no existe, crear nuevo
+        # Si no existe o estaba dañado, crear nuevo
         self._save_categories(default_categories)
         return default_categories
 
-    def _save_metadata(self, metadata: Dict) -> None:
-        """Guardar metadatos de forma segura."""
+    def _load_stats(self) -> Dict:
+        """Cargar las estadísticas o calcularlas desde la metadata."""
         try:
-            with open(self.METADATA_FILE, 'w', encoding='utf-8') as f:
-                json.dump(metadata, f, ensure_ascii=False, indent=2)
+            if os.path.exists(self.STATS_FILE):
+                return self._stats_json.load()
+        except json.JSONDecodeError:
+            print(f"Error decoding {self.STATS_FILE}, rebuilding stats")
         except Exception as e:
-            print(f"Error saving metadata: {str(e)}")
+            print(f"Error loading stats: {str(e)}")
+        
+        # Bajo el bloqueo, para no pisar incrementos de otros procesos que
+        # las hayan creado mientras tanto
+        with self._stats_json.lock():
+            try:
+                stats, version = self._stats_json.read()
+                if version is not None:
+                    return stats
+            except json.JSONDecodeError:
+                pass
+            stats = compute_stats(self.metadata.values())
+            self._signatures[self.STATS_FILE] = self._stats_json.write(stats, locked=True)
+        return stats
 
     def _save_categories(self, categories: Dict) -> None:
         """Guardar categorías de forma segura."""
         try:
-            with open(self.CATEGORIES_FILE, 'w', encoding='utf-8') as f:
-                json.dump(categories, f, ensure_ascii=False, indent=2)
+            self._signatures[self.CATEGORIES_FILE] = self._categories_json.write(categories)
         except Exception as e:
             print(f"Error saving categories: {str(e)}")
 
+    def _apply_changes(self, changes) -> None:
+        """Llevar los índices en memoria a los cambios leídos del journal.
+
+        Con `changes` None la metadata se recarga completa.
+        """
+        if changes is None:
+            self.metadata = self._load_metadata()
+            self._invalidate_indexes()
+            return
+        for doc_hash, previous, doc in changes:
+            self._update_indexes(doc_hash, previous, doc)
+
+    def _update_indexes(self, doc_hash: str, previous: Optional[Dict], doc: Optional[Dict]) -> None:
+        """Actualizar los índices en memoria con un documento nuevo, modificado o eliminado."""
+        if self._search_index is not None:
+            if doc is None:
+                self._search_index.remove(doc_hash)
+            else:
+                self._search_index.add(doc_hash, doc)
+        for field, index in self._sort_indexes.items():
+            if previous is not None:
+                position = bisect.bisect_left(index, (sort_value(previous, field), doc_hash))
+                if position < len(index) and index[position][1] == doc_hash:
+                    del index[position]
+            if doc is not None:
+                bisect.insort(index, (sort_value(doc, field), doc_hash))
+        if self._file_hashes is not None and doc is not None and doc.get("file_hash"):
+            self._file_hashes[doc["file_hash"]] = doc_hash
+
+    def _put_document(self, doc_hash: str, doc: Optional[Dict]) -> None:
+        """Guardar (o eliminar, con `doc` None) un documento en el backend configurado."""
+        if self.store is not None:
+            previous = self.store.get(doc_hash)
+            if doc is None:
+                self._signatures["store"] = self.store.delete(doc_hash)
+            else:
+                self._signatures["store"] = self.store.put(doc_hash, doc)
+        else:
+            # Una línea en el journal, sin reescribir metadata.json
+            if doc is None:
+                self.metadata, changes, previous = self._journal.delete(self.metadata, doc_hash)
+            else:
+                self.metadata, changes, previous = self._journal.put(self.metadata, doc_hash, doc)
+            if changes is None:
+                self._invalidate_indexes()
+            else:
+                # Eventos de otros procesos leídos antes de anexar el nuestro
+                for change in changes:
+                    self._update_indexes(*change)
+
+        self._update_indexes(doc_hash, previous, doc)
+
+        # Actualizar las estadísticas con la diferencia respecto a la versión anterior
+        def apply(stats):
+            if previous is not None:
+                apply_document(stats, previous, -1)
+            if doc is not None:
+                apply_document(stats, doc)
+
+        self.stats, _, self._signatures[self.STATS_FILE] = self._stats_json.update(apply)
+
+    def _save_stats(self, stats: Dict) -> None:
+        """Guardar estadísticas de forma segura."""
+        try:
+            self._signatures[self.STATS_FILE] = self._stats_json.write(stats)
+        except Exception as e:
+            print(f"Error saving stats: {str(e)}")
+
+    def rebuild_stats(self) -> Dict:
+        """Recalcular las estadísticas recorriendo toda la metadata."""
+        with self._lock:
+            self.refresh()
+            self.stats = compute_stats(self.metadata.values())
+            self._save_stats(self.stats)
+            return self.stats
+
     def get_document_types(self) -> List[str]:
         """Obtener tipos de documentos disponibles."""
         return [
@@ -110,15 +268,29 @@ class DocumentManager:
 
     def get_total_documents(self) -> int:
         """Obtener número total de documentos."""
-        return len(self.metadata)
+        return self.stats.get('total_documents', 0)
 
     def get_categories(self) -> Dict:
         """Obtener estructura de categorías."""
         return self.categories["categories"]
 
+    def add_categories(self, names: List[str]) -> List[str]:
+        """Registrar categorías que aún no existen (sin subcategorías); retorna las agregadas."""
+        def add(categories):
+            missing = [name for name in dict.fromkeys(names) if name not in categories["categories"]]
+            for name in missing:
+                categories["categories"][name] = []
+            return missing
+
+        with self._lock:
+            if all(name in self.categories["categories"] for name in names):
+                return []
+            self.categories, added, self._signatures[self.CATEGORIES_FILE] = self._categories_json.update(add)
+            return added
+
     def get_popular_categories(self) -> Dict:
         """Obtener categorías más populares."""
-        counts = self.categories.get('category_counts', {})
+        counts = self.stats.get('by_category', {})
         return dict(sorted(
             counts.items(),
             key=lambda x: x[1],
@@ -127,10 +299,14 @@ class DocumentManager:
 
     def get_documents_by_category(self, category: str) -> List[Dict]:
         """Obtener documentos de una categoría específica."""
-        return [
-            doc for doc in self.metadata.values()
-            if doc.get('category') == category
-        ]
+        if self.store is not None:
+            return self.store.filter({"category": category})
+        # Bajo el bloqueo: otra sesión puede estar aplicando cambios al mismo dict
+        with self._lock:
+            return [
+                doc for doc in self.metadata.values()
+                if doc.get('category') == category
+            ]
 
     def get_document(self, doc_hash: str) -> Optional[Dict]:
         """Obtener metadata de un documento específico."""
@@ -138,58 +314,156 @@ class DocumentManager:
 
     def get_new_documents_count(self, date: datetime) -> int:
         """Obtener cantidad de documentos nuevos para una fecha."""
-        count = 0
-        for doc in self.metadata.values():
-            try:
-                doc_date = datetime.fromisoformat(doc.get('processed_date', ''))
-                if doc_date.date() == date.date():
-                    count += 1
-            except (ValueError, TypeError):
+        return self.stats.get('by_day', {}).get(date.date().isoformat(), 0)
+
+    def _invalidate_indexes(self) -> None:
+        """Descartar los índices en memoria (otro proceso cambió la metadata)."""
+        self._search_index = None
+        self._sort_indexes = {}
+        self._file_hashes = None
+
+    def _get_sort_index(self, field: str) -> List[Tuple]:
+        """Lista ordenada de (valor, hash), mantenida en cada escritura.
+
+        Se modifica en el lugar: recorrerla solo mientras se tiene `_lock`.
+        """
+        with self._lock:
+            index = self._sort_indexes.get(field)
+            if index is None:
+                index = sorted(
+                    (sort_value(doc, field), doc_hash)
+                    for doc_hash, doc in self.metadata.items()
+                )
+                self._sort_indexes[field] = index
+            return index
+
+    def find_by_file_hash(self, file_hash: str) -> Optional[Dict]:
+        """Documento registrado con el mismo contenido (sha256 del archivo)."""
+        if self.store is not None:
+            matches = self.store.filter({"file_hash": file_hash})
+            return matches[0] if matches else None
+        with self._lock:
+            if self._file_hashes is None:
+                self._file_hashes = {
+                    doc["file_hash"]: doc_hash
+                    for doc_hash, doc in self.metadata.items() if doc.get("file_hash")
+                }
+            doc_hash = self._file_hashes.get(file_hash)
+        doc = self.metadata.get(doc_hash) if doc_hash else None
+        # La entrada queda obsoleta si el documento se re-ingirió con otro archivo
+        return doc if doc and doc.get("file_hash") == file_hash else None
+
+    @staticmethod
+    def _matches(doc: Dict, filters: Dict) -> bool:
+        """Si un documento cumple los filtros del catálogo."""
+        for key, value in filters.items():
+            if not value or value == "Todas" or value == "Todos":
                 continue
-        return count
+            if key == "year_range":
+                if not value[0] <= int(doc.get('year', 0)) <= value[1]:
+                    return False
+            elif doc.get(key) != value:
+                return False
+        return True
+
+    def query(self, filters: Dict = None, sort: str = "-processed_date",
+              offset: int = 0, limit: int = 20) -> Tuple[List[Dict], int]:
+        """Obtener una página de documentos filtrados y ordenados, y el total.
+
+        `sort` es un campo de SORT_FIELDS, con "-" delante para orden descendente.
+        """
+        descending = sort.startswith("-")
+        field = sort.lstrip("-")
+        if field not in SORT_FIELDS:
+            raise ValueError(f"No se puede ordenar por {field}")
+        if self.store is not None:
+            return self.store.query(filters or {}, field, descending, offset, limit)
+
+        # El índice y la metadata se leen bajo el bloqueo para que sean coherentes
+        # entre sí aunque otra sesión esté registrando documentos
+        with self._lock:
+            index = self._get_sort_index(field)
+            if not any(value and value != "Todas" and value != "Todos" for value in (filters or {}).values()):
+                # Sin filtros la página es un corte directo del índice
+                total = len(index)
+                if descending:
+                    entries = index[max(total - offset - limit, 0):max(total - offset, 0)][::-1]
+                else:
+                    entries = index[offset:offset + limit]
+                return [self.metadata[doc_hash] for _, doc_hash in entries], total
+
+            page, total = [], 0
+            for _, doc_hash in (reversed(index) if descending else index):
+                doc = self.metadata[doc_hash]
+                if self._matches(doc, filters):
+                    if offset <= total < offset + limit:
+                        page.append(doc)
+                    total += 1
+            return page, total
+
+    def _get_search_index(self) -> SearchIndex:
+        """Índice de búsqueda, construido la primera vez que se necesita."""
+        with self._lock:
+            if self._search_index is None:
+                self._search_index = SearchIndex.build(self.metadata.items())
+            return self._search_index
 
     def search_documents(self, query: str = None, filters: Dict = None) -> List[Dict]:
         """Buscar documentos con filtros."""
-        results = self.metadata.values()
-        
-        if filters:
-            for key, value in filters.items():
-                if value and value != "Todas" and value != "Todos":
-                    if key == "year_range":
-                        results = [
-                            doc for doc in results
-                            if value[0] <= int(doc.get('year', 0)) <= value[1]
-                        ]
-                    else:
-                        results = [
-                            doc for doc in results
-                            if doc.get(key) == value
-                        ]
+        if self.store is not None:
+            # Los filtros se resuelven con los índices de SQLite
+            results = self.store.filter(filters or {})
+        else:
+            with self._lock:
+                results = [
+                    doc for doc in self.metadata.values()
+                    if self._matches(doc, filters or {})
+                ]
         
         if query:
-            query = query.lower()
-            results = [
-                doc for doc in results
-                if any(
-                    query in str(value).lower()
-                    for value in [
-                        doc.get('title', ''),
-                        doc.get('description', ''),
-                        doc.get('author', ''),
-                        *doc.get('tags', [])
-                    ]
-                )
-            ]
+            # Índice invertido sin tildes, con prefijos y ordenado por BM25;
+            # se actualiza en el lugar, así que se consulta bajo el bloqueo
+            with self._lock:
+                scores = self._get_search_index().search(query)
+            results = sorted(
+                (doc for doc in results if doc.get('hash') in scores),
+                key=lambda doc: scores[doc['hash']],
+                reverse=True
+            )
         
         return list(results)
 
+    def search_content(self, query: str, filters: Dict = None, limit: int = 20) -> List[Tuple[Dict, Dict]]:
+        """Documentos con coincidencias en su contenido, con sus fragmentos.
+
+        Retorna pares (documento, coincidencias) ordenados por BM25 sobre el
+        texto de los chunks (ver utils/fulltext.py).
+        """
+        results = []
+        for match in get_fulltext_index().search_documents(query, limit=limit * 2):
+            doc = self.get_document(match["doc_hash"])
+            if doc and self._matches(doc, filters or {}):
+                results.append((doc, match))
+        return results[:limit]
+
+    @staticmethod
+    def compute_hash(metadata: dict) -> str:
+        """Generar el hash único de un documento a partir de su metadata."""
+        return hashlib.sha256(
+            f"{metadata['title']}_{metadata['author']}_{metadata['year']}".encode()
+        ).hexdigest()
+
     def add_document(self, metadata: dict, vectorstore_path: str, original_path: str) -> str:
         """Agregar un nuevo documento."""
+        with self._lock:
+            # Partir de lo último en disco (otros procesos también registran documentos)
+            self.refresh()
+            return self._add_document(metadata, vectorstore_path, original_path)
+
+    def _add_document(self, metadata: dict, vectorstore_path: str, original_path: str) -> str:
         try:
             # Generar hash único
-            doc_hash = hashlib.sha256(
-                f"{metadata['title']}_{metadata['author']}_{metadata['year']}".encode()
-            ).hexdigest()
+            doc_hash = self.compute_hash(metadata)
             
             # Agregar información adicional
             full_metadata = {
@@ -200,17 +474,51 @@ class DocumentManager:
                 "processed_date": datetime.now().isoformat()
             }
             
-            # Actualizar metadata
-            self.metadata[doc_hash] = full_metadata
-            self._save_metadata(self.metadata)
-            
-            # Actualizar conteo de categorías
-            category = metadata['category']
-            self.categories['category_counts'][category] = \
-                self.categories['category_counts'].get(category, 0) + 1
-            self._save_categories(self.categories)
+            # Actualizar metadata (y con ella las estadísticas)
+            self._put_document(doc_hash, full_metadata)
             
             return doc_hash
             
         except Exception as e:
-            raise Exception(f"Error adding document: {str(e)}")
\ No newline at end of file
+            raise Exception(f"Error adding document: {str(e)}")
+
+    def delete_document(self, doc_hash: str) -> None:
+        """Quitar un documento del catálogo (sus archivos y vectores no se tocan)."""
+        with self._lock:
+            self.refresh()
+            if doc_hash not in self.metadata:
+                raise KeyError(f"Documento no encontrado: {doc_hash}")
+            self._put_document(doc_hash, None)
+
+    def restore_document(self, doc_hash: str, doc: dict) -> None:
+        """Dejar un documento exactamente como estaba (p. ej. tras una ingesta fallida)."""
+        with self._lock:
+            self.refresh()
+            self._put_document(doc_hash, doc)
+
+    def update_document(self, doc_hash: str, updates: dict) -> None:
+        """Actualizar campos de un documento existente."""
+        with self._lock:
+            self.refresh()
+            if doc_hash not in self.metadata:
+                raise KeyError(f"Documento no encontrado: {doc_hash}")
+            self._put_document(doc_hash, {**self.metadata[doc_hash], **updates})
+
+
+_manager_instance: Optional[DocumentManager] = None
+_manager_lock = threading.Lock()
+
+
+def get_document_manager() -> DocumentManager:
+    """DocumentManager compartido por todo el proceso.
+
+    Se recarga solo si metadata.json o categories.json cambiaron en disco,
+    así que los reruns de Streamlit no vuelven a parsear los JSON.
+    """
+    global _manager_instance
+    with _manager_lock:
+        if _manager_instance is None:
+            _manager_instance = DocumentManager()
+            return _manager_instance
+    _manager_instance.refresh()
+    return _manager_instance
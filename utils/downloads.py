@@ -0,0 +1,33 @@
+# utils/downloads.py
+import os
+import mimetypes
+import streamlit as st
+
+PREPARED_DOWNLOADS_KEY = "prepared_downloads"
+
+
+def render_download_button(file_path: str, label: str, key: str) -> None:
+    """Botón de descarga diferido para un archivo en disco.
+
+    El archivo no se lee durante el render: primero se muestra un botón
+    "Preparar descarga" y solo al pulsarlo se pasa el archivo abierto a
+    `st.download_button`, que lo sirve desde el servidor de medios de
+    Streamlit en lugar de incrustarlo en el HTML como base64.
+    """
+    if not file_path or not os.path.exists(file_path):
+        return
+
+    prepared = st.session_state.setdefault(PREPARED_DOWNLOADS_KEY, set())
+    if key not in prepared:
+        size_mb = os.path.getsize(file_path) / (1024 * 1024)
+        if st.button(f"{label} ({size_mb:.1f} MB)", key=f"prepare_{key}"):
+            prepared.add(key)
+            st.rerun()
+        return
+
+    file_name = os.path.basename(file_path)
+    mime_type = mimetypes.guess_type(file_name)[0] or "application/octet-stream"
+    with open(file_path, "rb") as f:
+        if st.download_button(label, data=f, file_name=file_name, mime=mime_type, key=f"download_{key}"):
+            # Liberar el archivo de la sesión una vez descargado
+            prepared.discard(key)
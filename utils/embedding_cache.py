@@ -0,0 +1,160 @@
+# utils/embedding_cache.py
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+from array import array
+from typing import Dict, List, Optional
+
+EMBEDDING_CACHE_PATH = os.getenv(
+    "EMBEDDING_CACHE_PATH",
+    os.path.join("data", "embedding_cache.sqlite3")
+)
+EMBEDDING_CACHE_MAX_MB = int(os.getenv("EMBEDDING_CACHE_MAX_MB", "512"))
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Normaliza el texto de un chunk para que ediciones de formato no cambien su clave."""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+
+def text_hash(text: str) -> str:
+    """sha256 del texto normalizado."""
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+def get_model_name(embeddings) -> str:
+    """Obtiene el nombre del modelo de embeddings para usarlo en la clave."""
+    return str(getattr(embeddings, "model", None) or embeddings.__class__.__name__)
+
+
+class EmbeddingCache:
+    """Caché persistente de embeddings direccionada por contenido.
+
+    La clave es (modelo, sha256 del texto normalizado), por lo que se comparte
+    entre documentos y re-subidas. Cuando supera el tamaño máximo se eliminan
+    las entradas usadas hace más tiempo.
+    """
+
+    def __init__(self, path: str = EMBEDDING_CACHE_PATH, max_mb: int = EMBEDDING_CACHE_MAX_MB):
+        self.path = path
+        self.max_bytes = max_mb * 1024 * 1024
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (model, text_hash)
+            )
+        """)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_embeddings_access ON embeddings(last_access)"
+        )
+        self._conn.commit()
+        # Tamaño estimado: se suma cada escritura y solo se recalcula con
+        # SUM(size) al superar el límite (también cuenta lo que hayan
+        # escrito otros procesos entretanto)
+        self._total_bytes = self._table_size()
+
+    def _table_size(self) -> int:
+        return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM embeddings").fetchone()[0]
+
+    def get_many(self, model: str, hashes: List[str]) -> Dict[str, List[float]]:
+        """Devuelve los vectores en caché para los hashes dados."""
+        found = {}
+        unique = list(dict.fromkeys(hashes))
+        with self._lock:
+            # Consultar por bloques para no exceder el límite de parámetros de SQLite
+            for start in range(0, len(unique), 500):
+                block = unique[start:start + 500]
+                placeholders = ",".join("?" * len(block))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings "
+                    f"WHERE model = ? AND text_hash IN ({placeholders})",
+                    [model, *block]
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = array("f", blob).tolist()
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_access = ? WHERE model = ? AND text_hash = ?",
+                    [(now, model, key) for key in found]
+                )
+                self._conn.commit()
+        return found
+
+    def put_many(self, model: str, items: Dict[str, List[float]]) -> None:
+        """Guarda vectores en la caché y aplica la política de tamaño."""
+        if not items:
+            return
+        now = time.time()
+        rows = []
+        for key, vector in items.items():
+            blob = array("f", vector).tobytes()
+            rows.append((model, key, blob, len(blob), now))
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, vector, size, last_access) "
+                "VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            self._conn.commit()
+            # Un reemplazo cuenta dos veces; se corrige al recalcular
+            self._total_bytes += sum(row[3] for row in rows)
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        """Elimina las entradas menos usadas hasta quedar bajo el 90% del límite."""
+        total = self._total_bytes = self._table_size()
+        if total <= self.max_bytes:
+            return
+        target = int(self.max_bytes * 0.9)
+        cursor = self._conn.execute(
+            "SELECT model, text_hash, size FROM embeddings ORDER BY last_access ASC"
+        )
+        to_delete = []
+        for model, key, size in cursor:
+            if total <= target:
+                break
+            to_delete.append((model, key))
+            total -= size
+        self._conn.executemany(
+            "DELETE FROM embeddings WHERE model = ? AND text_hash = ?",
+            to_delete
+        )
+        self._conn.commit()
+        self._total_bytes = total
+
+    def stats(self) -> Dict:
+        """Tamaño actual de la caché."""
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM embeddings"
+            ).fetchone()
+        return {"entries": entries, "bytes": size, "max_bytes": self.max_bytes}
+
+
+_cache_instance: Optional[EmbeddingCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    """Instancia compartida de la caché para todo el proceso."""
+    global _cache_instance
+    with _cache_lock:
+        if _cache_instance is None:
+            _cache_instance = EmbeddingCache()
+        return _cache_instance
@@ -0,0 +1,243 @@
+# utils/embedding_pipeline.py
+import os
+import time
+import uuid
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, List, Optional
+from utils.embedding_cache import EmbeddingCache, get_model_name, text_hash
+
+# Parámetros por defecto (configurables desde .env)
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+EMBEDDING_MAX_WORKERS = int(os.getenv("EMBEDDING_MAX_WORKERS", "4"))
+EMBEDDING_MAX_RETRIES = int(os.getenv("EMBEDDING_MAX_RETRIES", "6"))
+
+ProgressCallback = Callable[[int, int], None]
+
+
+class AdaptiveLimiter:
+    """Limita la concurrencia y la ajusta ante errores de rate limit."""
+
+    def __init__(self, max_concurrency: int):
+        self.max_concurrency = max(1, max_concurrency)
+        self.limit = self.max_concurrency
+        self.active = 0
+        self.successes = 0
+        self.rate_limited = 0
+        self._cond = threading.Condition()
+
+    def acquire(self) -> None:
+        with self._cond:
+            while self.active >= self.limit:
+                self._cond.wait()
+            self.active += 1
+
+    def release(self, rate_limited: bool = False, failed: bool = False) -> None:
+        """Liberar un cupo; un error que no es de rate limit no cuenta como éxito."""
+        with self._cond:
+            self.active -= 1
+            if rate_limited:
+                # Reducción multiplicativa al recibir un 429
+                self.rate_limited += 1
+                self.limit = max(1, self.limit // 2)
+                self.successes = 0
+            elif not failed:
+                # Incremento aditivo tras una ronda de lotes exitosos
+                self.successes += 1
+                if self.successes >= self.limit and self.limit < self.max_concurrency:
+                    self.limit += 1
+                    self.successes = 0
+            self._cond.notify_all()
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """Indica si una excepción corresponde a un límite de peticiones."""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return (
+        status == 429
+        or error.__class__.__name__ == "RateLimitError"
+        or "rate limit" in str(error).lower()
+    )
+
+
+# Excepciones de red (openai, httpx y las de Python) que valen un reintento
+TRANSIENT_ERROR_NAMES = {
+    "APITimeoutError", "APIConnectionError", "InternalServerError",
+    "TimeoutException", "ConnectError", "ReadError", "RemoteProtocolError",
+    "TimeoutError", "ConnectionError"
+}
+
+
+def is_transient_error(error: Exception) -> bool:
+    """Indica si conviene reintentar: rate limit, error 5xx, timeout o conexión.
+
+    Los errores permanentes (clave inválida, entrada demasiado larga,
+    modelo inexistente) fallan igual en cada intento.
+    """
+    if is_rate_limit_error(error):
+        return True
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    if isinstance(status, int) and status >= 500:
+        return True
+    return any(cls.__name__ in TRANSIENT_ERROR_NAMES for cls in type(error).__mro__)
+
+
+def _retry_delay(error: Exception, attempt: int) -> float:
+    """Calcula la espera antes de reintentar (Retry-After o backoff exponencial)."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        retry_after = float(headers.get("retry-after", ""))
+        if retry_after > 0:
+            return retry_after
+    except (TypeError, ValueError):
+        pass
+    return min(60.0, 2 ** attempt) + random.uniform(0, 1)
+
+
+class EmbeddingStage:
+    """Genera embeddings por lotes con concurrencia acotada y reintentos."""
+
+    def __init__(
+        self,
+        embeddings,
+        batch_size: int = EMBEDDING_BATCH_SIZE,
+        max_workers: int = EMBEDDING_MAX_WORKERS,
+        max_retries: int = EMBEDDING_MAX_RETRIES
+    ):
+        self.embeddings = embeddings
+        self.batch_size = max(1, batch_size)
+        self.max_workers = max(1, max_workers)
+        self.max_retries = max_retries
+        self.limiter = AdaptiveLimiter(self.max_workers)
+        self.retries = 0
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        """Embebe un lote, reintentando ante errores transitorios (ver `is_transient_error`)."""
+        attempt = 0
+        while True:
+            self.limiter.acquire()
+            try:
+                vectors = self.embeddings.embed_documents(texts)
+            except Exception as e:
+                rate_limited = is_rate_limit_error(e)
+                self.limiter.release(rate_limited=rate_limited, failed=True)
+                if attempt >= self.max_retries or not is_transient_error(e):
+                    raise
+                self.retries += 1
+                time.sleep(_retry_delay(e, attempt))
+                attempt += 1
+                continue
+            self.limiter.release()
+            return vectors
+
+    def iter_batches(self, texts: List[str], progress_callback: Optional[ProgressCallback] = None):
+        """Produce (inicio, vectores) a medida que se completa cada lote."""
+        total = len(texts)
+        done = 0
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {
+                executor.submit(self._embed_batch, texts[start:start + self.batch_size]): start
+                for start in range(0, total, self.batch_size)
+            }
+            for future in as_completed(futures):
+                start = futures[future]
+                vectors = future.result()
+                done += len(vectors)
+                if progress_callback:
+                    progress_callback(done, total)
+                yield start, vectors
+
+
+def add_chunks_to_vectorstore(
+    chunks: List,
+    vectorstore,
+    stage: EmbeddingStage,
+    progress_callback: Optional[ProgressCallback] = None,
+    ids: Optional[List[str]] = None,
+    cache: Optional[EmbeddingCache] = None
+) -> Dict:
+    """Embebe los chunks por lotes y los escribe en Chroma a medida que terminan.
+
+    Cada lote se persiste en cuanto está listo, de modo que un error en un
+    lote no descarta el trabajo ya realizado. Si se indica una caché, solo
+    se envían al proveedor los chunks que no estén en ella.
+    """
+    started = time.perf_counter()
+    texts = [chunk.page_content for chunk in chunks]
+    metadatas = [chunk.metadata or {} for chunk in chunks]
+    ids = ids or [str(uuid.uuid4()) for _ in chunks]
+    total = len(texts)
+
+    def write(indices: List[int], vectors: List[List[float]]) -> None:
+        # Las escrituras en Chroma se hacen desde este hilo, no desde el pool
+        vectorstore._collection.upsert(
+            ids=[ids[i] for i in indices],
+            embeddings=vectors,
+            documents=[texts[i] for i in indices],
+            metadatas=[metadatas[i] for i in indices]
+        )
+
+    # Resolver primero los chunks que ya están en la caché
+    model = get_model_name(stage.embeddings)
+    hashes = [text_hash(text) for text in texts] if cache else []
+    cached = cache.get_many(model, hashes) if cache else {}
+    hit_indices = [i for i, key in enumerate(hashes) if key in cached]
+    miss_indices = [i for i in range(total) if not cache or hashes[i] not in cached]
+
+    for start in range(0, len(hit_indices), stage.batch_size):
+        block = hit_indices[start:start + stage.batch_size]
+        write(block, [cached[hashes[i]] for i in block])
+    if hit_indices and progress_callback:
+        progress_callback(len(hit_indices), total)
+
+    embed_started = time.perf_counter()
+    miss_texts = [texts[i] for i in miss_indices]
+    done = len(hit_indices)
+
+    def report(batch_done: int, _batch_total: int) -> None:
+        if progress_callback:
+            progress_callback(done + batch_done, total)
+
+    for start, vectors in stage.iter_batches(miss_texts, report):
+        block = miss_indices[start:start + len(vectors)]
+        write(block, vectors)
+        if cache:
+            cache.put_many(model, {hashes[i]: vector for i, vector in zip(block, vectors)})
+    embed_seconds = time.perf_counter() - embed_started
+
+    elapsed = time.perf_counter() - started
+    seconds_per_miss = embed_seconds / len(miss_indices) if miss_indices else 0.0
+    return {
+        "chunks": total,
+        "seconds": elapsed,
+        "chunks_per_second": total / elapsed if elapsed > 0 else 0.0,
+        "retries": stage.retries,
+        "rate_limited": stage.limiter.rate_limited,
+        "concurrency": stage.limiter.limit,
+        "cache_hits": len(hit_indices),
+        "cache_misses": len(miss_indices),
+        # Estimaciones de ahorro (~4 caracteres por token)
+        "tokens_saved": sum(len(texts[i]) for i in hit_indices) // 4,
+        "seconds_saved": seconds_per_miss * len(hit_indices)
+    }
+
+
+def merge_embedding_stats(total: Optional[Dict], stats: Dict) -> Dict:
+    """Acumula las estadísticas de varias llamadas (p. ej. ventanas de páginas)."""
+    if not total:
+        return dict(stats)
+    merged = {
+        key: total.get(key, 0) + stats.get(key, 0)
+        for key in ("chunks", "seconds", "retries", "rate_limited",
+                    "cache_hits", "cache_misses", "tokens_saved", "seconds_saved")
+    }
+    merged["concurrency"] = stats.get("concurrency", total.get("concurrency", 0))
+    merged["chunks_per_second"] = (
+        merged["chunks"] / merged["seconds"] if merged["seconds"] > 0 else 0.0
+    )
+    return merged
@@ -0,0 +1,405 @@
+# utils/fulltext.py
+"""Índice de texto completo sobre los chunks de todos los documentos.
+
+Usa SQLite FTS5 con ranking BM25 y el tokenizador `unicode61` sin tildes,
+de modo que "herencia multiple" encuentra "herencia múltiple". Se llena
+durante `process_document` (y se actualiza en la re-ingesta incremental);
+para indexar una biblioteca existente desde sus vectorstores:
+    python -m utils.fulltext rebuild
+
+Para que la latencia no crezca con la biblioteca:
+- el BM25 se calcula solo sobre las FULLTEXT_MAX_CANDIDATES coincidencias
+  más recientes;
+- los términos que aparecen en más de COMMON_TERM_RATIO de los chunks (y en
+  más de FULLTEXT_MAX_CANDIDATES) no filtran ni puntúan, como las palabras
+  vacías, porque FTS5 recorre la lista completa de cada término para su
+  IDF; las frecuencias se mantienen en `term_stats` al indexar;
+- los fragmentos destacados se arman en Python, solo para los resultados.
+"""
+import os
+import re
+import sqlite3
+import argparse
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence
+
+from utils.search_index import fold
+
+FULLTEXT_DB = os.getenv("FULLTEXT_DB", os.path.join("data", "fulltext.sqlite3"))
+# Coincidencias (las más recientes) sobre las que se calcula el BM25
+FULLTEXT_MAX_CANDIDATES = int(os.getenv("FULLTEXT_MAX_CANDIDATES", "5000"))
+# Fracción de chunks a partir de la cual un término se considera vacío
+COMMON_TERM_RATIO = float(os.getenv("FULLTEXT_COMMON_TERM_RATIO", "0.05"))
+# Chunks mejor puntuados que se agrupan por documento en el catálogo
+DOCUMENT_CANDIDATES = 200
+SNIPPET_CHARS = 200
+
+# Mismos separadores que el tokenizador unicode61 (el guion bajo separa)
+_TOKEN_PATTERN = re.compile(r"[^\W_]+")
+
+# Palabras vacías: aparecen en casi todos los chunks y no discriminan
+STOPWORDS = set("""
+a al algo ante como con de del desde donde e el en entre era es esta este esto
+ha hay la las le les lo los mas me mi muy no o para pero por que se si sin sobre
+su sus te tu un una uno unos unas y ya
+an and are as at be by for from in is it of on or that the this to was with
+""".split())
+
+
+def terms(text: str) -> List[str]:
+    """Términos tal como los indexa FTS5 (minúsculas y sin tildes)."""
+    return _TOKEN_PATTERN.findall(fold(text))
+
+
+def query_terms(query: str) -> List[str]:
+    """Términos de una consulta sin palabras vacías (salvo que no quede otro)."""
+    tokens = list(dict.fromkeys(terms(query)))
+    return [token for token in tokens if token not in STOPWORDS] or tokens
+
+
+def _phrases(values: Sequence[str], operator: str = " ") -> str:
+    return operator.join(f'"{value}"' for value in values)
+
+
+def _aligned_fold(text: str) -> str:
+    """`fold` del texto conservando la posición de cada carácter."""
+    folded = fold(text)
+    if len(folded) == len(text):
+        return folded
+    return "".join((fold(char) or char)[0] for char in text)
+
+
+def make_snippet(text: str, query: Sequence[str], size: int = SNIPPET_CHARS) -> str:
+    """Fragmento del texto con más términos de la consulta, en **negrita**."""
+    if not text:
+        return ""
+    alternatives = "|".join(re.escape(term) for term in sorted(set(query), key=len, reverse=True))
+    pattern = re.compile(rf"(?<![^\W_])(?:{alternatives})(?![^\W_])")
+    hits = [match.span() for match in pattern.finditer(_aligned_fold(text))]
+
+    # Ventana que cubre más coincidencias, con algo de contexto antes
+    start = 0
+    if hits:
+        best = max(hits, key=lambda hit: sum(1 for other in hits if hit[0] <= other[0] < hit[0] + size))
+        start = max(0, best[0] - size // 4)
+    end = min(len(text), start + size)
+    # Ajustar los bordes a espacios para no cortar palabras
+    if start > 0:
+        space = text.find(" ", start, hits[0][0] if hits and hits[0][0] > start else end)
+        start = space + 1 if space != -1 else start
+    if end < len(text):
+        space = text.rfind(" ", start, end)
+        end = space if space > start else end
+
+    parts, position = [], start
+    for hit_start, hit_end in hits:
+        if hit_start < start or hit_end > end:
+            continue
+        parts.append(text[position:hit_start])
+        parts.append(f"**{text[hit_start:hit_end]}**")
+        position = hit_end
+    parts.append(text[position:end])
+    snippet = " ".join("".join(parts).split())
+    return ("…" if start > 0 else "") + snippet + ("…" if end < len(text) else "")
+
+
+class FullTextIndex:
+    """Índice BM25 persistente de chunks, por documento."""
+
+    def __init__(self, db_path: str = FULLTEXT_DB):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            # Datos del chunk en una tabla normal (indexada por documento) y
+            # el texto en la tabla FTS5 con el mismo rowid. `doc_key` permite
+            # restringir una búsqueda a ciertos documentos dentro de FTS5.
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS chunk_rows (
+                    id INTEGER PRIMARY KEY,
+                    doc_hash TEXT NOT NULL,
+                    chunk_id TEXT NOT NULL,
+                    page INTEGER,
+                    UNIQUE (doc_hash, chunk_id)
+                )
+            """)
+            conn.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS chunk_text USING fts5(
+                    content,
+                    doc_key,
+                    tokenize = 'unicode61 remove_diacritics 2'
+                )
+            """)
+            # Número de chunks que contienen cada término
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS term_stats (
+                    term TEXT PRIMARY KEY,
+                    chunks INTEGER NOT NULL
+                ) WITHOUT ROWID
+            """)
+            conn.execute("CREATE TABLE IF NOT EXISTS index_info (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            conn.execute("INSERT OR IGNORE INTO index_info (key, value) VALUES ('chunks', 0)")
+
+    @contextmanager
+    def _connect(self):
+        """Conexión en modo autocommit que se cierra al salir del bloque."""
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def _update_term_stats(self, conn, frequencies: Counter, delta: int, chunks: int) -> None:
+        conn.executemany("""
+            INSERT INTO term_stats (term, chunks) VALUES (?, ?)
+            ON CONFLICT(term) DO UPDATE SET chunks = chunks + excluded.chunks
+        """, [(term, delta * count) for term, count in frequencies.items()])
+        if delta < 0:
+            conn.executemany(
+                "DELETE FROM term_stats WHERE term = ? AND chunks <= 0",
+                [(term,) for term in frequencies]
+            )
+        conn.execute("UPDATE index_info SET value = value + ? WHERE key = 'chunks'", (delta * chunks,))
+
+    def _delete_rows(self, conn, row_ids: List[int]) -> None:
+        for start in range(0, len(row_ids), 500):
+            batch = row_ids[start:start + 500]
+            marks = ",".join("?" * len(batch))
+            frequencies = Counter()
+            for row in conn.execute(f"SELECT content FROM chunk_text WHERE rowid IN ({marks})", batch):
+                frequencies.update(set(terms(row["content"])))
+            conn.execute(f"DELETE FROM chunk_text WHERE rowid IN ({marks})", batch)
+            conn.execute(f"DELETE FROM chunk_rows WHERE id IN ({marks})", batch)
+            self._update_term_stats(conn, frequencies, -1, len(batch))
+
+    def _row_ids(self, conn, doc_hash: str, chunk_ids: Sequence[str]) -> List[int]:
+        existing = dict(conn.execute(
+            "SELECT chunk_id, id FROM chunk_rows WHERE doc_hash = ?", (doc_hash,)
+        ).fetchall())
+        return [existing[chunk_id] for chunk_id in chunk_ids if chunk_id in existing]
+
+    def add_chunks(self, doc_hash: str, chunk_ids: Sequence[str], chunks: Sequence) -> None:
+        """Indexar (o reemplazar) chunks de LangChain con sus IDs del vectorstore."""
+        if not chunks:
+            return
+        frequencies = Counter()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            self._delete_rows(conn, self._row_ids(conn, doc_hash, chunk_ids))
+            for chunk_id, chunk in zip(chunk_ids, chunks):
+                cursor = conn.execute(
+                    "INSERT INTO chunk_rows (doc_hash, chunk_id, page) VALUES (?, ?, ?)",
+                    (doc_hash, chunk_id, chunk.metadata.get("page"))
+                )
+                conn.execute(
+                    "INSERT INTO chunk_text (rowid, content, doc_key) VALUES (?, ?, ?)",
+                    (cursor.lastrowid, chunk.page_content, doc_hash)
+                )
+                frequencies.update(set(terms(chunk.page_content)))
+            self._update_term_stats(conn, frequencies, 1, len(chunks))
+            conn.execute("COMMIT")
+
+    def update_pages(self, doc_hash: str, chunk_ids: Sequence[str], pages: Sequence) -> None:
+        """Actualizar el número de página de chunks que se movieron."""
+        with self._connect() as conn:
+            conn.executemany(
+                "UPDATE chunk_rows SET page = ? WHERE doc_hash = ? AND chunk_id = ?",
+                [(page, doc_hash, chunk_id) for chunk_id, page in zip(chunk_ids, pages)]
+            )
+
+    def delete_chunks(self, doc_hash: str, chunk_ids: Sequence[str]) -> None:
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            self._delete_rows(conn, self._row_ids(conn, doc_hash, chunk_ids))
+            conn.execute("COMMIT")
+
+    def delete_document(self, doc_hash: str) -> None:
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute("SELECT id FROM chunk_rows WHERE doc_hash = ?", (doc_hash,)).fetchall()
+            self._delete_rows(conn, [row["id"] for row in rows])
+            conn.execute("COMMIT")
+
+    def count(self, doc_hash: Optional[str] = None) -> int:
+        with self._connect() as conn:
+            if doc_hash is None:
+                return conn.execute("SELECT value FROM index_info WHERE key = 'chunks'").fetchone()[0]
+            return conn.execute(
+                "SELECT COUNT(*) FROM chunk_rows WHERE doc_hash = ?", (doc_hash,)
+            ).fetchone()[0]
+
+    def search(self, query: str, limit: int = 20, doc_hashes: Optional[Sequence[str]] = None,
+               snippets: bool = True) -> List[Dict]:
+        """Chunks que contienen los términos de la consulta, ordenados por BM25.
+
+        Cada resultado trae doc_hash, chunk_id, page, content, `score` (BM25
+        de FTS5 con signo invertido: mayor es mejor) y, si se pide, `snippet`.
+        """
+        wanted = query_terms(query)
+        if not wanted or (doc_hashes is not None and not doc_hashes):
+            return []
+
+        with self._connect() as conn:
+            marks = ",".join("?" * len(wanted))
+            frequencies = dict(conn.execute(
+                f"SELECT term, chunks FROM term_stats WHERE term IN ({marks})", wanted
+            ).fetchall())
+            if len(frequencies) < len(wanted):
+                return []  # algún término no aparece en ningún chunk
+            total = conn.execute("SELECT value FROM index_info WHERE key = 'chunks'").fetchone()[0]
+            # Un término es vacío si es frecuente en proporción y su lista es larga
+            threshold = max(COMMON_TERM_RATIO * total, FULLTEXT_MAX_CANDIDATES)
+            selective = [term for term in wanted if frequencies[term] <= threshold]
+
+            expression = f"content : ({_phrases(selective or wanted)})"
+            if doc_hashes is not None:
+                expression += f" AND doc_key : ({_phrases(doc_hashes, ' OR ')})"
+            if selective:
+                ranked = conn.execute("""
+                    SELECT rowid, score FROM (
+                        SELECT rowid, -bm25(chunk_text, 1.0, 0.0) AS score FROM chunk_text
+                        WHERE chunk_text MATCH ? ORDER BY rowid DESC LIMIT ?
+                    ) ORDER BY score DESC LIMIT ?
+                """, (expression, FULLTEXT_MAX_CANDIDATES, limit)).fetchall()
+            else:
+                # Solo términos muy frecuentes: el BM25 no discrimina, van los más recientes
+                ranked = conn.execute(
+                    "SELECT rowid, 0.0 AS score FROM chunk_text WHERE chunk_text MATCH ? "
+                    "ORDER BY rowid DESC LIMIT ?",
+                    (expression, limit)
+                ).fetchall()
+            if not ranked:
+                return []
+
+            row_ids = [row["rowid"] for row in ranked]
+            rows = {
+                row["id"]: row for row in conn.execute(f"""
+                    SELECT r.id, r.doc_hash, r.chunk_id, r.page, t.content
+                    FROM chunk_rows r JOIN chunk_text t ON t.rowid = r.id
+                    WHERE r.id IN ({','.join('?' * len(row_ids))})
+                """, row_ids).fetchall()
+            }
+
+        results = []
+        for row_id, score in ranked:
+            row = rows[row_id]
+            hit = {
+                "doc_hash": row["doc_hash"],
+                "chunk_id": row["chunk_id"],
+                "page": row["page"],
+                "content": row["content"],
+                "score": score
+            }
+            if snippets:
+                hit["snippet"] = make_snippet(row["content"], wanted)
+            results.append(hit)
+        return results
+
+    def search_documents(self, query: str, limit: int = 20, snippets_per_document: int = 3) -> List[Dict]:
+        """Documentos ordenados por sus mejores coincidencias en el contenido."""
+        wanted = query_terms(query)
+        documents: Dict[str, Dict] = {}
+        for hit in self.search(query, limit=DOCUMENT_CANDIDATES, snippets=False):
+            entry = documents.setdefault(hit["doc_hash"], {
+                "doc_hash": hit["doc_hash"], "score": 0.0, "matches": 0, "snippets": []
+            })
+            # Puntaje del documento: su mejor chunk más un pequeño aporte del resto
+            entry["score"] += hit["score"] if not entry["matches"] else hit["score"] * 0.1
+            entry["matches"] += 1
+            if len(entry["snippets"]) < snippets_per_document:
+                entry["snippets"].append({"page": hit["page"], "text": hit["content"]})
+        ranked = sorted(documents.values(), key=lambda entry: entry["score"], reverse=True)[:limit]
+        # Fragmentos destacados solo para los documentos que se devuelven
+        for entry in ranked:
+            for snippet in entry["snippets"]:
+                snippet["text"] = make_snippet(snippet["text"], wanted)
+        return ranked
+
+
+_index_instance: Optional[FullTextIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_fulltext_index() -> FullTextIndex:
+    """Índice de texto completo compartido por todo el proceso."""
+    global _index_instance
+    with _index_lock:
+        if _index_instance is None:
+            _index_instance = FullTextIndex()
+        return _index_instance
+
+
+def index_collection(index: FullTextIndex, doc_hash: str, collection, where: Optional[Dict] = None,
+                     batch_size: int = 500) -> int:
+    """Indexar los chunks guardados en una colección de Chroma; retorna cuántos."""
+    from langchain_core.documents import Document
+
+    offset = 0
+    while True:
+        data = collection.get(where=where, include=["documents", "metadatas"],
+                              limit=batch_size, offset=offset)
+        if not data["ids"]:
+            return offset
+        chunks = [
+            Document(page_content=text or "", metadata=metadata or {})
+            for text, metadata in zip(data["documents"], data["metadatas"])
+        ]
+        index.add_chunks(doc_hash, data["ids"], chunks)
+        offset += len(data["ids"])
+
+
+def rebuild_from_vectorstores(batch_size: int = 500) -> Dict:
+    """Indexar los chunks ya guardados en los vectorstores de la biblioteca."""
+    from langchain_chroma import Chroma
+    from utils.document_manager import DocumentManager
+    from utils.vector_library import get_storage_mode, get_library_vectorstore, STORAGE_LIBRARY
+
+    index = get_fulltext_index()
+    doc_manager = DocumentManager()
+    summary = {"documents": 0, "chunks": 0, "skipped": 0}
+    library = None
+
+    for doc_hash, doc in list(doc_manager.metadata.items()):
+        if get_storage_mode(doc) == STORAGE_LIBRARY:
+            library = library or get_library_vectorstore(None)
+            collection, where = library._collection, {"doc_hash": doc_hash}
+        elif os.path.exists(doc.get("vectorstore_path", "")):
+            collection, where = Chroma(persist_directory=doc["vectorstore_path"])._collection, None
+        else:
+            summary["skipped"] += 1
+            continue
+
+        index.delete_document(doc_hash)
+        count = index_collection(index, doc_hash, collection, where, batch_size)
+        summary["documents"] += 1
+        summary["chunks"] += count
+        print(f"✅ {doc.get('title')}: {count} fragmentos indexados")
+
+    print(f"\n📊 {summary['documents']} documentos y {summary['chunks']} fragmentos indexados, "
+          f"{summary['skipped']} omitidos")
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Índice de texto completo de la biblioteca")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    rebuild_parser = subparsers.add_parser("rebuild", help="Indexar los vectorstores existentes")
+    rebuild_parser.add_argument("--batch-size", type=int, default=500)
+    search_parser = subparsers.add_parser("search", help="Probar una búsqueda")
+    search_parser.add_argument("query")
+    args = parser.parse_args()
+
+    if args.command == "rebuild":
+        rebuild_from_vectorstores(args.batch_size)
+    elif args.command == "search":
+        for hit in get_fulltext_index().search(args.query, limit=10):
+            print(f"{hit['score']:.2f}  {hit['doc_hash'][:8]} p.{hit['page']}  {hit['snippet']}")
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    load_dotenv()
+    main()
@@ -0,0 +1,486 @@
+# utils/ingestion.py
+import os
+import shutil
+from pathlib import Path
+from typing import Callable, Dict, Optional
+from langchain_community.document_loaders import (
+    PyPDFLoader,
+    UnstructuredWordDocumentLoader,
+    UnstructuredEPubLoader,
+    UnstructuredHTMLLoader,
+    UnstructuredPowerPointLoader
+)
+from langchain_chroma import Chroma
+from langchain_openai.embeddings import OpenAIEmbeddings
+from langchain_openai import ChatOpenAI
+from utils.embedding_pipeline import (
+    EmbeddingStage,
+    add_chunks_to_vectorstore,
+    merge_embedding_stats,
+    EMBEDDING_BATCH_SIZE,
+    EMBEDDING_MAX_WORKERS
+)
+from utils.embedding_cache import get_embedding_cache, text_hash
+from utils.chunking import get_text_splitter
+from utils.document_manager import DocumentManager, get_document_manager
+from utils.fulltext import get_fulltext_index, index_collection
+from utils.thumbnails import render_thumbnails, file_sha256
+from utils.vector_library import (
+    get_storage_mode,
+    get_library_vectorstore,
+    library_chunk_id,
+    STORAGE_LIBRARY
+)
+import fitz  # PyMuPDF
+
+# Páginas por ventana en la ingesta streaming
+INGEST_WINDOW_PAGES = int(os.getenv("INGEST_WINDOW_PAGES", "20"))
+
+# Configuración de formatos soportados
+SUPPORTED_FORMATS = {
+    "pdf": ("PDF", ".pdf"),
+    "docx": ("Word", ".docx"),
+    "doc": ("Word", ".doc"),
+    "epub": ("EPub", ".epub"),
+    "txt": ("Text", ".txt"),
+    "html": ("HTML", ".html"),
+    "pptx": ("PowerPoint", ".pptx"),
+    "ppt": ("PowerPoint", ".ppt")
+}
+
+# Etapas del procesamiento, en orden
+INGESTION_STAGES = {
+    "save_original": "Guardar original",
+    "preview": "Vista previa",
+    "ai_sample": "Muestra limpiada con IA",
+    "embedding": "Embeddings y vectorstore",
+    "register": "Registro en catálogo"
+}
+
+StageCallback = Callable[[str, str], None]
+ProgressCallback = Callable[[float, str], None]
+
+
+def ensure_dir(path):
+    """Asegura que un directorio exista."""
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def clean_filename(filename):
+    """Limpia el nombre del archivo para que sea seguro."""
+    return "".join(c if c.isalnum() or c in "._- " else "_" for c in filename)
+
+def clean_text_with_ai(text: str, llm) -> str:
+    """Usa IA para limpiar y estructurar mejor el texto."""
+    try:
+        prompt = f"""Por favor, limpia y estructura el siguiente texto manteniendo toda la información importante:
+        1. Elimina caracteres extraños y formato innecesario
+        2. Corrige errores obvios de formato
+        3. Mantén la estructura de párrafos y secciones
+        4. No agregues ni modifiques el contenido
+        5. Asegura que el texto sea coherente y legible
+
+        Texto: {text[:1500]}  # Limitamos para no usar muchos tokens
+        """
+
+        response = llm.invoke(prompt)
+        return response.content
+    except Exception as e:
+        print(f"No se pudo aplicar limpieza IA: {str(e)}")
+        return text
+
+def create_preview_image(file_path: str, file_hash: str, file_type: str) -> Optional[str]:
+    """Crea las miniaturas del documento y retorna la mediana como vista previa.
+
+    Son las mismas que usa el catálogo (utils/thumbnails.py), así que la
+    primera página se renderiza una sola vez por archivo.
+    """
+    if file_type != "pdf":
+        return None
+    try:
+        return render_thumbnails(file_path, file_hash).get("medium")
+    except Exception as e:
+        print(f"No se pudo crear vista previa: {str(e)}")
+        return None
+
+def get_document_loader(file_path: str, file_type: str):
+    """Retorna el loader apropiado según el tipo de archivo."""
+    loaders = {
+        "pdf": PyPDFLoader,
+        "docx": UnstructuredWordDocumentLoader,
+        "doc": UnstructuredWordDocumentLoader,
+        "epub": UnstructuredEPubLoader,
+        "html": UnstructuredHTMLLoader,
+        "txt": UnstructuredHTMLLoader,
+        "pptx": UnstructuredPowerPointLoader,
+        "ppt": UnstructuredPowerPointLoader
+    }
+
+    loader_class = loaders.get(file_type)
+    if not loader_class:
+        raise ValueError(f"Formato no soportado: {file_type}")
+
+    return loader_class(file_path)
+
+def count_pages(file_path: str, file_type: str):
+    """Cuenta las páginas sin cargarlas (solo PDF); None si no se puede saber."""
+    if file_type != "pdf":
+        return None
+    try:
+        with fitz.open(file_path) as doc:
+            return len(doc)
+    except Exception:
+        return None
+
+def iter_page_windows(pages, window_size=None):
+    """Agrupa un iterador de páginas en ventanas de tamaño fijo."""
+    window = []
+    for page in pages:
+        window.append(page)
+        if window_size and len(window) >= window_size:
+            yield window
+            window = []
+    if window:
+        yield window
+
+def tag_page_hashes(pages):
+    """Anota cada página con el hash de su contenido y su número de aparición.
+
+    La aparición distingue páginas idénticas (p. ej. en blanco) dentro del
+    mismo documento.
+    """
+    seen = {}
+    for page in pages:
+        page_hash = text_hash(page.page_content)
+        occurrence = seen.get(page_hash, 0)
+        seen[page_hash] = occurrence + 1
+        page.metadata["page_hash"] = page_hash
+        page.metadata["page_occurrence"] = occurrence
+        yield page
+
+def page_key(metadata: Dict) -> Optional[str]:
+    """Clave estable de una página, independiente de su posición."""
+    if not metadata or "page_hash" not in metadata:
+        return None
+    return f"{metadata['page_hash']}-{metadata.get('page_occurrence', 0)}"
+
+def split_with_ids(text_splitter, pages):
+    """Divide páginas en chunks con IDs deterministas y hash de contenido."""
+    chunks = text_splitter.split_documents(pages)
+    ids = []
+    counters = {}
+    for chunk in chunks:
+        key = page_key(chunk.metadata)
+        index = counters.get(key, 0)
+        counters[key] = index + 1
+        chunk.metadata["chunk_hash"] = text_hash(chunk.page_content)
+        ids.append(f"{key}-{index}")
+    return chunks, ids
+
+def load_existing_pages(vectorstore, where: Optional[Dict] = None) -> Dict:
+    """Agrupa los chunks ya indexados por clave de página.
+
+    Los chunks sin hash (ingestados antes de esta versión) quedan bajo la
+    clave None y se reemplazan en la re-ingesta.
+    """
+    data = vectorstore._collection.get(where=where, include=["metadatas"])
+    existing = {}
+    for chunk_id, chunk_metadata in zip(data["ids"], data["metadatas"]):
+        entry = existing.setdefault(page_key(chunk_metadata), {"ids": [], "metadatas": []})
+        entry["ids"].append(chunk_id)
+        entry["metadatas"].append(chunk_metadata)
+    return existing
+
+def find_duplicate(file_hash: str, doc_hash: str, mode: str) -> Optional[Dict]:
+    """Documento ya procesado con el mismo archivo, si lo hay.
+
+    Solo cuentan los documentos listos; una reconstrucción completa pedida
+    para el propio documento no se considera duplicado.
+    """
+    duplicate = get_document_manager().find_by_file_hash(file_hash)
+    if not duplicate or duplicate.get("status", "ready") != "ready":
+        return None
+    if duplicate["hash"] == doc_hash and mode == "full":
+        return None
+    return duplicate
+
+def document_dir(metadata: Dict, doc_hash: str) -> str:
+    """Carpeta del documento en processed_docs.
+
+    Un documento ya registrado conserva la suya; uno nuevo cuyo título ya
+    ocupa una carpeta recibe un sufijo con su hash para no sobrescribirla.
+    """
+    existing = get_document_manager().get_document(doc_hash)
+    if existing and existing.get("vectorstore_path"):
+        return existing["vectorstore_path"]
+    path = os.path.join("data", "processed_docs", clean_filename(metadata["title"]))
+    if os.path.exists(path):
+        path = f"{path}_{doc_hash[:8]}"
+    return path
+
+def discard_partial_document(doc_hash: str, doc_dir: Optional[str]) -> None:
+    """Eliminar lo que dejó una primera ingesta fallida: vectores, índice y carpeta.
+
+    Solo para documentos que no estaban registrados antes de la ingesta.
+    """
+    if get_storage_mode() == STORAGE_LIBRARY:
+        get_library_vectorstore(OpenAIEmbeddings())._collection.delete(where={"doc_hash": doc_hash})
+    get_fulltext_index().delete_document(doc_hash)
+    if doc_dir and os.path.isdir(doc_dir):
+        shutil.rmtree(doc_dir, ignore_errors=True)
+
+def process_document(
+    source_path: str,
+    file_name: str,
+    metadata: Dict,
+    batch_size: int = EMBEDDING_BATCH_SIZE,
+    max_workers: int = EMBEDDING_MAX_WORKERS,
+    streaming: bool = True,
+    window_pages: int = INGEST_WINDOW_PAGES,
+    on_first_window: Optional[Callable[[str, str], None]] = None,
+    on_stage: Optional[StageCallback] = None,
+    on_progress: Optional[ProgressCallback] = None,
+    mode: str = "full"
+) -> Dict:
+    """Procesa el documento y crea el vectorstore.
+
+    En modo streaming las páginas se leen, dividen, embeben y escriben en
+    Chroma por ventanas, manteniendo acotada la memoria. No depende de
+    Streamlit: el avance se informa mediante `on_stage` y `on_progress`.
+
+    Con `mode="incremental"` se compara el archivo con los hashes de página
+    guardados en el vectorstore existente y solo se embeben las páginas
+    nuevas o modificadas; los chunks de páginas eliminadas se borran.
+
+    Si el mismo archivo (por sha256) ya está en la biblioteca no se procesa:
+    el resultado trae `duplicate_of` con el hash del documento existente,
+    cuyo vectorstore se reutiliza.
+    """
+    def stage(name, status):
+        if on_stage:
+            on_stage(name, status)
+
+    def progress(fraction, text):
+        if on_progress:
+            on_progress(fraction, text)
+
+    # Chunks anteriores y escritos en esta ingesta, para limpiar si falla
+    vectorstore = None
+    doc_dir = None
+    previous_ids, written_ids = set(), set()
+    try:
+        # Determinar tipo de archivo
+        file_extension = Path(file_name).suffix.lower()[1:]
+        if file_extension not in SUPPORTED_FORMATS:
+            return {"success": False, "error": "Formato de archivo no soportado"}
+
+        # Detectar duplicados antes de leer o embeber nada
+        file_hash = file_sha256(source_path)
+        own_hash = DocumentManager.compute_hash(metadata)
+        duplicate = find_duplicate(file_hash, own_hash, mode)
+        if duplicate:
+            for name in INGESTION_STAGES:
+                stage(name, "skipped")
+            return {
+                "success": True,
+                "duplicate_of": duplicate["hash"],
+                "doc_hash": duplicate["hash"],
+                "title": duplicate.get("title"),
+                "num_pages": duplicate.get("pages", 0),
+                "num_chunks": duplicate.get("chunks", 0),
+                "vectorstore_path": duplicate["vectorstore_path"],
+                "original_path": duplicate["original_path"],
+                "file_hash": file_hash,
+                "mode": mode,
+                "vector_storage": get_storage_mode(duplicate)
+            }
+
+        # Preparar directorios
+        stage("save_original", "running")
+        safe_title = clean_filename(metadata["title"])
+        doc_dir = ensure_dir(document_dir(metadata, own_hash))
+
+        # Guardar copia del original
+        original_path = os.path.join(doc_dir, f"original_{safe_title}{Path(file_name).suffix}")
+        shutil.copy2(source_path, original_path)
+        stage("save_original", "done")
+
+        # Crear vista previa
+        stage("preview", "running")
+        preview_path = create_preview_image(original_path, file_hash, file_extension)
+        stage("preview", "done" if preview_path else "skipped")
+
+        # Procesar documento página a página
+        loader = get_document_loader(source_path, file_extension)
+        pages = loader.lazy_load() if streaming else iter(loader.load())
+        total_pages = count_pages(source_path, file_extension)
+
+        # Chunks medidos en tokens con tamaño según el tipo de documento
+        text_splitter = get_text_splitter(metadata.get("type"))
+
+        embeddings = OpenAIEmbeddings()
+        storage = get_storage_mode()
+        incremental = mode == "incremental"
+        if storage == STORAGE_LIBRARY:
+            # Colección compartida: los chunks se etiquetan con el hash del documento
+            doc_hash = own_hash
+            doc_where = {"doc_hash": doc_hash}
+            vectorstore = get_library_vectorstore(embeddings)
+        else:
+            doc_hash = None
+            doc_where = None
+            vectorstore = Chroma(
+                persist_directory=doc_dir,
+                embedding_function=embeddings
+            )
+        existing = load_existing_pages(vectorstore, doc_where) if incremental else {}
+        # Reconstrucción completa: los chunks anteriores se borran al final,
+        # cuando el conjunto nuevo ya está escrito, para que el documento siga
+        # consultable si la ingesta falla a mitad
+        if not incremental:
+            previous_ids = set(vectorstore._collection.get(where=doc_where, include=[])["ids"])
+
+        # Índice de texto completo de la búsqueda del catálogo
+        fulltext = get_fulltext_index()
+        fulltext_hash = own_hash
+        if incremental and existing and not fulltext.count(fulltext_hash):
+            # Ingerido antes de existir el índice: indexar los chunks que se conservan
+            index_collection(fulltext, fulltext_hash, vectorstore._collection, doc_where)
+        embedding_stage = EmbeddingStage(
+            embeddings,
+            batch_size=batch_size,
+            max_workers=max_workers
+        )
+        cache = get_embedding_cache()
+
+        num_pages = 0
+        num_chunks = 0
+        cleaned_sample = None
+        embedding_stats = None
+        seen_keys = set()
+        reingest_stats = {"pages_kept": 0, "pages_added": 0, "pages_removed": 0,
+                          "chunks_added": 0, "chunks_deleted": 0}
+
+        # Sin streaming todo el documento forma una sola ventana
+        window_size = window_pages if streaming else None
+        for window_index, window in enumerate(iter_page_windows(tag_page_hashes(pages), window_size)):
+            if window_index == 0:
+                # Limpiar texto con IA (muestra del primer fragmento)
+                if incremental:
+                    stage("ai_sample", "skipped")
+                else:
+                    stage("ai_sample", "running")
+                    llm = ChatOpenAI(temperature=0, max_tokens=500)
+                    cleaned_sample = clean_text_with_ai(window[0].page_content[:1500], llm)
+                    stage("ai_sample", "done")
+                stage("embedding", "running")
+
+            # Conservar las páginas sin cambios; solo actualizar su número de página
+            new_pages = []
+            moved_ids, moved_metadatas = [], []
+            for page in window:
+                key = page_key(page.metadata)
+                seen_keys.add(key)
+                if key not in existing:
+                    new_pages.append(page)
+                    continue
+                reingest_stats["pages_kept"] += 1
+                num_chunks += len(existing[key]["ids"])
+                for chunk_id, chunk_metadata in zip(existing[key]["ids"], existing[key]["metadatas"]):
+                    if chunk_metadata.get("page") != page.metadata.get("page"):
+                        moved_ids.append(chunk_id)
+                        moved_metadatas.append({**chunk_metadata, "page": page.metadata.get("page")})
+            if moved_ids:
+                vectorstore._collection.update(ids=moved_ids, metadatas=moved_metadatas)
+                fulltext.update_pages(fulltext_hash, moved_ids,
+                                      [chunk_metadata["page"] for chunk_metadata in moved_metadatas])
+
+            # Dividir y embeber solo las páginas nuevas de esta ventana
+            chunks, chunk_ids = split_with_ids(text_splitter, new_pages)
+            if doc_hash:
+                for chunk in chunks:
+                    chunk.metadata["doc_hash"] = doc_hash
+                chunk_ids = [library_chunk_id(doc_hash, chunk_id) for chunk_id in chunk_ids]
+            reingest_stats["pages_added"] += len(new_pages)
+            reingest_stats["chunks_added"] += len(chunks)
+            pages_before = num_pages
+            num_pages += len(window)
+
+            def report_progress(done, total):
+                # Avance por páginas cuando se conoce el total; si no, por lote
+                if total_pages:
+                    fraction = (pages_before + len(window) * done / total) / total_pages
+                    text = f"Página {num_pages}/{total_pages} · {num_chunks + done} fragmentos embebidos"
+                else:
+                    fraction = done / total
+                    text = f"{num_pages} páginas · {num_chunks + done} fragmentos embebidos"
+                progress(min(fraction, 1.0), text)
+
+            written_ids.update(chunk_ids)
+            stats = add_chunks_to_vectorstore(
+                chunks,
+                vectorstore,
+                embedding_stage,
+                progress_callback=report_progress,
+                ids=chunk_ids,
+                cache=cache
+            )
+            embedding_stats = merge_embedding_stats(embedding_stats, stats)
+            fulltext.add_chunks(fulltext_hash, chunk_ids, chunks)
+            num_chunks += len(chunks)
+            if not chunks and total_pages:
+                progress(min(num_pages / total_pages, 1.0), f"Página {num_pages}/{total_pages} sin cambios")
+
+            # Tras la primera ventana el documento ya es consultable
+            if window_index == 0 and on_first_window:
+                on_first_window(doc_dir, original_path)
+
+        if embedding_stats is None:
+            return {"success": False, "error": "No se pudo extraer texto del documento",
+                    "vectorstore_path": doc_dir}
+
+        # Eliminar los chunks de páginas que ya no existen (en una reconstrucción
+        # completa, todos los anteriores que no se volvieron a escribir)
+        stale_ids = sorted(previous_ids - written_ids)
+        for key, entry in existing.items():
+            if key not in seen_keys:
+                reingest_stats["pages_removed"] += 1 if key is not None else 0
+                stale_ids.extend(entry["ids"])
+        if stale_ids:
+            vectorstore._collection.delete(ids=stale_ids)
+            fulltext.delete_chunks(fulltext_hash, stale_ids)
+        reingest_stats["chunks_deleted"] = len(stale_ids)
+        stage("embedding", "done")
+
+        return {
+            "success": True,
+            "num_pages": num_pages,
+            "num_chunks": num_chunks,
+            "vectorstore_path": doc_dir,
+            "original_path": original_path,
+            "preview_path": preview_path,
+            "file_type": file_extension,
+            "file_size": os.path.getsize(original_path),
+            "file_hash": file_hash,
+            "cleaned_sample": cleaned_sample,
+            "embedding_stats": embedding_stats,
+            "mode": mode,
+            "vector_storage": storage,
+            "reingest_stats": reingest_stats if incremental else None
+        }
+
+    except Exception as e:
+        # Quitar lo escrito de más en una reconstrucción fallida; los chunks
+        # anteriores (o sus reemplazos con el mismo ID) se conservan
+        partial_ids = sorted(written_ids - previous_ids)
+        if vectorstore is not None and partial_ids:
+            try:
+                vectorstore._collection.delete(ids=partial_ids)
+                fulltext.delete_chunks(fulltext_hash, partial_ids)
+            except Exception as cleanup_error:
+                print(f"No se pudieron descartar los chunks parciales: {str(cleanup_error)}")
+        return {
+            "success": False,
+            "error": str(e),
+            "vectorstore_path": doc_dir
+        }
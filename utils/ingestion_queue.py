@@ -0,0 +1,400 @@
+# utils/ingestion_queue.py
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Optional
+
+# Configuración de la cola (configurable desde .env)
+INGEST_QUEUE_DB = os.getenv("INGEST_QUEUE_DB", os.path.join("data", "ingestion_jobs.sqlite3"))
+INGEST_QUEUE_DIR = os.getenv("INGEST_QUEUE_DIR", os.path.join("data", "ingest_queue"))
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+# Segundos sin latido tras los cuales un trabajo en curso se considera abandonado
+INGEST_STALE_SECONDS = int(os.getenv("INGEST_STALE_SECONDS", "600"))
+
+JOB_STATUSES = ["queued", "running", "done", "failed"]
+
+
+def pid_alive(pid: int) -> bool:
+    """Si existe un proceso con ese PID en esta máquina."""
+    if os.name == "nt":
+        import ctypes
+        PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+        STILL_ACTIVE = 259
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+        if not handle:
+            return False
+        try:
+            exit_code = ctypes.c_ulong()
+            kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code))
+            return exit_code.value == STILL_ACTIVE
+        finally:
+            kernel32.CloseHandle(handle)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Existe, pero es de otro usuario
+        return True
+    return True
+
+
+class IngestionQueue:
+    """Cola persistente de trabajos de ingesta respaldada por SQLite."""
+
+    def __init__(self, db_path: str = INGEST_QUEUE_DB):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    file_path TEXT NOT NULL,
+                    file_name TEXT NOT NULL,
+                    metadata TEXT NOT NULL,
+                    options TEXT NOT NULL,
+                    stages TEXT NOT NULL DEFAULT '{}',
+                    progress REAL NOT NULL DEFAULT 0,
+                    progress_text TEXT,
+                    result TEXT,
+                    error TEXT,
+                    worker_pid INTEGER,
+                    created_at TEXT NOT NULL,
+                    started_at TEXT,
+                    finished_at TEXT,
+                    heartbeat REAL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, created_at)")
+
+    @contextmanager
+    def _connect(self):
+        """Conexión en modo autocommit que se cierra al salir del bloque."""
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def _row_to_job(self, row: sqlite3.Row) -> Dict:
+        job = dict(row)
+        for key in ("metadata", "options", "stages", "result"):
+            if job.get(key):
+                job[key] = json.loads(job[key])
+        return job
+
+    def enqueue(self, file_bytes: bytes, file_name: str, metadata: Dict, options: Optional[Dict] = None) -> str:
+        """Guarda el archivo en disco y encola su procesamiento."""
+        job_id = uuid.uuid4().hex
+        os.makedirs(INGEST_QUEUE_DIR, exist_ok=True)
+        file_path = os.path.join(INGEST_QUEUE_DIR, f"{job_id}_{os.path.basename(file_name)}")
+        with open(file_path, "wb") as f:
+            f.write(file_bytes)
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, status, file_path, file_name, metadata, options, created_at) "
+                "VALUES (?, 'queued', ?, ?, ?, ?, ?)",
+                (job_id, file_path, file_name,
+                 json.dumps(metadata, ensure_ascii=False),
+                 json.dumps(options or {}),
+                 datetime.now().isoformat())
+            )
+        return job_id
+
+    def get_job(self, job_id: str) -> Optional[Dict]:
+        """Obtener un trabajo por su id."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def list_jobs(self, limit: int = 50) -> List[Dict]:
+        """Obtener los trabajos más recientes."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [self._row_to_job(row) for row in rows]
+
+    def claim_next(self) -> Optional[str]:
+        """Toma de forma atómica el trabajo en cola más antiguo."""
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT id FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+            ).fetchone()
+            if not row:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = 'running', started_at = ?, heartbeat = ? WHERE id = ?",
+                (datetime.now().isoformat(), time.time(), row["id"])
+            )
+            conn.execute("COMMIT")
+        return row["id"]
+
+    def requeue_stale(self) -> int:
+        """Vuelve a encolar trabajos cuyo worker murió.
+
+        Un latido viejo no basta: una ventana de embeddings larga o una
+        espera por límite de tasa pueden dejar sin latido a un worker vivo,
+        y reencolarlo haría correr dos veces el mismo documento a la vez.
+        Solo se reencolan los trabajos sin latido cuyo proceso ya no existe.
+        """
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute(
+                "SELECT id, worker_pid FROM jobs WHERE status = 'running' AND heartbeat < ?",
+                (time.time() - INGEST_STALE_SECONDS,)
+            ).fetchall()
+            stale = [row["id"] for row in rows
+                     if row["worker_pid"] is None or not pid_alive(row["worker_pid"])]
+            conn.executemany(
+                "UPDATE jobs SET status = 'queued', worker_pid = NULL WHERE id = ?",
+                [(job_id,) for job_id in stale]
+            )
+            conn.execute("COMMIT")
+        return len(stale)
+
+    def update_stage(self, job_id: str, stage: str, status: str) -> None:
+        """Registra el estado y la duración de una etapa."""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT stages FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            stages = json.loads(row["stages"]) if row else {}
+            entry = stages.get(stage, {})
+            if status == "running":
+                entry = {"status": status, "started": now}
+            else:
+                entry["status"] = status
+                entry["seconds"] = now - entry.get("started", now)
+            stages[stage] = entry
+            conn.execute(
+                "UPDATE jobs SET stages = ?, heartbeat = ? WHERE id = ?",
+                (json.dumps(stages), now, job_id)
+            )
+            conn.execute("COMMIT")
+
+    def update_progress(self, job_id: str, fraction: float, text: str) -> None:
+        """Actualiza el avance del trabajo (también sirve de latido)."""
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET progress = ?, progress_text = ?, heartbeat = ?, worker_pid = ? WHERE id = ?",
+                (fraction, text, time.time(), os.getpid(), job_id)
+            )
+
+    def finish(self, job_id: str, result: Dict) -> None:
+        """Marca el trabajo como terminado con su resultado.
+
+        Con éxito o con error ya no se vuelve a procesar, así que el archivo
+        subido a INGEST_QUEUE_DIR se elimina.
+        """
+        status = "done" if result.get("success") else "failed"
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, progress = ?, finished_at = ? WHERE id = ?",
+                (status, json.dumps(result, ensure_ascii=False), result.get("error"),
+                 1.0 if status == "done" else 0.0, datetime.now().isoformat(), job_id)
+            )
+            row = conn.execute("SELECT file_path FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row and os.path.exists(row["file_path"]):
+            os.remove(row["file_path"])
+
+
+STAGE_ICONS = {"running": "⏳", "done": "✅", "skipped": "➖"}
+
+
+def format_job_stages(job: Dict) -> str:
+    """Lista en markdown con el estado y la duración de cada etapa de un trabajo."""
+    from utils.ingestion import INGESTION_STAGES
+
+    lines = []
+    for stage, label in INGESTION_STAGES.items():
+        info = job['stages'].get(stage)
+        if not info:
+            lines.append(f"- ▫️ {label}")
+        elif 'seconds' in info:
+            lines.append(f"- {STAGE_ICONS.get(info['status'], '❔')} {label} ({info['seconds']:.1f} s)")
+        else:
+            lines.append(f"- {STAGE_ICONS.get(info['status'], '❔')} {label}")
+    return "\n".join(lines)
+
+
+def rollback_registration(doc_hash: str, previous: Optional[Dict], vectorstore_path: Optional[str]) -> None:
+    """Deshacer lo que dejó una ingesta que falló.
+
+    Un documento que ya existía recupera su metadata anterior (sigue
+    consultable con sus vectores previos); uno nuevo se quita del catálogo
+    junto con sus vectores parciales y su carpeta. `vectorstore_path` es
+    None si el documento no llegó a registrarse.
+    """
+    from utils.document_manager import get_document_manager
+    from utils.ingestion import discard_partial_document
+
+    try:
+        doc_manager = get_document_manager()
+        if previous is not None:
+            if vectorstore_path is not None:
+                doc_manager.restore_document(doc_hash, previous)
+            return
+        if doc_manager.get_document(doc_hash) is not None:
+            doc_manager.delete_document(doc_hash)
+        discard_partial_document(doc_hash, vectorstore_path)
+    except Exception as e:
+        print(f"No se pudo deshacer el registro de {doc_hash}: {str(e)}")
+
+
+def run_job(job_id: str, db_path: str = INGEST_QUEUE_DB) -> Dict:
+    """Ejecuta un trabajo de ingesta (se llama dentro de un proceso worker)."""
+    from utils.document_manager import DocumentManager, get_document_manager
+    from utils.ingestion import process_document
+    from utils.vector_library import get_storage_mode
+
+    queue = IngestionQueue(db_path)
+    job = queue.get_job(job_id)
+    metadata = job["metadata"]
+    # Para deshacer el registro provisional si la ingesta falla
+    doc_hash = DocumentManager.compute_hash(metadata)
+    previous = get_document_manager().get_document(doc_hash)
+    provisional = {}
+    if previous is not None and previous.get("status") == "processing":
+        # Registro provisional de un intento anterior que murió a medias: el
+        # documento no existía antes, y si este intento falla se descarta
+        provisional["vectorstore_path"] = previous.get("vectorstore_path")
+        previous = None
+
+    def register(vectorstore_path, original_path, extra=None):
+        return get_document_manager().add_document(
+            {**metadata, **(extra or {})},
+            vectorstore_path,
+            original_path
+        )
+
+    def register_provisional(vectorstore_path, original_path):
+        provisional["vectorstore_path"] = vectorstore_path
+        register(vectorstore_path, original_path,
+                 {"status": "processing", "vector_storage": get_storage_mode()})
+
+    try:
+        queue.update_progress(job_id, 0.0, "Iniciando")
+        result = process_document(
+            job["file_path"],
+            job["file_name"],
+            metadata,
+            on_first_window=register_provisional,
+            on_stage=lambda stage, status: queue.update_stage(job_id, stage, status),
+            on_progress=lambda fraction, text: queue.update_progress(job_id, fraction, text),
+            **job["options"]
+        )
+        if result["success"] and not result.get("duplicate_of"):
+            queue.update_stage(job_id, "register", "running")
+            result["doc_hash"] = register(
+                result["vectorstore_path"],
+                result["original_path"],
+                {"status": "ready", "pages": result["num_pages"], "chunks": result["num_chunks"],
+                 "vector_storage": result["vector_storage"], "file_hash": result["file_hash"]}
+            )
+            queue.update_stage(job_id, "register", "done")
+    except Exception as e:
+        result = {"success": False, "error": str(e)}
+
+    if not result.get("success"):
+        # Si falló antes del registro provisional, la carpeta viene en el resultado
+        vectorstore_path = provisional.get("vectorstore_path")
+        if previous is None:
+            vectorstore_path = vectorstore_path or result.get("vectorstore_path")
+        rollback_registration(doc_hash, previous, vectorstore_path)
+    queue.finish(job_id, result)
+    return result
+
+
+class IngestionWorkerPool:
+    """Pool de procesos que drena la cola de ingesta en segundo plano."""
+
+    def __init__(self, max_workers: int = INGEST_WORKERS, poll_interval: float = 1.0,
+                 db_path: str = INGEST_QUEUE_DB):
+        self.queue = IngestionQueue(db_path)
+        self.db_path = db_path
+        self.max_workers = max_workers
+        self.poll_interval = poll_interval
+        # spawn evita heredar el estado de los hilos de Streamlit
+        self.executor = ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+        self._in_flight = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._dispatch_loop, daemon=True)
+        self._thread.start()
+
+    def _dispatch_loop(self) -> None:
+        while not self._stop.is_set():
+            # En cada vuelta: un worker puede morir mientras el servidor sigue activo
+            self.queue.requeue_stale()
+            with self._lock:
+                free_slots = self.max_workers - len(self._in_flight)
+            job_id = self.queue.claim_next() if free_slots > 0 else None
+            if not job_id:
+                self._stop.wait(self.poll_interval)
+                continue
+            future = self.executor.submit(run_job, job_id, self.db_path)
+            with self._lock:
+                self._in_flight.add(future)
+            future.add_done_callback(self._on_done(job_id))
+
+    def _on_done(self, job_id: str):
+        def callback(future):
+            with self._lock:
+                self._in_flight.discard(future)
+            error = future.exception()
+            if error:
+                # El proceso worker murió sin registrar el resultado
+                self.queue.finish(job_id, {"success": False, "error": str(error)})
+        return callback
+
+    def active_jobs(self) -> int:
+        with self._lock:
+            return len(self._in_flight)
+
+    def shutdown(self) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.executor.shutdown(wait=True)
+
+
+_pool_instance: Optional[IngestionWorkerPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_worker_pool() -> IngestionWorkerPool:
+    """Pool compartido por todo el proceso del servidor."""
+    global _pool_instance
+    with _pool_lock:
+        if _pool_instance is None:
+            _pool_instance = IngestionWorkerPool()
+        return _pool_instance
+
+
+if __name__ == "__main__":
+    # Worker independiente: python -m utils.ingestion_queue
+    from dotenv import load_dotenv
+    load_dotenv()
+    pool = IngestionWorkerPool()
+    print(f"Procesando la cola {INGEST_QUEUE_DB} con {pool.max_workers} workers (Ctrl+C para salir)")
+    try:
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        pool.shutdown()
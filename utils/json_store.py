@@ -0,0 +1,152 @@
+# utils/json_store.py
+"""Archivos JSON seguros ante caídas y escrituras concurrentes.
+
+Cada escritura se hace en un temporal del mismo directorio que luego
+reemplaza al archivo con `os.replace` (atómico), así un proceso que muere a
+mitad de escritura nunca deja un JSON truncado. Los cambios de tipo
+leer-modificar-escribir se hacen con `update()` bajo un bloqueo de archivo
+compartido entre procesos, para que varios servidores de Streamlit no se
+pisen las actualizaciones. La versión de un archivo es su firma en disco
+(cambia con cada reemplazo) y permite escrituras optimistas con
+`write(data, expected_version=...)`.
+"""
+import os
+import json
+import stat
+import tempfile
+from contextlib import contextmanager
+from typing import Any, Callable, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# `mkstemp` crea el temporal con permisos 0600; los archivos nuevos reciben
+# los mismos permisos que daría `open(..., "w")` con la umask del proceso
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+NEW_FILE_MODE = 0o666 & ~_UMASK
+
+
+class VersionConflict(Exception):
+    """El archivo cambió desde que se leyó."""
+
+
+def file_version(path: str) -> Optional[tuple]:
+    """Firma del archivo en disco; None si no existe."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+
+class JSONStore:
+    """Un archivo JSON con bloqueo entre procesos y reemplazo atómico."""
+
+    def __init__(self, path: str, default: Callable[[], Any] = dict, indent: Optional[int] = 2):
+        self.path = path
+        self.lock_path = f"{path}.lock"
+        self.default = default
+        self.indent = indent
+
+    def version(self) -> Optional[tuple]:
+        return file_version(self.path)
+
+    @contextmanager
+    def lock(self):
+        """Bloqueo exclusivo entre procesos (y entre hilos con distinto descriptor)."""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.lock_path, "a+b") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+                else:
+                    lock_file.seek(0)
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def read(self) -> Tuple[Any, Optional[tuple]]:
+        """Contenido y versión leídos de forma consistente.
+
+        No requiere el bloqueo: el archivo siempre se reemplaza completo.
+        Lanza json.JSONDecodeError si el contenido está dañado.
+        """
+        while True:
+            version = self.version()
+            if version is None:
+                return self.default(), None
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except FileNotFoundError:
+                continue
+            # Si otro proceso lo reemplazó mientras se leía, leer de nuevo
+            if self.version() == version:
+                return data, version
+
+    def load(self) -> Any:
+        return self.read()[0]
+
+    def _write_unlocked(self, data: Any) -> tuple:
+        directory = os.path.dirname(self.path) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(self.path)}.", suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=self.indent)
+                f.flush()
+                os.fsync(f.fileno())
+            # Conservar los permisos del archivo que se reemplaza
+            try:
+                mode = stat.S_IMODE(os.stat(self.path).st_mode)
+            except FileNotFoundError:
+                mode = NEW_FILE_MODE
+            os.chmod(tmp_path, mode)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return self.version()
+
+    def write(self, data: Any, expected_version: Optional[tuple] = None, locked: bool = False) -> tuple:
+        """Reemplazar el contenido; con `expected_version` falla si hubo otra escritura.
+
+        Con `locked=True` el llamador ya tiene `lock()` (p. ej. para leer y
+        decidir qué escribir en la misma sección crítica).
+        """
+        if locked:
+            if expected_version is not None and self.version() != expected_version:
+                raise VersionConflict(self.path)
+            return self._write_unlocked(data)
+        with self.lock():
+            return self.write(data, expected_version, locked=True)
+
+    def update(self, mutate: Callable[[Any], Any]) -> Tuple[Any, Any, tuple]:
+        """Leer, modificar y escribir bajo el bloqueo.
+
+        `mutate` recibe el contenido actual y lo modifica en sitio; retorna
+        (contenido, resultado de mutate, nueva versión).
+        """
+        with self.lock():
+            data, _ = self.read()
+            result = mutate(data)
+            version = self._write_unlocked(data)
+        return data, result, version
+
+    def quarantine(self) -> Optional[str]:
+        """Apartar un archivo dañado para no sobrescribirlo; retorna la copia."""
+        if not os.path.exists(self.path):
+            return None
+        backup_path = f"{self.path}.corrupt-{self.version()[0]}"
+        os.replace(self.path, backup_path)
+        return backup_path
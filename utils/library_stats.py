@@ -0,0 +1,94 @@
+# utils/library_stats.py
+"""Estadísticas agregadas de la biblioteca.
+
+`DocumentManager` las mantiene de forma incremental en data/stats.json
+(totales, conteos por categoría, tipo y nivel, e histograma de ingestas por
+día) para que la página de inicio no recorra la metadata. Si se desalinean
+(p. ej. tras editar metadata.json a mano) se reconstruyen con:
+    python -m utils.library_stats rebuild
+"""
+import argparse
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+
+# Campo del documento -> clave del conteo
+COUNTED_FIELDS = {
+    "category": "by_category",
+    "type": "by_type",
+    "level": "by_level"
+}
+
+
+def empty_stats() -> Dict:
+    return {
+        "total_documents": 0,
+        "total_pages": 0,
+        "total_chunks": 0,
+        "by_day": {},
+        "by_category": {},
+        "by_type": {},
+        "by_level": {}
+    }
+
+
+def ingestion_day(doc: Dict) -> Optional[str]:
+    """Día (ISO) en que se procesó un documento."""
+    try:
+        return datetime.fromisoformat(doc.get("processed_date", "")).date().isoformat()
+    except (ValueError, TypeError):
+        return None
+
+
+def _as_int(value) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _bump(counts: Dict, key, delta: int) -> None:
+    if not key:
+        return
+    value = counts.get(key, 0) + delta
+    if value > 0:
+        counts[key] = value
+    else:
+        counts.pop(key, None)
+
+
+def apply_document(stats: Dict, doc: Dict, delta: int = 1) -> None:
+    """Sumar (delta=1) o restar (delta=-1) la contribución de un documento."""
+    stats["total_documents"] += delta
+    stats["total_pages"] += delta * _as_int(doc.get("pages"))
+    stats["total_chunks"] += delta * _as_int(doc.get("chunks"))
+    for field, key in COUNTED_FIELDS.items():
+        _bump(stats[key], doc.get(field), delta)
+    _bump(stats["by_day"], ingestion_day(doc), delta)
+
+
+def compute_stats(documents: Iterable[Dict]) -> Dict:
+    """Recalcular las estadísticas desde cero."""
+    stats = empty_stats()
+    for doc in documents:
+        apply_document(stats, doc)
+    return stats
+
+
+def main():
+    from utils.document_manager import get_document_manager
+
+    parser = argparse.ArgumentParser(description="Estadísticas de la biblioteca")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("rebuild", help="Recalcular data/stats.json desde la metadata")
+    args = parser.parse_args()
+
+    if args.command == "rebuild":
+        stats = get_document_manager().rebuild_stats()
+        print(f"✅ {stats['total_documents']} documentos, {stats['total_pages']} páginas, "
+              f"{len(stats['by_category'])} categorías, {len(stats['by_day'])} días con ingestas")
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    load_dotenv()
+    main()
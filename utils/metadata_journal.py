@@ -0,0 +1,225 @@
+# utils/metadata_journal.py
+"""Journal de solo-anexado para la metadata de documentos (backend JSON).
+
+`metadata.json` es la última instantánea {hash: metadata} y cada cambio
+posterior se anexa como una línea a `metadata.journal.jsonl`:
+
+    {"op": "add" | "update", "hash": "...", "doc": {...}, "ts": "..."}
+    {"op": "delete", "hash": "...", "ts": "..."}
+
+Registrar un documento cuesta así una línea, no reescribir todo el
+catálogo. Cada proceso recuerda hasta qué byte leyó el journal y solo
+aplica las líneas nuevas; la instantánea se vuelve a leer únicamente
+cuando alguien la compacta. Cuando el journal supera
+METADATA_JOURNAL_MAX_BYTES se compacta en segundo plano: se reescribe la
+instantánea con todos los eventos y el journal queda vacío. Las escrituras
+usan el mismo bloqueo de archivo que `metadata.json` (ver utils/json_store.py).
+
+Si el proceso muere entre escribir la instantánea y vaciar el journal, los
+eventos se vuelven a aplicar al cargar, lo cual no cambia el resultado.
+Compactación manual:
+    python -m utils.metadata_journal compact
+"""
+import os
+import json
+import argparse
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from utils.json_store import JSONStore
+
+# Tamaño del journal a partir del cual se compacta
+METADATA_JOURNAL_MAX_BYTES = int(os.getenv("METADATA_JOURNAL_MAX_BYTES", str(8 * 1024 * 1024)))
+
+# (hash, metadata anterior, metadata nueva); None si no existía o se eliminó
+Change = Tuple[str, Optional[Dict], Optional[Dict]]
+
+
+def apply_event(metadata: Dict, event: Dict) -> Change:
+    """Aplicar un evento del journal a la metadata en memoria."""
+    doc_hash = event["hash"]
+    previous = metadata.get(doc_hash)
+    if event["op"] == "delete":
+        metadata.pop(doc_hash, None)
+        return doc_hash, previous, None
+    metadata[doc_hash] = event["doc"]
+    return doc_hash, previous, event["doc"]
+
+
+class MetadataJournal:
+    """Instantánea JSON más journal de eventos, con lecturas incrementales."""
+
+    def __init__(self, snapshot_path: str, journal_path: Optional[str] = None,
+                 max_bytes: int = METADATA_JOURNAL_MAX_BYTES):
+        self.snapshot = JSONStore(snapshot_path)
+        self.journal_path = journal_path or f"{os.path.splitext(snapshot_path)[0]}.journal.jsonl"
+        self.max_bytes = max_bytes
+        # Versión de la instantánea y (inodo, byte) del journal ya aplicados
+        self._snapshot_version = None
+        self._journal_position = None
+        self._compacting = threading.Lock()
+
+    def _journal_stat(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self.journal_path)
+        except OSError:
+            return None
+        return stat.st_ino, stat.st_size
+
+    def changed(self) -> bool:
+        """Si hay eventos o una instantánea que este proceso no leyó (sin abrir archivos)."""
+        return (self.snapshot.version() != self._snapshot_version
+                or self._journal_stat() != self._journal_position)
+
+    def _read_events(self, offset: int) -> Tuple[List[Dict], int]:
+        """Eventos completos a partir de `offset`; retorna también dónde terminan."""
+        try:
+            with open(self.journal_path, "rb") as f:
+                f.seek(offset)
+                data = f.read()
+        except FileNotFoundError:
+            return [], 0
+        # Una última línea sin salto es una escritura interrumpida
+        end = data.rfind(b"\n") + 1
+        events = []
+        for line in data[:end].splitlines():
+            if not line.strip():
+                continue
+            try:
+                events.append(json.loads(line))
+            except json.JSONDecodeError:
+                print(f"Evento dañado ignorado en {self.journal_path}")
+        return events, offset + end
+
+    def _ends_with_newline(self) -> bool:
+        with open(self.journal_path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
+
+    def _catch_up(self, metadata: Dict) -> List[Change]:
+        stat = self._journal_stat()
+        if stat is None:
+            self._journal_position = None
+            return []
+        position = self._journal_position
+        offset = position[1] if position and position[0] == stat[0] else 0
+        events, end = self._read_events(offset)
+        self._journal_position = (stat[0], end)
+        return [apply_event(metadata, event) for event in events]
+
+    def _load_unlocked(self) -> Dict:
+        metadata, self._snapshot_version = self.snapshot.read()
+        self._journal_position = None
+        self._catch_up(metadata)
+        return metadata
+
+    def load(self) -> Dict:
+        """Leer la instantánea y aplicar todo el journal.
+
+        Lanza json.JSONDecodeError si la instantánea está dañada.
+        """
+        with self.snapshot.lock():
+            return self._load_unlocked()
+
+    def sync(self, metadata: Dict) -> Optional[List[Change]]:
+        """Aplicar a `metadata` los eventos nuevos de otros procesos.
+
+        Retorna los cambios aplicados, o None si la instantánea cambió
+        (se compactó) y hay que volver a cargar con `load()`.
+        """
+        with self.snapshot.lock():
+            if self.snapshot.version() != self._snapshot_version:
+                return None
+            return self._catch_up(metadata)
+
+    def _append(self, metadata: Dict, event: Dict) -> Tuple[Dict, Optional[List[Change]], Optional[Dict]]:
+        """Anexar un evento tras ponerse al día con el journal.
+
+        Retorna (metadata, cambios de otros procesos o None si se recargó
+        todo, metadata anterior del documento).
+        """
+        with self.snapshot.lock():
+            if self.snapshot.version() != self._snapshot_version:
+                metadata, changes = self._load_unlocked(), None
+            else:
+                changes = self._catch_up(metadata)
+            if event["op"] != "delete":
+                event["op"] = "update" if event["hash"] in metadata else "add"
+            line = (json.dumps(event, ensure_ascii=False) + "\n").encode("utf-8")
+            with open(self.journal_path, "ab") as f:
+                # Cerrar la línea de una escritura interrumpida antes de anexar
+                if f.tell() > 0 and not self._ends_with_newline():
+                    line = b"\n" + line
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+            _, previous, _ = apply_event(metadata, event)
+            self._journal_position = self._journal_stat()
+            size = self._journal_position[1]
+        if size > self.max_bytes:
+            self.compact_in_background()
+        return metadata, changes, previous
+
+    def put(self, metadata: Dict, doc_hash: str, doc: Dict) -> Tuple[Dict, Optional[List[Change]], Optional[Dict]]:
+        """Registrar un documento nuevo o actualizado (ver `_append`)."""
+        return self._append(metadata, {"op": "update", "hash": doc_hash, "doc": doc,
+                                       "ts": datetime.now().isoformat()})
+
+    def delete(self, metadata: Dict, doc_hash: str) -> Tuple[Dict, Optional[List[Change]], Optional[Dict]]:
+        """Eliminar un documento (ver `_append`)."""
+        return self._append(metadata, {"op": "delete", "hash": doc_hash, "ts": datetime.now().isoformat()})
+
+    def compact(self) -> int:
+        """Escribir una instantánea con todos los eventos y vaciar el journal.
+
+        Retorna el número de eventos incorporados.
+        """
+        with self.snapshot.lock():
+            metadata, snapshot_version = self.snapshot.read()
+            events, _ = self._read_events(0)
+            for event in events:
+                apply_event(metadata, event)
+            # Si este proceso ya tenía todo aplicado, su metadata sigue al día
+            up_to_date = (snapshot_version == self._snapshot_version
+                          and self._journal_position == self._journal_stat())
+            version = self.snapshot.write(metadata, locked=True)
+            if os.path.exists(self.journal_path):
+                os.truncate(self.journal_path, 0)
+            if up_to_date:
+                self._snapshot_version = version
+                self._journal_position = self._journal_stat()
+        return len(events)
+
+    def compact_in_background(self) -> None:
+        """Compactar en un hilo aparte (uno a la vez por proceso)."""
+        if not self._compacting.acquire(blocking=False):
+            return
+
+        def run():
+            try:
+                self.compact()
+            except Exception as e:
+                print(f"Error compactando {self.journal_path}: {str(e)}")
+            finally:
+                self._compacting.release()
+
+        threading.Thread(target=run, name="metadata-journal-compact", daemon=True).start()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Journal de metadata de documentos")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    compact_parser = subparsers.add_parser("compact", help="Incorporar el journal a metadata.json")
+    compact_parser.add_argument("--source", default=os.path.join("data", "metadata.json"))
+    args = parser.parse_args()
+
+    if args.command == "compact":
+        count = MetadataJournal(args.source).compact()
+        print(f"✅ {count} eventos incorporados a {args.source}")
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    load_dotenv()
+    main()
@@ -0,0 +1,232 @@
+# utils/metadata_store.py
+"""Metadata de documentos en SQLite.
+
+Alternativa a metadata.json para catálogos grandes (METADATA_BACKEND=sqlite).
+Cada documento se guarda como JSON junto con columnas indexadas para los
+filtros del catálogo, y el almacén se comporta como un diccionario de solo
+lectura {hash: metadata}, de modo que `DocumentManager.metadata` mantiene
+la misma interfaz con ambos backends.
+
+Importación única de un metadata.json existente:
+    python -m utils.metadata_store import
+"""
+import os
+import json
+import sqlite3
+import argparse
+from collections.abc import Mapping
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from utils.metadata_journal import MetadataJournal
+
+METADATA_BACKEND = os.getenv("METADATA_BACKEND", "json")
+METADATA_DB = os.getenv("METADATA_DB", os.path.join("data", "metadata.sqlite3"))
+
+# Campos con columna e índice propios
+INDEXED_FIELDS = ["category", "type", "level", "language", "year", "processed_date", "file_hash"]
+# Campos por los que se puede ordenar el catálogo
+SORT_FIELDS = ["processed_date", "title", "year"]
+
+
+def _year(value) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def sort_value(doc: Dict, field: str):
+    """Valor comparable de un documento para ordenar por `field`."""
+    if field == "year":
+        return _year(doc.get("year")) or 0
+    return str(doc.get(field) or "")
+
+
+class SQLiteMetadataStore(Mapping):
+    """Diccionario {hash: metadata} respaldado por SQLite en modo WAL."""
+
+    def __init__(self, db_path: str = METADATA_DB):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS documents (
+                    hash TEXT PRIMARY KEY,
+                    title TEXT,
+                    category TEXT,
+                    type TEXT,
+                    level TEXT,
+                    language TEXT,
+                    year INTEGER,
+                    processed_date TEXT,
+                    file_hash TEXT,
+                    data TEXT NOT NULL
+                )
+            """)
+            # Bases creadas antes de existir la columna: agregarla y llenarla
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(documents)")}
+            if "file_hash" not in columns:
+                conn.execute("ALTER TABLE documents ADD COLUMN file_hash TEXT")
+                conn.execute("UPDATE documents SET file_hash = json_extract(data, '$.file_hash')")
+            for field in dict.fromkeys(INDEXED_FIELDS + SORT_FIELDS):
+                conn.execute(f"CREATE INDEX IF NOT EXISTS idx_documents_{field} ON documents({field})")
+            conn.execute("CREATE TABLE IF NOT EXISTS store_info (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            conn.execute("INSERT OR IGNORE INTO store_info (key, value) VALUES ('version', 0)")
+
+    @contextmanager
+    def _connect(self):
+        """Conexión en modo autocommit que se cierra al salir del bloque."""
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def __getitem__(self, doc_hash: str) -> Dict:
+        with self._connect() as conn:
+            row = conn.execute("SELECT data FROM documents WHERE hash = ?", (doc_hash,)).fetchone()
+        if row is None:
+            raise KeyError(doc_hash)
+        return json.loads(row[0])
+
+    def __contains__(self, doc_hash) -> bool:
+        with self._connect() as conn:
+            return conn.execute("SELECT 1 FROM documents WHERE hash = ?", (doc_hash,)).fetchone() is not None
+
+    def __iter__(self) -> Iterator[str]:
+        with self._connect() as conn:
+            rows = conn.execute("SELECT hash FROM documents ORDER BY rowid").fetchall()
+        return iter([row[0] for row in rows])
+
+    def __len__(self) -> int:
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def values(self) -> List[Dict]:
+        with self._connect() as conn:
+            rows = conn.execute("SELECT data FROM documents ORDER BY rowid").fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def items(self) -> List:
+        return [(doc["hash"], doc) for doc in self.values()]
+
+    def version(self) -> int:
+        """Contador que aumenta con cada escritura (de cualquier proceso)."""
+        with self._connect() as conn:
+            return conn.execute("SELECT value FROM store_info WHERE key = 'version'").fetchone()[0]
+
+    def put_many(self, documents: Dict[str, Dict]) -> int:
+        """Insertar o actualizar documentos en una sola transacción; retorna la nueva versión."""
+        rows = [
+            (doc_hash, doc.get("title"), doc.get("category"), doc.get("type"), doc.get("level"),
+             doc.get("language"), _year(doc.get("year")), doc.get("processed_date"), doc.get("file_hash"),
+             json.dumps(doc, ensure_ascii=False))
+            for doc_hash, doc in documents.items()
+        ]
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            # ON CONFLICT conserva el rowid, y con él el orden de inserción
+            conn.executemany("""
+                INSERT INTO documents (hash, title, category, type, level, language, year, processed_date, file_hash, data)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(hash) DO UPDATE SET
+                    title = excluded.title, category = excluded.category, type = excluded.type,
+                    level = excluded.level, language = excluded.language, year = excluded.year,
+                    processed_date = excluded.processed_date, file_hash = excluded.file_hash,
+                    data = excluded.data
+            """, rows)
+            conn.execute("UPDATE store_info SET value = value + 1 WHERE key = 'version'")
+            version = conn.execute("SELECT value FROM store_info WHERE key = 'version'").fetchone()[0]
+            conn.execute("COMMIT")
+        return version
+
+    def put(self, doc_hash: str, doc: Dict) -> int:
+        return self.put_many({doc_hash: doc})
+
+    def delete(self, doc_hash: str) -> int:
+        """Eliminar un documento; retorna la nueva versión."""
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM documents WHERE hash = ?", (doc_hash,))
+            conn.execute("UPDATE store_info SET value = value + 1 WHERE key = 'version'")
+            version = conn.execute("SELECT value FROM store_info WHERE key = 'version'").fetchone()[0]
+            conn.execute("COMMIT")
+        return version
+
+    def _where(self, filters: Dict) -> Tuple[str, List, Dict]:
+        """Cláusula WHERE para los filtros del catálogo.
+
+        Mismas reglas que la búsqueda sobre JSON: se ignoran los valores vacíos,
+        "Todas" y "Todos", y `year_range` es un rango inclusivo. Retorna
+        también los filtros sin columna propia, que se aplican en Python.
+        """
+        clauses, params, remaining = [], [], {}
+        for key, value in (filters or {}).items():
+            if not value or value in ("Todas", "Todos"):
+                continue
+            if key == "year_range":
+                clauses.append("COALESCE(year, 0) BETWEEN ? AND ?")
+                params.extend([value[0], value[1]])
+            elif key in INDEXED_FIELDS:
+                clauses.append(f"{key} = ?")
+                params.append(value)
+            else:
+                remaining[key] = value
+        where = " WHERE " + " AND ".join(clauses) if clauses else ""
+        return where, params, remaining
+
+    def filter(self, filters: Dict) -> List[Dict]:
+        """Documentos que cumplen los filtros del catálogo, usando los índices."""
+        where, params, remaining = self._where(filters)
+        with self._connect() as conn:
+            rows = conn.execute(f"SELECT data FROM documents{where} ORDER BY rowid", params).fetchall()
+        results = [json.loads(row[0]) for row in rows]
+        for key, value in remaining.items():
+            results = [doc for doc in results if doc.get(key) == value]
+        return results
+
+    def query(self, filters: Dict, sort_field: str, descending: bool,
+              offset: int, limit: int) -> Tuple[List[Dict], int]:
+        """Una página de documentos ordenada con el índice de `sort_field`, y el total."""
+        where, params, remaining = self._where(filters)
+        if remaining:
+            results = sorted(self.filter(filters), key=lambda doc: sort_value(doc, sort_field), reverse=descending)
+            return results[offset:offset + limit], len(results)
+
+        direction = "DESC" if descending else "ASC"
+        with self._connect() as conn:
+            total = conn.execute(f"SELECT COUNT(*) FROM documents{where}", params).fetchone()[0]
+            rows = conn.execute(
+                f"SELECT data FROM documents{where} ORDER BY {sort_field} {direction}, rowid {direction} "
+                "LIMIT ? OFFSET ?",
+                params + [limit, offset]
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows], total
+
+    def import_json(self, json_path: str) -> int:
+        """Importar un metadata.json existente (con su journal); retorna el número de documentos."""
+        documents = MetadataJournal(json_path).load()
+        if documents:
+            self.put_many(documents)
+        return len(documents)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Metadata de documentos en SQLite")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    import_parser = subparsers.add_parser("import", help="Importar un metadata.json existente")
+    import_parser.add_argument("--source", default=os.path.join("data", "metadata.json"))
+    import_parser.add_argument("--db", default=METADATA_DB)
+    args = parser.parse_args()
+
+    if args.command == "import":
+        count = SQLiteMetadataStore(args.db).import_json(args.source)
+        print(f"✅ {count} documentos importados a {args.db}")
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    load_dotenv()
+    main()
@@ -0,0 +1,122 @@
+# utils/query_embeddings.py
+"""Embeddings de consultas compartidos por todo el proceso.
+
+Todos los vectorstores que abren los agentes usan la misma instancia de
+`QueryEmbeddings`, que guarda en memoria (LRU, con vencimiento opcional) el
+vector de cada consulta ya embebida. Una pregunta cuesta así una llamada a
+la API por texto distinto, aunque el agente tenga muchos documentos o el
+ReAct repita la búsqueda. Los embeddings de documentos no pasan por aquí:
+la ingesta usa la caché persistente de utils/embedding_cache.py.
+"""
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from langchain_core.embeddings import Embeddings
+from langchain_openai.embeddings import OpenAIEmbeddings
+from utils.embedding_cache import normalize_text
+
+# Consultas que se recuerdan y segundos que vale cada una (0 = sin vencimiento)
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "1024"))
+QUERY_EMBEDDING_CACHE_TTL_SECONDS = float(os.getenv("QUERY_EMBEDDING_CACHE_TTL_SECONDS", "0"))
+
+
+class QueryEmbeddings(Embeddings):
+    """Envuelve un modelo de embeddings y memoriza los vectores de las consultas.
+
+    La clave es el texto normalizado (ver `normalize_text`), así que
+    diferencias de espacios no cuentan como consultas distintas. Si varios
+    hilos piden a la vez la misma consulta, solo uno llama al modelo y los
+    demás esperan su resultado.
+    """
+
+    def __init__(self, embeddings: Embeddings, max_entries: int = QUERY_EMBEDDING_CACHE_SIZE,
+                 ttl_seconds: float = QUERY_EMBEDDING_CACHE_TTL_SECONDS):
+        self.embeddings = embeddings
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, List[float]]]" = OrderedDict()
+        self._pending: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def model(self) -> Optional[str]:
+        """Modelo subyacente (lo usa `get_model_name`)."""
+        return getattr(self.embeddings, "model", None)
+
+    def _lookup(self, key: str) -> Optional[List[float]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        stored_at, vector = entry
+        if self.ttl_seconds and time.monotonic() - stored_at > self.ttl_seconds:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return vector
+
+    def embed_query(self, text: str) -> List[float]:
+        key = normalize_text(text)
+        while True:
+            with self._lock:
+                vector = self._lookup(key)
+                if vector is not None:
+                    self.hits += 1
+                    return vector
+                pending = self._pending.get(key)
+                if pending is None:
+                    self.misses += 1
+                    self._pending[key] = threading.Event()
+                    break
+            # Otro hilo está embebiendo la misma consulta
+            pending.wait()
+
+        try:
+            vector = self.embeddings.embed_query(text)
+            with self._lock:
+                self._entries[key] = (time.monotonic(), vector)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            return vector
+        finally:
+            with self._lock:
+                self._pending.pop(key).set()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    def clear(self) -> None:
+        """Vaciar la caché y reiniciar los contadores."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict:
+        """Aciertos, fallos y tamaño actual de la caché."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries
+            }
+
+
+_instance: Optional[QueryEmbeddings] = None
+_instance_lock = threading.Lock()
+
+
+def get_query_embeddings() -> QueryEmbeddings:
+    """Instancia compartida para todos los vectorstores del proceso."""
+    global _instance
+    with _instance_lock:
+        if _instance is None:
+            _instance = QueryEmbeddings(OpenAIEmbeddings())
+        return _instance
@@ -0,0 +1,370 @@
+# utils/retrieval.py
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+from langchain_chroma import Chroma
+from utils.fulltext import get_fulltext_index
+from utils.query_embeddings import get_query_embeddings
+from utils.vector_library import (
+    get_storage_mode,
+    get_library_vectorstore,
+    doc_filter,
+    STORAGE_LIBRARY
+)
+
+NO_RESULTS_MESSAGE = "No encontré información específica. ¿Podrías reformular la pregunta?"
+
+# Modo de recuperación de cada agente (clave `retrieval_mode` en saved_agents.json)
+RETRIEVAL_DENSE = "dense"
+RETRIEVAL_HYBRID = "hybrid"
+RETRIEVAL_MODES = {
+    RETRIEVAL_DENSE: "Semántica (vectores)",
+    RETRIEVAL_HYBRID: "Híbrida (vectores + BM25)"
+}
+# Constante de la fusión por rango recíproco (valor usual en la literatura)
+RRF_K = 60
+
+# Búsquedas simultáneas por consulta y tiempo máximo de espera
+RETRIEVAL_MAX_WORKERS = int(os.getenv("RETRIEVAL_MAX_WORKERS", "16"))
+RETRIEVAL_TIMEOUT_SECONDS = float(os.getenv("RETRIEVAL_TIMEOUT_SECONDS", "8"))
+
+# Relevancia frente a diversidad en MMR (1 = solo relevancia) y candidatos
+# extra que se piden a cada almacén para poder diversificar
+RETRIEVAL_MMR_LAMBDA = float(os.getenv("RETRIEVAL_MMR_LAMBDA", "0.5"))
+RETRIEVAL_MMR_FETCH_FACTOR = int(os.getenv("RETRIEVAL_MMR_FETCH_FACTOR", "3"))
+
+LEXICAL_SEARCH = "el índice BM25"
+LIBRARY_SEARCH = "la biblioteca"
+
+# Búsquedas abandonadas por tiempo que siguen corriendo, y búsquedas
+# omitidas por almacén ({"timeouts", "errors", "hung", "last"})
+_abandoned: Dict[str, int] = {}
+_dropped: Dict[str, Dict] = {}
+_state_lock = threading.Lock()
+
+
+def _record_dropped(name: str, reason: str) -> None:
+    with _state_lock:
+        entry = _dropped.setdefault(name, {"timeouts": 0, "errors": 0, "hung": 0})
+        entry[reason] += 1
+        entry["last"] = datetime.now().isoformat()
+
+
+def _release(name: str) -> None:
+    with _state_lock:
+        _abandoned[name] -= 1
+        if not _abandoned[name]:
+            del _abandoned[name]
+
+
+def dropped_searches(names: Optional[Iterable[str]] = None) -> Dict[str, Dict]:
+    """Búsquedas omitidas en este proceso por almacén (de `names`, o de todos)."""
+    with _state_lock:
+        return {
+            name: dict(entry) for name, entry in _dropped.items()
+            if names is None or name in names
+        }
+
+
+def run_searches(searches: Dict[str, Callable[[], List]],
+                 timeout: float = RETRIEVAL_TIMEOUT_SECONDS) -> Dict[str, List]:
+    """Ejecuta las búsquedas en paralelo y retorna {nombre: resultado} de las que terminaron a tiempo.
+
+    Las que tardan más de `timeout` o fallan se omiten (se informa en
+    consola y queda registrado en `dropped_searches`), de modo que la
+    latencia es la del almacén más lento dentro del plazo. Cada consulta
+    usa su propio pool de hilos: una búsqueda colgada no ocupa hilos de las
+    siguientes, y un almacén con una búsqueda abandonada que aún no termina
+    se omite sin lanzarle otra. Si todas fallan se relanza el primer error.
+    """
+    with _state_lock:
+        hung = [name for name in searches if _abandoned.get(name)]
+    for name in hung:
+        _record_dropped(name, "hung")
+        print(f"Búsqueda en {name} omitida: la anterior sigue sin responder")
+    runnable = {name: search for name, search in searches.items() if name not in hung}
+    if not runnable:
+        return {}
+
+    executor = ThreadPoolExecutor(max_workers=min(len(runnable), RETRIEVAL_MAX_WORKERS),
+                                  thread_name_prefix="retrieval")
+    futures = {name: executor.submit(search) for name, search in runnable.items()}
+    wait(futures.values(), timeout=timeout)
+    # No esperar a las que siguen corriendo; las que no empezaron se cancelan
+    executor.shutdown(wait=False, cancel_futures=True)
+
+    rankings, errors = {}, []
+    for name, future in futures.items():
+        if future.cancelled() or not future.done():
+            _record_dropped(name, "timeouts")
+            print(f"Búsqueda en {name} sin respuesta tras {timeout:g} s, se omite")
+            if not future.cancelled():
+                with _state_lock:
+                    _abandoned[name] = _abandoned.get(name, 0) + 1
+                future.add_done_callback(lambda _, name=name: _release(name))
+        elif future.exception() is not None:
+            _record_dropped(name, "errors")
+            errors.append(future.exception())
+            print(f"Error al buscar en {name}: {future.exception()}")
+        else:
+            rankings[name] = future.result()
+    if errors and not rankings:
+        raise errors[0]
+    return rankings
+
+
+def open_agent_vectorstores(docs: List[Dict], k: int) -> Tuple[List[Dict], Optional[Dict]]:
+    """Abre los vectorstores de los documentos de un agente.
+
+    Los documentos por documento obtienen su propio retriever; los que viven
+    en la colección de la biblioteca comparten un único retriever filtrado
+    por sus hashes, de modo que se consultan con una sola búsqueda. Todos
+    embeben las consultas con la instancia compartida de `get_query_embeddings`.
+    Retorna (vectorstores, library) donde library puede ser None.
+    """
+    embeddings = get_query_embeddings()
+    vectorstores = []
+    library_docs = []
+    for doc in docs:
+        if get_storage_mode(doc) == STORAGE_LIBRARY:
+            library_docs.append(doc)
+            continue
+        vectorstore_path = doc.get('vectorstore_path', '')
+        if not vectorstore_path or not os.path.exists(vectorstore_path):
+            continue
+        vectorstore = Chroma(
+            persist_directory=vectorstore_path,
+            embedding_function=embeddings
+        )
+        vectorstores.append({
+            'hash': doc['hash'],
+            'title': doc['title'],
+            'vectorstore': vectorstore,
+            'retriever': vectorstore.as_retriever(search_kwargs={"k": k})
+        })
+
+    library = None
+    if library_docs:
+        vectorstore = get_library_vectorstore(embeddings)
+        hashes = [doc['hash'] for doc in library_docs]
+        for doc in library_docs:
+            vectorstores.append({
+                'hash': doc['hash'],
+                'title': doc['title'],
+                'vectorstore': vectorstore,
+                'retriever': None
+            })
+        library = {
+            'vectorstore': vectorstore,
+            'titles': {doc['hash']: doc['title'] for doc in library_docs},
+            'filter': doc_filter(hashes),
+            'retriever': vectorstore.as_retriever(
+                search_kwargs={"k": k, "filter": doc_filter(hashes)}
+            )
+        }
+    return vectorstores, library
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[Tuple[str, str]]], k: int = RRF_K) -> List[Tuple[str, str]]:
+    """Fusiona listas ordenadas de (fuente, contenido) por rango recíproco.
+
+    Cada fragmento suma 1 / (k + posición) en cada lista donde aparece, de
+    modo que los que coinciden en ambas búsquedas suben sin tener que
+    comparar puntajes de escalas distintas (distancia coseno y BM25).
+    """
+    scores: Dict[str, float] = {}
+    sources: Dict[str, str] = {}
+    for ranking in rankings:
+        for position, (source, content) in enumerate(ranking, start=1):
+            scores[content] = scores.get(content, 0.0) + 1.0 / (k + position)
+            sources.setdefault(content, source)
+    ordered = sorted(scores, key=lambda content: scores[content], reverse=True)
+    return [(sources[content], content) for content in ordered]
+
+
+def query_collection(vectorstore, query_embedding: List[float], n_results: int,
+                     where: Optional[Dict] = None, source: Optional[str] = None,
+                     titles: Optional[Dict[str, str]] = None,
+                     with_embeddings: bool = False) -> List[Dict]:
+    """Candidatos de una colección de Chroma con su distancia.
+
+    La fuente es `source` o, en la colección de la biblioteca, el título del
+    documento según el `doc_hash` de cada chunk. Los vectores de los
+    candidatos solo se piden con `with_embeddings` (los necesita MMR); si no,
+    el embedding de cada candidato es None.
+    """
+    include = ["documents", "metadatas", "distances"]
+    if with_embeddings:
+        include.append("embeddings")
+    data = vectorstore._collection.query(
+        query_embeddings=[query_embedding],
+        n_results=n_results,
+        where=where,
+        include=include
+    )
+    texts = data["documents"][0]
+    embeddings = data["embeddings"][0] if with_embeddings else [None] * len(texts)
+    candidates = []
+    for text, metadata, distance, embedding in zip(
+        texts, data["metadatas"][0], data["distances"][0], embeddings
+    ):
+        if titles is not None:
+            source = titles.get((metadata or {}).get('doc_hash'), 'Documento')
+        candidates.append({
+            "source": source,
+            "content": (text or "").strip(),
+            "distance": distance,
+            "embedding": embedding
+        })
+    return candidates
+
+
+def store_name(vs: Dict) -> str:
+    """Nombre de la búsqueda de un vectorstore por documento."""
+    return f"{vs['title']} ({vs['hash'][:8]})"
+
+
+def agent_search_names(config: Dict) -> List[str]:
+    """Nombres de todas las búsquedas que puede lanzar el agente."""
+    names = [store_name(vs) for vs in config['vectorstores'] if vs.get('retriever') is not None]
+    if config.get('library'):
+        names.append(LIBRARY_SEARCH)
+    if config.get('retrieval_mode', RETRIEVAL_DENSE) == RETRIEVAL_HYBRID:
+        names.append(LEXICAL_SEARCH)
+    return names
+
+
+def dense_searches(config: Dict, query_embedding: List[float], n_results: int,
+                   with_embeddings: bool = False) -> Dict[str, Callable[[], List[Dict]]]:
+    """Búsquedas por similitud pendientes, una por almacén, por nombre."""
+    searches = {}
+    for vs in config['vectorstores']:
+        if vs.get('retriever') is None:
+            continue
+        searches[store_name(vs)] = (
+            lambda vs=vs: query_collection(vs['vectorstore'], query_embedding, n_results,
+                                           source=vs['title'], with_embeddings=with_embeddings)
+        )
+
+    # Una sola búsqueda filtrada para los documentos de la biblioteca
+    library = config.get('library')
+    if library:
+        searches[LIBRARY_SEARCH] = lambda: query_collection(
+            library['vectorstore'], query_embedding, n_results,
+            where=library['filter'], titles=library['titles'], with_embeddings=with_embeddings
+        )
+    return searches
+
+
+def merge_candidates(rankings: Iterable[List[Dict]]) -> List[Dict]:
+    """Candidatos de todos los almacenes en un solo orden global por distancia, sin repetidos.
+
+    Todos los almacenes usan el mismo modelo de embeddings y la misma
+    métrica, así que sus distancias son comparables.
+    """
+    seen = set()
+    merged = []
+    for candidate in sorted((c for ranking in rankings for c in ranking), key=lambda c: c["distance"]):
+        if candidate["content"] and candidate["content"] not in seen:
+            seen.add(candidate["content"])
+            merged.append(candidate)
+    return merged
+
+
+def maximal_marginal_relevance(query_embedding: List[float], candidates: List[Dict], k: int,
+                               lambda_mult: float = RETRIEVAL_MMR_LAMBDA) -> List[Dict]:
+    """Elige k candidatos equilibrando relevancia y diversidad (MMR).
+
+    En cada paso toma el candidato que maximiza
+    lambda * sim(consulta) - (1 - lambda) * max sim(ya elegidos),
+    con similitud coseno, para no llenar el contexto con fragmentos casi
+    iguales de distintos documentos.
+    """
+    if len(candidates) <= 1 or k <= 1:
+        return candidates[:k]
+    matrix = np.array([c["embedding"] for c in candidates], dtype=float)
+    matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+    query = np.array(query_embedding, dtype=float)
+    query /= max(np.linalg.norm(query), 1e-12)
+
+    relevance = matrix @ query
+    selected = [int(np.argmax(relevance))]
+    redundancy = matrix @ matrix[selected[0]]
+    while len(selected) < min(k, len(candidates)):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        scores[selected] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        redundancy = np.maximum(redundancy, matrix @ matrix[best])
+    return [candidates[index] for index in selected]
+
+
+def embed_query(config: Dict, query: str) -> Optional[List[float]]:
+    """Embedding de la consulta, calculado una vez para todos los almacenes.
+
+    Pasa por la caché del proceso, así que repetir la consulta no llama a la API.
+    """
+    if not config['vectorstores']:
+        return None
+    return get_query_embeddings().embed_query(query)
+
+
+def lexical_ranking(config: Dict, query: str) -> List[Tuple[str, str]]:
+    """Chunks de los documentos del agente ordenados por BM25 (ver utils/fulltext.py)."""
+    titles = {vs['hash']: vs['title'] for vs in config['vectorstores']}
+    hits = get_fulltext_index().search(
+        query,
+        limit=config['context_window'],
+        doc_hashes=list(titles),
+        snippets=False
+    )
+    return [(titles.get(hit['doc_hash'], 'Documento'), hit['content'].strip()) for hit in hits]
+
+
+def retrieve(config: Dict, query: str) -> List[Tuple[str, str]]:
+    """Los mejores fragmentos (fuente, contenido) de todos los documentos del agente.
+
+    Los candidatos de cada almacén se ordenan juntos por distancia y se
+    toman los `context_window` mejores en total (con MMR si el agente lo
+    tiene activado), en lugar de agotar primero los de un documento. En modo
+    híbrido esa lista se fusiona después con la de BM25.
+    """
+    k = config['context_window']
+    mmr = config.get('mmr', False)
+    query_embedding = embed_query(config, query)
+    searches = {}
+    if query_embedding is not None:
+        searches = dense_searches(config, query_embedding, k * RETRIEVAL_MMR_FETCH_FACTOR if mmr else k,
+                                  with_embeddings=mmr)
+    hybrid = config.get('retrieval_mode', RETRIEVAL_DENSE) == RETRIEVAL_HYBRID
+    if hybrid:
+        # BM25 corre junto con los vectorstores
+        searches[LEXICAL_SEARCH] = lambda: lexical_ranking(config, query)
+
+    rankings = run_searches(searches)
+    lexical = rankings.pop(LEXICAL_SEARCH, None)
+    candidates = merge_candidates(rankings.values())
+    if mmr:
+        candidates = maximal_marginal_relevance(query_embedding, candidates, k)
+    dense = [(candidate["source"], candidate["content"]) for candidate in candidates[:k]]
+
+    if hybrid and lexical is not None:
+        return reciprocal_rank_fusion([dense, lexical])
+    return dense
+
+
+def search_vectorstores(config: Dict, query: str) -> str:
+    """Buscar información en los documentos base de un agente."""
+    try:
+        results = retrieve(config, query)
+        if results:
+            return "\n\n".join(
+                f"[{source}]: {content}" for source, content in results[:config['context_window']]
+            )
+        return NO_RESULTS_MESSAGE
+
+    except Exception as e:
+        return f"Error al buscar: {str(e)}"
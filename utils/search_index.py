@@ -0,0 +1,166 @@
+# utils/search_index.py
+"""Índice invertido en memoria para la búsqueda del catálogo.
+
+Los textos se normalizan (minúsculas y sin tildes) y se tokenizan, de modo
+que "sociologia" encuentra "Sociología". Cada término de la consulta se
+compara también como prefijo, para resultados mientras se escribe, y los
+documentos se ordenan con BM25 ponderando el campo donde aparece el término.
+
+Una consulta de varias palabras devuelve solo los documentos que contienen
+todas (exactas o como prefijo): "python datos" acota, no amplía.
+"""
+import re
+import math
+import heapq
+import bisect
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Peso de cada campo en la frecuencia del término
+FIELD_WEIGHTS = {
+    "title": 3.0,
+    "tags": 2.0,
+    "author": 2.0,
+    "description": 1.0
+}
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Prefijos más cortos no se expanden (la lista de términos sería enorme)
+MIN_PREFIX_LENGTH = 2
+# Términos por prefijo, elegidos por frecuencia de documento
+MAX_PREFIX_EXPANSIONS = 64
+# Un término que solo coincide como prefijo puntúa menos que uno exacto
+PREFIX_MATCH_WEIGHT = 0.5
+
+_TOKEN_PATTERN = re.compile(r"\w+")
+# Diacríticos combinables que deja la descomposición NFKD (tildes, diéresis, virgulilla)
+_COMBINING_PATTERN = re.compile("[\u0300-\u036f]")
+
+
+def fold(text: str) -> str:
+    """Minúsculas y sin tildes ni diacríticos."""
+    text = text.lower()
+    if text.isascii():
+        return text
+    return _COMBINING_PATTERN.sub("", unicodedata.normalize("NFKD", text))
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_PATTERN.findall(fold(text))
+
+
+def document_fields(doc: Dict) -> Dict[str, str]:
+    """Textos indexados de un documento."""
+    return {
+        "title": str(doc.get("title", "")),
+        "tags": " ".join(str(tag) for tag in doc.get("tags", []) or []),
+        "author": str(doc.get("author", "")),
+        "description": str(doc.get("description", ""))
+    }
+
+
+class SearchIndex:
+    """Índice invertido con BM25 por campos y coincidencia por prefijo."""
+
+    def __init__(self):
+        self.postings: Dict[str, Dict[str, float]] = {}
+        self.doc_terms: Dict[str, Dict[str, float]] = {}
+        self.doc_lengths: Dict[str, float] = {}
+        self.total_length = 0.0
+        self.vocabulary: List[str] = []  # ordenado, para buscar prefijos con bisect
+
+    @classmethod
+    def build(cls, documents: Iterable[Tuple[str, Dict]]) -> "SearchIndex":
+        index = cls()
+        for doc_hash, doc in documents:
+            index.add(doc_hash, doc, keep_sorted=False)
+        # En la carga inicial el vocabulario se ordena una sola vez al final
+        index.vocabulary = sorted(index.postings)
+        return index
+
+    def add(self, doc_hash: str, doc: Dict, keep_sorted: bool = True) -> None:
+        """Indexar (o reindexar) un documento."""
+        self.remove(doc_hash)
+        terms: Dict[str, float] = {}
+        length = 0.0
+        for field, text in document_fields(doc).items():
+            weight = FIELD_WEIGHTS[field]
+            for token in tokenize(text):
+                terms[token] = terms.get(token, 0.0) + weight
+                length += weight
+
+        for term, frequency in terms.items():
+            posting = self.postings.get(term)
+            if posting is None:
+                posting = self.postings[term] = {}
+                if keep_sorted:
+                    bisect.insort(self.vocabulary, term)
+            posting[doc_hash] = frequency
+        self.doc_terms[doc_hash] = terms
+        self.doc_lengths[doc_hash] = length
+        self.total_length += length
+
+    def remove(self, doc_hash: str) -> None:
+        terms = self.doc_terms.pop(doc_hash, None)
+        if terms is None:
+            return
+        for term in terms:
+            posting = self.postings[term]
+            posting.pop(doc_hash, None)
+            if not posting:
+                del self.postings[term]
+                del self.vocabulary[bisect.bisect_left(self.vocabulary, term)]
+        self.total_length -= self.doc_lengths.pop(doc_hash)
+
+    def _expand(self, token: str) -> List[Tuple[str, float]]:
+        """Términos del índice que coinciden con un token de la consulta.
+
+        Si un prefijo corto abarca más de MAX_PREFIX_EXPANSIONS términos se
+        usan los que aparecen en más documentos, no los primeros en orden
+        alfabético.
+        """
+        matches = [(token, 1.0)] if token in self.postings else []
+        if len(token) < MIN_PREFIX_LENGTH:
+            return matches
+        start = bisect.bisect_right(self.vocabulary, token)
+        end = bisect.bisect_left(self.vocabulary, token + "\U0010ffff", start)
+        terms = self.vocabulary[start:end]
+        if len(terms) > MAX_PREFIX_EXPANSIONS:
+            terms = heapq.nlargest(MAX_PREFIX_EXPANSIONS, terms, key=lambda term: len(self.postings[term]))
+        matches.extend((term, PREFIX_MATCH_WEIGHT) for term in terms)
+        return matches
+
+    def search(self, query: str, limit: Optional[int] = None) -> Dict[str, float]:
+        """Puntaje BM25 de los documentos que contienen todos los términos."""
+        tokens = tokenize(query)
+        if not tokens or not self.doc_lengths:
+            return {}
+
+        total_docs = len(self.doc_lengths)
+        average_length = self.total_length / total_docs or 1.0
+        scores: Optional[Dict[str, float]] = None
+        for token in dict.fromkeys(tokens):
+            token_scores: Dict[str, float] = {}
+            for term, match_weight in self._expand(token):
+                posting = self.postings[term]
+                idf = math.log(1 + (total_docs - len(posting) + 0.5) / (len(posting) + 0.5))
+                for doc_hash, frequency in posting.items():
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths[doc_hash] / average_length)
+                    score = match_weight * idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+                    # Un documento puntúa por la mejor variante de cada token
+                    if score > token_scores.get(doc_hash, 0.0):
+                        token_scores[doc_hash] = score
+            if scores is None:
+                scores = token_scores
+            else:
+                scores = {
+                    doc_hash: score + token_scores[doc_hash]
+                    for doc_hash, score in scores.items()
+                    if doc_hash in token_scores
+                }
+            if not scores:
+                return {}
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        return dict(ranked[:limit] if limit else ranked)
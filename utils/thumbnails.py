@@ -0,0 +1,146 @@
+# utils/thumbnails.py
+import os
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Dict, Optional, Tuple
+
+THUMBNAIL_DIR = os.getenv("THUMBNAIL_DIR", os.path.join("data", "thumbnails"))
+THUMBNAIL_WORKERS = int(os.getenv("THUMBNAIL_WORKERS", "2"))
+
+# Ancho en píxeles de cada variante
+THUMBNAIL_SIZES = {
+    "small": 240,
+    "medium": 480
+}
+
+try:
+    # Pillow es opcional: permite guardar en WebP, mucho más liviano que PNG
+    from PIL import Image
+except ImportError:
+    Image = None
+
+THUMBNAIL_FORMAT = "webp" if Image is not None else "png"
+
+
+def stream_sha256(stream: BinaryIO, chunk_size: int = 1024 * 1024) -> str:
+    """Calcula el sha256 de un archivo abierto leyéndolo por bloques."""
+    digest = hashlib.sha256()
+    for block in iter(lambda: stream.read(chunk_size), b""):
+        digest.update(block)
+    return digest.hexdigest()
+
+
+def file_sha256(file_path: str, chunk_size: int = 1024 * 1024) -> str:
+    """Calcula el sha256 de un archivo leyéndolo por bloques."""
+    with open(file_path, "rb") as f:
+        return stream_sha256(f, chunk_size)
+
+
+def thumbnail_path(file_hash: str, size: str) -> str:
+    """Ruta en disco de una variante de miniatura."""
+    return os.path.join(THUMBNAIL_DIR, f"{file_hash}_{size}.{THUMBNAIL_FORMAT}")
+
+
+def render_thumbnails(file_path: str, file_hash: str) -> Dict[str, str]:
+    """Renderiza la primera página en todas las variantes de tamaño."""
+    import fitz  # PyMuPDF
+
+    os.makedirs(THUMBNAIL_DIR, exist_ok=True)
+    paths = {}
+    with fitz.open(file_path) as doc:
+        page = doc[0]
+        for size, width in THUMBNAIL_SIZES.items():
+            output_path = thumbnail_path(file_hash, size)
+            if os.path.exists(output_path):
+                paths[size] = output_path
+                continue
+            zoom = width / page.rect.width
+            pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+            # Escribir a un temporal y renombrar para no servir archivos a medio escribir
+            tmp_path = f"{output_path}.tmp"
+            if Image is not None:
+                image = Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+                image.save(tmp_path, "WEBP", quality=80, method=4)
+            else:
+                pix.save(tmp_path, output="png")
+            os.replace(tmp_path, output_path)
+            paths[size] = output_path
+    return paths
+
+
+class ThumbnailService:
+    """Genera y cachea miniaturas en segundo plano, indexadas por hash del archivo."""
+
+    def __init__(self, max_workers: int = THUMBNAIL_WORKERS):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="thumbnails")
+        self._hashes: Dict[Tuple[str, float, int], str] = {}
+        self._pending = set()
+        self._failed = set()
+        self._lock = threading.Lock()
+
+    def _file_key(self, file_path: str) -> Optional[Tuple[str, float, int]]:
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+        return (file_path, stat.st_mtime, stat.st_size)
+
+    def generate(self, file_path: str) -> Dict[str, str]:
+        """Genera las miniaturas de forma síncrona (p. ej. durante la ingesta)."""
+        key = self._file_key(file_path)
+        if key is None:
+            return {}
+        with self._lock:
+            file_hash = self._hashes.get(key)
+        if file_hash is None:
+            file_hash = file_sha256(file_path)
+            with self._lock:
+                self._hashes[key] = file_hash
+        return render_thumbnails(file_path, file_hash)
+
+    def _generate_in_background(self, key) -> None:
+        try:
+            self.generate(key[0])
+        except Exception as e:
+            print(f"No se pudo crear miniatura de {key[0]}: {str(e)}")
+            with self._lock:
+                self._failed.add(key)
+        finally:
+            with self._lock:
+                self._pending.discard(key)
+
+    def get(self, file_path: Optional[str], size: str = "small") -> Optional[str]:
+        """Ruta de la miniatura si ya existe; si no, la agenda y retorna None.
+
+        Nunca bloquea el render: el hash y el render ocurren en el pool.
+        """
+        if not file_path or not file_path.lower().endswith(".pdf"):
+            return None
+        key = self._file_key(file_path)
+        if key is None:
+            return None
+        with self._lock:
+            file_hash = self._hashes.get(key)
+            if file_hash:
+                path = thumbnail_path(file_hash, size)
+                if os.path.exists(path):
+                    return path
+            if key in self._pending or key in self._failed:
+                return None
+            self._pending.add(key)
+        self.executor.submit(self._generate_in_background, key)
+        return None
+
+
+_service_instance: Optional[ThumbnailService] = None
+_service_lock = threading.Lock()
+
+
+def get_thumbnail_service() -> ThumbnailService:
+    """Servicio de miniaturas compartido por todo el proceso."""
+    global _service_instance
+    with _service_lock:
+        if _service_instance is None:
+            _service_instance = ThumbnailService()
+        return _service_instance
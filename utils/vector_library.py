@@ -0,0 +1,116 @@
+# utils/vector_library.py
+"""Colección vectorial única para toda la biblioteca.
+
+En modo "library" todos los chunks se guardan en una sola colección de
+Chroma etiquetados con el hash de su documento, y los agentes consultan una
+sola vez filtrando por su conjunto de documentos. El modo "per_document"
+(por defecto) mantiene un vectorstore por documento.
+
+Migración de una biblioteca existente:
+    python -m utils.vector_library migrate
+"""
+import os
+import argparse
+from typing import Dict, List, Optional
+
+VECTOR_STORAGE_MODE = os.getenv("VECTOR_STORAGE_MODE", "per_document")
+LIBRARY_VECTORSTORE_DIR = os.getenv(
+    "LIBRARY_VECTORSTORE_DIR",
+    os.path.join("data", "library_vectorstore")
+)
+LIBRARY_COLLECTION = "yachani_library"
+
+STORAGE_PER_DOCUMENT = "per_document"
+STORAGE_LIBRARY = "library"
+
+
+def get_storage_mode(doc: Optional[Dict] = None) -> str:
+    """Modo de almacenamiento de un documento (o el configurado para nuevas ingestas)."""
+    if doc is not None:
+        return doc.get("vector_storage", STORAGE_PER_DOCUMENT)
+    return VECTOR_STORAGE_MODE
+
+
+def get_library_vectorstore(embeddings):
+    """Abre la colección compartida de la biblioteca."""
+    from langchain_chroma import Chroma
+
+    os.makedirs(LIBRARY_VECTORSTORE_DIR, exist_ok=True)
+    return Chroma(
+        collection_name=LIBRARY_COLLECTION,
+        persist_directory=LIBRARY_VECTORSTORE_DIR,
+        embedding_function=embeddings
+    )
+
+
+def doc_filter(doc_hashes: List[str]) -> Dict:
+    """Filtro de metadata para restringir una consulta a un conjunto de documentos."""
+    if len(doc_hashes) == 1:
+        return {"doc_hash": doc_hashes[0]}
+    return {"doc_hash": {"$in": list(doc_hashes)}}
+
+
+def library_chunk_id(doc_hash: str, chunk_id: str) -> str:
+    """ID de un chunk dentro de la colección compartida."""
+    return f"{doc_hash}-{chunk_id}"
+
+
+def migrate_library(batch_size: int = 500) -> Dict:
+    """Copia los vectorstores por documento a la colección compartida.
+
+    Se reutilizan los embeddings ya calculados, por lo que no hay llamadas
+    al proveedor. Los documentos migrados quedan marcados con
+    `vector_storage = "library"`; los vectorstores originales no se borran.
+    """
+    from langchain_chroma import Chroma
+    from utils.document_manager import DocumentManager
+
+    doc_manager = DocumentManager()
+    library = get_library_vectorstore(None)
+    summary = {"documents": 0, "chunks": 0, "skipped": 0}
+
+    for doc_hash, doc in list(doc_manager.metadata.items()):
+        vectorstore_path = doc.get("vectorstore_path", "")
+        if get_storage_mode(doc) == STORAGE_LIBRARY or not os.path.exists(vectorstore_path):
+            summary["skipped"] += 1
+            continue
+
+        source = Chroma(persist_directory=vectorstore_path)._collection
+        total = source.count()
+        for offset in range(0, total, batch_size):
+            data = source.get(
+                include=["embeddings", "documents", "metadatas"],
+                limit=batch_size,
+                offset=offset
+            )
+            library._collection.upsert(
+                ids=[library_chunk_id(doc_hash, chunk_id) for chunk_id in data["ids"]],
+                embeddings=data["embeddings"],
+                documents=data["documents"],
+                metadatas=[{**(metadata or {}), "doc_hash": doc_hash} for metadata in data["metadatas"]]
+            )
+        doc_manager.update_document(doc_hash, {"vector_storage": STORAGE_LIBRARY})
+        summary["documents"] += 1
+        summary["chunks"] += total
+        print(f"✅ {doc.get('title')}: {total} fragmentos migrados")
+
+    print(f"\n📊 {summary['documents']} documentos y {summary['chunks']} fragmentos migrados, "
+          f"{summary['skipped']} omitidos")
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Colección vectorial compartida de la biblioteca")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    migrate_parser = subparsers.add_parser("migrate", help="Migrar los vectorstores por documento")
+    migrate_parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    if args.command == "migrate":
+        migrate_library(args.batch_size)
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    load_dotenv()
+    main()